@@ -0,0 +1,297 @@
+import re
+import time
+from enum import IntEnum
+
+
+class ActionKind(IntEnum):
+    """
+    操作记录的类型。
+
+    说明：
+    TEXT 用于迁移时无法识别格式的旧记录，原文保存在 name 中。
+    """
+    TEXT = 0
+    ADD = 1
+    EDIT = 2
+    DELETE = 3
+    COMPLETE = 4
+    UNDO = 5
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# 旧版 user_actions 中各类记录的格式，用于一次性迁移
+LEGACY_PATTERNS = [
+    (ActionKind.EDIT, re.compile(
+        r"^你在(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2})将目标【(?P<old_name>[^】]*)】【(?P<old_deadline>[^】]*)】"
+        r"【(?P<old_times>\d+)】修改为【(?P<name>[^】]*)】【(?P<deadline>[^】]*)】【(?P<times>\d+)】$")),
+    (ActionKind.ADD, re.compile(r"^你在(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2})添加了目标【(?P<name>.*)】$")),
+    (ActionKind.DELETE, re.compile(r"^你在(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2})删除了目标【(?P<name>.*)】$")),
+    (ActionKind.UNDO, re.compile(r"^你在(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2})撤销完成了目标【(?P<name>.*)】$")),
+    (ActionKind.COMPLETE, re.compile(r"^你在(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2})完成了目标【(?P<name>.*)】$")),
+]
+
+
+class ActionRecord:
+    """
+    一条用户操作记录。
+
+    属性：
+    time (int): 操作时间，Unix 时间戳（秒）。
+    kind (ActionKind): 操作类型。
+    goal_id (str): 目标 id，没有 id 时为 None。
+    name (str): 操作时目标的名称。
+    old (list): 修改前的 [名称, 截止日期, 次数]，仅修改操作有值。
+    new (list): 修改后的 [名称, 截止日期, 次数]，仅修改操作有值。
+
+    说明：
+    记录创建后不再修改，可以安全地在线程之间共享。显示用的文字只在需要时由 render 生成。
+    """
+    __slots__ = ('time', 'kind', 'goal_id', 'name', 'old', 'new')
+
+    def __init__(self, time, kind, goal_id, name, old=None, new=None):
+        self.time = time
+        self.kind = kind
+        self.goal_id = goal_id
+        self.name = name
+        self.old = old
+        self.new = new
+
+    @classmethod
+    def now(cls, kind, goal, old=None, new=None):
+        """
+        以当前时间创建一条关于 goal 的记录。
+        """
+        return cls(int(time.time()), kind, goal.get('id'), goal['name'], old, new)
+
+    def render(self):
+        """
+        生成显示用的文字，格式与旧版 user_actions 相同。
+        """
+        if self.kind == ActionKind.TEXT:
+            return self.name
+        action_time = time.strftime(TIME_FORMAT, time.localtime(self.time))
+        if self.kind == ActionKind.ADD:
+            return f"你在{action_time}添加了目标【{self.name}】"
+        if self.kind == ActionKind.EDIT:
+            return "你在{}将目标【{}】【{}】【{}】修改为【{}】【{}】【{}】".format(action_time, *self.old, *self.new)
+        if self.kind == ActionKind.DELETE:
+            return f"你在{action_time}删除了目标【{self.name}】"
+        if self.kind == ActionKind.COMPLETE:
+            return f"你在{action_time}完成了目标【{self.name}】"
+        return f"你在{action_time}撤销完成了目标【{self.name}】"
+
+    def to_json(self):
+        """
+        转换为紧凑的 JSON 列表 [time, kind, goal_id, name, old, new]，省略末尾的空值。
+        """
+        data = [self.time, int(self.kind), self.goal_id, self.name]
+        if self.old is not None or self.new is not None:
+            data += [self.old, self.new]
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data[0], ActionKind(data[1]), *data[2:])
+
+    @classmethod
+    def parse(cls, text):
+        """
+        解析一条旧版的操作记录文字。
+
+        参数：
+        text (str): 旧版 user_actions 中的一条记录。
+
+        返回值：
+        ActionRecord: 解析得到的记录，无法识别时返回类型为 TEXT 的记录。
+        """
+        for kind, pattern in LEGACY_PATTERNS:
+            match = pattern.match(text)
+            if match is None:
+                continue
+            timestamp = int(time.mktime(time.strptime(match.group('time'), TIME_FORMAT)))
+            if kind == ActionKind.EDIT:
+                old = [match.group('old_name'), match.group('old_deadline'), int(match.group('old_times'))]
+                new = [match.group('name'), match.group('deadline'), int(match.group('times'))]
+                return cls(timestamp, kind, None, new[0], old, new)
+            return cls(timestamp, kind, None, match.group('name'))
+        return cls(0, ActionKind.TEXT, None, text)
+
+
+class ActionFilter:
+    """
+    操作记录的筛选条件。
+
+    属性：
+    start (int): 起始时间（含），Unix 时间戳，为 None 时不限制。
+    end (int): 结束时间（不含），Unix 时间戳，为 None 时不限制。
+    kinds (set): 允许的操作类型，为 None 时不限制。
+    name (str): 目标名称中需包含的文字，为空时不限制。
+    """
+    __slots__ = ('start', 'end', 'kinds', 'name')
+
+    def __init__(self, start=None, end=None, kinds=None, name=""):
+        self.start = start
+        self.end = end
+        self.kinds = kinds
+        self.name = name
+
+    def matches(self, record):
+        if self.start is not None and record.time < self.start:
+            return False
+        if self.end is not None and record.time >= self.end:
+            return False
+        if self.kinds is not None and record.kind not in self.kinds:
+            return False
+        return not self.name or self.name in record.name
+
+
+class RecordView:
+    """
+    只追加列表中一段记录的只读视图。
+
+    说明：
+    视图只保存列表和起止位置，创建是 O(1) 操作。列表之后追加的记录不在视图中；
+    列表只会在末尾追加，不会原地修改已有的部分，因此视图可以在其它线程中遍历。
+    """
+    __slots__ = ('_items', '_start', '_stop')
+
+    def __init__(self, items, start, stop):
+        self._items = items
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __iter__(self):
+        return map(self._items.__getitem__, range(self._start, self._stop))
+
+
+class ActionLog:
+    """
+    操作记录存储。
+
+    说明：
+    记录按从旧到新的顺序追加到列表中，追加是 O(1) 操作。
+    设置 maxlen 后只保留最新的 maxlen 条记录，更早的记录只是移出有效范围，积累到一定数量后才一并释放。
+    每条记录有一个递增的序号，序号减去列表开头记录的序号即为它在列表中的位置。分页查询以序号作为游标，
+    每页直接从游标的位置开始读取，与已翻过的页数无关；查询期间追加新记录不影响已取得的分页。
+
+    列表只在末尾追加，移除记录时换成新的列表，因此 view 返回的视图在之后的修改中保持不变。
+    """
+
+    def __init__(self, records=(), maxlen=None):
+        self._maxlen = maxlen
+        self._items = list(records)
+        if maxlen is not None and len(self._items) > maxlen:
+            del self._items[:len(self._items) - maxlen]
+        self._start = 0  # 最早一条有效记录在列表中的位置
+        self._first = 0  # 列表开头记录的序号
+
+    @property
+    def maxlen(self):
+        return self._maxlen
+
+    @property
+    def _appended(self):
+        # 已追加的记录总数，即下一条记录的序号
+        return self._first + len(self._items)
+
+    def append(self, record):
+        self._items.append(record)
+        if self._maxlen is not None and len(self._items) - self._start > self._maxlen:
+            self._start += 1
+            # 移出的记录占列表的一半以上时才释放，追加的均摊开销仍是 O(1)
+            if self._start * 2 >= len(self._items):
+                self._items = self._items[self._start:]
+                self._first += self._start
+                self._start = 0
+
+    def __len__(self):
+        return len(self._items) - self._start
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __reversed__(self):
+        items = self._items
+        return map(items.__getitem__, range(len(items) - 1, self._start - 1, -1))
+
+    def view(self):
+        """
+        返回当前全部记录的只读视图 RecordView，之后追加的记录不在其中。
+        """
+        return RecordView(self._items, self._start, len(self._items))
+
+    def since(self, seq=None):
+        """
+        返回序号不小于 seq 的记录。
+
+        参数：
+        seq (int): 起始序号，为 None 时返回全部记录。
+
+        返回值：
+        tuple: (记录的只读视图 RecordView, 下一条记录的序号)，以后者作为 seq 再次调用即可取得之后追加的记录。
+        """
+        start = self._start if seq is None else max(seq - self._first, self._start)
+        return RecordView(self._items, min(start, len(self._items)), len(self._items)), self._appended
+
+    def drop_before(self, time):
+        """
+        移除时间早于 time 的记录，返回移除的条数。
+
+        说明：
+        被移除的通常是最早的一段记录，其余记录的序号不变；从中间移除记录后，进行中的分页查询需要重新开始。
+        """
+        kept = [record for record in self.view() if record.time >= time]
+        removed = len(self) - len(kept)
+        if removed:
+            self._first = self._appended - len(kept)
+            self._items = kept
+            self._start = 0
+        return removed
+
+    def query(self, action_filter=None, cursor=None, limit=100):
+        """
+        按从新到旧的顺序查询一页符合条件的记录。
+
+        参数：
+        action_filter (ActionFilter): 筛选条件，为 None 时返回全部记录。
+        cursor (int): 从该序号的记录开始向更早的记录查找，为 None 时从最新的记录开始。
+        limit (int): 最多返回的条数。
+
+        返回值：
+        tuple: (记录列表, 下一页的游标)，没有更多记录时游标为 None。
+        """
+        items = self._items
+        first = self._first + self._start
+        last = self._appended - 1
+        seq = last if cursor is None else min(cursor, last)
+
+        results = []
+        while seq >= first:
+            record = items[seq - self._first]
+            seq -= 1
+            if action_filter is None or action_filter.matches(record):
+                results.append(record)
+                if len(results) >= limit:
+                    break
+        return results, (seq if seq >= first else None)
+
+
+def load_action_log(data, maxlen=None):
+    """
+    从 JSON 数据中读取操作记录。
+
+    参数：
+    data (dict): 数据文件的内容。
+    maxlen (int): 保留的最大记录数，为 None 时不限制。
+
+    说明：
+    新格式的记录保存在 "actions" 中，从旧到新排列；
+    旧版数据只有 "user_actions" 文字列表，从新到旧排列，读取时逐条解析迁移。
+    """
+    if 'actions' in data:
+        return ActionLog((ActionRecord.from_json(item) for item in data['actions']), maxlen)
+    return ActionLog((ActionRecord.parse(text) for text in reversed(data.get('user_actions', []))), maxlen)
@@ -0,0 +1,315 @@
+import time
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from action_log import ActionKind
+
+# 完成操作对当天完成数的贡献，撤销操作抵消一次完成
+ACTION_DELTAS = {ActionKind.COMPLETE: 1, ActionKind.UNDO: -1}
+
+
+def day_of(timestamp):
+    """
+    返回 Unix 时间戳对应的本地日期序数（date.toordinal）。
+    """
+    return date.fromtimestamp(timestamp).toordinal()
+
+
+def action_key(record):
+    """
+    统计时区分目标的键，没有 id 的旧记录按名称区分。
+    """
+    return record.goal_id or record.name
+
+
+class GoalProgress:
+    """
+    一个目标的逐日完成情况。
+
+    属性：
+    name (str): 最近一次操作时的目标名称。
+    days (dict): 日期序数到当天净完成数（完成数减撤销数）的映射，净完成数大于 0 的日子为活跃日。
+    last (int): 最后一个活跃日，没有活跃日时为 None。
+    run (int): 截至 last 的连续活跃天数。
+    longest (int): 最长的连续活跃天数。
+    added (int): 添加目标的日期序数，未知时为 None。
+    """
+    __slots__ = ('name', 'days', 'last', 'run', 'longest', 'added')
+
+    def __init__(self, name):
+        self.name = name
+        self.days = {}
+        self.last = None
+        self.run = 0
+        self.longest = 0
+        self.added = None
+
+    def activate(self, day):
+        """
+        day 成为活跃日。按时间顺序到来时只需 O(1) 更新连续天数，否则重新计算。
+        """
+        if self.last is None or day > self.last + 1:
+            self.last, self.run = day, 1
+        elif day == self.last + 1:
+            self.last, self.run = day, self.run + 1
+        else:
+            self.recompute()
+            return
+        self.longest = max(self.longest, self.run)
+
+    def recompute(self):
+        """
+        由 days 重新计算连续天数，只在撤销或乱序记录时使用。
+        """
+        self.last, self.run, self.longest = None, 0, 0
+        for day in sorted(day for day, count in self.days.items() if count > 0):
+            if self.last is not None and day == self.last + 1:
+                self.run += 1
+            else:
+                self.run = 1
+            self.last = day
+            self.longest = max(self.longest, self.run)
+
+    def current_streak(self, today):
+        """
+        当前的连续活跃天数，最后一个活跃日是今天或昨天时连续记录仍在延续。
+        """
+        if self.last is None or self.last < today - 1:
+            return 0
+        return self.run
+
+
+class ProgressStats:
+    """
+    全部目标的进度统计：每日完成热力图、连续完成天数、按时完成率和平均完成用时。
+
+    属性：
+    goals (dict): 目标键（id，旧记录为名称）到 GoalProgress 的映射。
+    daily (dict): 日期序数到当天全部目标净完成数之和的映射，每个目标每天至少计 0。
+    on_time (int): 在截止日期当天或之前完成的目标数。
+    late (int): 超过截止日期完成的目标数。
+    no_deadline (int): 没有截止日期的已完成目标数。
+    duration_total (int): 已知添加日期的已完成目标从添加到完成的天数之和。
+    duration_count (int): 已知添加日期的已完成目标数。
+
+    说明：
+    统计结果由 GoalStore 在每次记录操作和完成目标时增量更新，打开统计界面时不必重新扫描操作记录。
+    首次建立统计时需要扫描全部操作记录，安装了 NumPy 时用向量化计算，否则逐条累加。
+    """
+
+    def __init__(self):
+        self.goals = {}
+        self.daily = {}
+        self.on_time = 0
+        self.late = 0
+        self.no_deadline = 0
+        self.duration_total = 0
+        self.duration_count = 0
+
+    @classmethod
+    def build(cls, actions, completed_goals, use_numpy=True):
+        """
+        由全部操作记录和已完成目标建立统计。
+
+        参数：
+        actions (iterable): 按时间顺序排列的 ActionRecord。
+        completed_goals (list): 已完成目标。
+        use_numpy (bool): 安装了 NumPy 时是否使用向量化计算。
+
+        返回值：
+        ProgressStats: 建立的统计，结果与逐条调用 add_action 和 add_completed 相同。
+        """
+        stats = cls()
+        if use_numpy and np is not None:
+            stats._build_numpy(actions, completed_goals)
+        else:
+            for record in actions:
+                stats.add_action(record)
+            for goal in completed_goals:
+                stats.add_completed(goal)
+        return stats
+
+    def _progress(self, key, name):
+        progress = self.goals.get(key)
+        if progress is None:
+            progress = self.goals[key] = GoalProgress(name)
+        else:
+            progress.name = name
+        return progress
+
+    def add_action(self, record):
+        """
+        计入一条操作记录。
+
+        说明：
+        添加操作记下添加日期；完成和撤销操作改变当天的净完成数，活跃日变化时更新连续天数。
+        """
+        if record.kind == ActionKind.TEXT:
+            return
+        progress = self._progress(action_key(record), record.name)
+        day = day_of(record.time)
+        if record.kind == ActionKind.ADD:
+            if progress.added is None:
+                progress.added = day
+            return
+        delta = ACTION_DELTAS.get(record.kind)
+        if delta is None:
+            return
+        old = progress.days.get(day, 0)
+        new = progress.days[day] = old + delta
+        self.daily[day] = self.daily.get(day, 0) + max(new, 0) - max(old, 0)
+        if old <= 0 < new:
+            progress.activate(day)
+        elif new <= 0 < old:
+            progress.recompute()
+
+    def add_completed(self, goal):
+        """
+        计入一个已完成目标（GoalRecord）的按时情况和完成用时，日期已经是序数，无需解析。
+        """
+        completed = goal.completion_day
+        deadline = goal.deadline_day
+        if deadline is None:
+            self.no_deadline += 1
+        elif completed is not None and completed <= deadline:
+            self.on_time += 1
+        else:
+            self.late += 1
+        progress = self.goals.get(goal.id)
+        if progress is not None and progress.added is not None and completed is not None:
+            self.duration_total += max(completed - progress.added, 0)
+            self.duration_count += 1
+
+    def _build_numpy(self, actions, completed_goals):
+        keys = {}
+        names = []
+        times, kinds, codes = [], [], []
+        for record in actions:
+            if record.kind == ActionKind.TEXT:
+                continue
+            key = action_key(record)
+            code = keys.get(key)
+            if code is None:
+                code = keys[key] = len(names)
+                names.append(record.name)
+            else:
+                names[code] = record.name
+            times.append(record.time)
+            kinds.append(record.kind)
+            codes.append(code)
+        for key, code in keys.items():
+            self.goals[key] = GoalProgress(names[code])
+        if times:
+            self._apply_actions(list(keys), np.array(times, dtype=np.int64), np.array(kinds, dtype=np.int8),
+                                np.array(codes, dtype=np.int64))
+        self._apply_completed(completed_goals)
+
+    def _apply_actions(self, key_list, times, kinds, codes):
+        # 本地时间的偏移按小时查询一次，夏令时切换也能得到正确的日期
+        hours, inverse = np.unique(times // 3600, return_inverse=True)
+        offsets = np.array([time.localtime(int(hour) * 3600).tm_gmtoff for hour in hours], dtype=np.int64)
+        days = (times + offsets[inverse]) // 86400 + date(1970, 1, 1).toordinal()
+
+        # 每个目标的添加日期取第一条添加记录
+        added = kinds == ActionKind.ADD
+        added_codes, first = np.unique(codes[added], return_index=True)
+        for code, day in zip(added_codes.tolist(), days[added][first].tolist()):
+            self.goals[key_list[code]].added = day
+
+        deltas = np.where(kinds == ActionKind.COMPLETE, 1, np.where(kinds == ActionKind.UNDO, -1, 0))
+        counted = deltas != 0
+        if not counted.any():
+            return
+        # 按 (目标, 日期) 汇总净完成数，结果按目标、日期排序
+        first_day = int(days.min())
+        span = int(days.max()) - first_day + 1
+        pairs, pair_inverse = np.unique(codes[counted] * span + (days[counted] - first_day), return_inverse=True)
+        net = np.bincount(pair_inverse, weights=deltas[counted]).astype(np.int64)
+        pair_codes = pairs // span
+        pair_days = pairs % span + first_day
+
+        for code, day, count in zip(pair_codes.tolist(), pair_days.tolist(), net.tolist()):
+            self.goals[key_list[code]].days[day] = count
+        active_days, daily = np.unique(pair_days, return_inverse=True)
+        totals = np.bincount(daily, weights=np.maximum(net, 0)).astype(np.int64)
+        self.daily = dict(zip(active_days.tolist(), totals.tolist()))
+
+        # 活跃日按目标和日期排序后，目标变化或日期不相邻处开始新的一段连续记录
+        active = net > 0
+        run_codes = pair_codes[active]
+        run_days = pair_days[active]
+        if not len(run_days):
+            return
+        starts = np.ones(len(run_days), dtype=bool)
+        starts[1:] = (run_codes[1:] != run_codes[:-1]) | (run_days[1:] != run_days[:-1] + 1)
+        run_ids = np.cumsum(starts) - 1
+        lengths = np.bincount(run_ids)
+        ends = np.flatnonzero(np.append(starts[1:], True))
+        longest = np.zeros(len(key_list), dtype=np.int64)
+        np.maximum.at(longest, run_codes[ends], lengths)
+        # 每个目标的最后一段即排序后该目标的最后一个活跃日所在的一段
+        for code, last, run, best in zip(run_codes[ends].tolist(), run_days[ends].tolist(), lengths.tolist(),
+                                         longest[run_codes[ends]].tolist()):
+            progress = self.goals[key_list[code]]
+            progress.last, progress.run, progress.longest = last, run, best
+
+    def _apply_completed(self, completed_goals):
+        if not completed_goals:
+            return
+        # 没有日期时记为 0，日期序数总是大于 0
+        deadlines = np.array([goal.deadline_day or 0 for goal in completed_goals], dtype=np.int64)
+        completed = np.array([goal.completion_day or 0 for goal in completed_goals], dtype=np.int64)
+        has_deadline = deadlines > 0
+        on_time = has_deadline & (completed > 0) & (completed <= deadlines)
+        self.no_deadline += int((~has_deadline).sum())
+        self.on_time += int(on_time.sum())
+        self.late += int((has_deadline & ~on_time).sum())
+
+        for goal, day in zip(completed_goals, completed.tolist()):
+            progress = self.goals.get(goal.id)
+            if day and progress is not None and progress.added is not None:
+                self.duration_total += max(day - progress.added, 0)
+                self.duration_count += 1
+
+    def on_time_rate(self):
+        """
+        有截止日期的已完成目标中按时完成的比例，没有这样的目标时返回 None。
+        """
+        total = self.on_time + self.late
+        return self.on_time / total if total else None
+
+    def average_days_to_complete(self):
+        """
+        已完成目标从添加到完成的平均天数，没有已知添加日期的目标时返回 None。
+        """
+        return self.duration_total / self.duration_count if self.duration_count else None
+
+    def streaks(self, today=None):
+        """
+        各目标的连续完成天数。
+
+        返回值：
+        list: 每项为 (名称, 当前连续天数, 最长连续天数, 活跃天数)，按当前和最长连续天数从多到少排列，
+        没有完成过的目标不列出。
+        """
+        today = date.today().toordinal() if today is None else today
+        rows = [(progress.name, progress.current_streak(today), progress.longest,
+                 sum(1 for count in progress.days.values() if count > 0))
+                for progress in self.goals.values() if progress.longest]
+        rows.sort(key=lambda row: (row[1], row[2]), reverse=True)
+        return rows
+
+    def heatmap(self, weeks=53, today=None):
+        """
+        最近若干周的每日完成数。
+
+        返回值：
+        tuple: (第一天的日期序数, 每天的完成数列表)，第一天是星期一，列表到今天为止。
+        """
+        today = date.today().toordinal() if today is None else today
+        first = today - date.fromordinal(today).weekday() - (weeks - 1) * 7
+        return first, [self.daily.get(day, 0) for day in range(first, today + 1)]
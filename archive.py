@@ -0,0 +1,415 @@
+import gzip
+import json
+import lzma
+import os
+import re
+import time
+
+import instrumentation
+from action_log import ActionRecord
+from fileutil import FileLock, file_signature, write_json_atomic
+from goal_record import GoalRecord
+
+COMPRESSIONS = {"gzip": (".gz", gzip.open), "lzma": (".xz", lzma.open)}
+
+KINDS = ("actions", "completed")
+
+_SEGMENT_NAME = re.compile(r"^(actions|completed)-(\d{4}-\d{2})\.ndjson(\.gz|\.xz)$")
+
+
+def action_month(record):
+    return time.strftime("%Y-%m", time.localtime(record.time))
+
+
+def is_archivable(goal, completed_before):
+    """
+    已完成目标的完成日期是否早于归档分界，没有完成日期的旧数据不归档。
+    """
+    completion_date = goal.get('completion_date')
+    return bool(completed_before and completion_date and completion_date < completed_before)
+
+
+def segment_overlaps(segment, action_filter):
+    """
+    操作记录分段的时间范围是否与筛选条件的时间范围相交，不相交的分段不必读取。
+    """
+    if action_filter is None or segment['first'] is None:
+        return True
+    if action_filter.start is not None and segment['last'] < action_filter.start:
+        return False
+    return action_filter.end is None or segment['first'] < action_filter.end
+
+
+def _later(a, b):
+    """
+    返回两个分界中较晚的一个，None 表示没有分界。
+    """
+    return b if a is None else a if b is None else max(a, b)
+
+
+def sort_items(kind, items):
+    """
+    排序分段中的记录：操作记录按时间排序，已完成目标按完成日期排序。排序是稳定的，相同的记录全部保留。
+    """
+    if kind == "actions":
+        return sorted(items, key=lambda record: record.time)
+    return sorted(items, key=lambda goal: goal.get('completion_date', ''))
+
+
+def is_before_cutoff(kind, item, index):
+    """
+    记录是否早于 index.json 中记录的归档分界，即已经从主数据中移除。
+    """
+    if kind == "actions":
+        return index['actions_before'] is not None and item.time < index['actions_before']
+    return is_archivable(item, index['completed_before'])
+
+
+class HistoryArchive:
+    """
+    一份数据文件的归档目录，较早的操作记录和已完成目标按月压缩保存在这里。
+
+    说明：
+    每个月的操作记录和已完成目标各是一个分段文件，每行一条 JSON 记录，用 gzip 或 lzma 压缩；
+    index.json 记录各分段的月份、条数和时间范围，以及归档的分界：早于分界的历史数据都已归档，
+    主数据文件中不再保留。查看历史时才按需读取分段。
+
+    归档时先向分段文件追加记录，再更新 index.json，最后由存储后端从主数据中移除这些记录。
+    gzip 和 xz 格式都允许把多段压缩数据直接拼接在一起，因此追加不需要重写已有的分段。
+    index.json 记录每个分段的条数和文件大小，只有前 count 条记录算数。追加之后、更新索引之前崩溃，
+    多出的记录仍在主数据中：读取时忽略，下次追加前按大小发现并截掉，repack 时清除。
+    同一秒内的多次点击会产生内容完全相同的记录，因此不按内容去重。
+    主数据中残留的已归档记录在下次加载时按分界移除。
+
+    目录在第一次归档时才创建，没有归档过的数据不会产生任何文件。
+    """
+
+    def __init__(self, directory, compression="gzip"):
+        """
+        参数：
+        directory (str): 归档目录。
+        compression (str): 新建分段使用的压缩方式，"gzip" 或 "lzma"；已有归档时使用 index.json 中记录的方式。
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"未知的压缩方式: {compression}")
+        self.directory = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.compression = compression
+        self._lock = FileLock(directory)
+        self._index = None
+        self._signature = None
+        self._cache = None  # 最近读取的分段，(文件名, 记录列表)
+
+    def index(self):
+        """
+        返回 index.json 的内容，文件没有变化时使用缓存。
+
+        返回值：
+        dict: 包含 compression、actions_before（操作记录的归档分界，Unix 时间戳）、
+        completed_before（已完成目标的归档分界，yyyy-MM-dd）、segments（分段列表）
+        和 pruned（已删除的已完成目标分段中按月汇总的完成数）。
+        """
+        signature = file_signature(self.index_path)
+        if self._index is None or signature != self._signature:
+            try:
+                with open(self.index_path, "r") as f:
+                    index = json.load(f)
+            except FileNotFoundError:
+                index = {}
+            index.setdefault('compression', self.compression)
+            index.setdefault('actions_before', None)
+            index.setdefault('completed_before', None)
+            index.setdefault('segments', [])
+            index.setdefault('pruned', {})
+            self._index, self._signature = index, signature
+        return self._index
+
+    def _save_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        write_json_atomic(self.index_path, index, ensure_ascii=False, indent=1)
+        self._index, self._signature = index, file_signature(self.index_path)
+
+    def cutoff(self):
+        """
+        返回归档分界 (actions_before, completed_before)，没有归档过时都为 None。
+        """
+        index = self.index()
+        return index['actions_before'], index['completed_before']
+
+    def segments(self, kind):
+        """
+        返回某类数据的分段，按月份从新到旧排列。
+
+        参数：
+        kind (str): "actions" 或 "completed"。
+        """
+        return sorted((segment for segment in self.index()['segments'] if segment['kind'] == kind),
+                      key=lambda segment: segment['month'], reverse=True)
+
+    def count(self, kind):
+        """
+        返回某类数据已归档的条数。
+        """
+        return sum(segment['count'] for segment in self.segments(kind))
+
+    def monthly_completions(self):
+        """
+        返回已归档（含已删除分段）的已完成目标按月汇总的完成数。
+        """
+        index = self.index()
+        months = dict(index['pruned'])
+        for segment in index['segments']:
+            if segment['kind'] == "completed":
+                months[segment['month']] = months.get(segment['month'], 0) + segment['count']
+        return months
+
+    @instrumentation.timed("archive.add")
+    def add(self, actions, completed_goals, actions_before, completed_before):
+        """
+        把记录追加到各月的分段中，并推进归档分界。
+
+        参数：
+        actions (list): 要归档的 ActionRecord，均早于 actions_before。
+        completed_goals (list): 要归档的已完成目标，完成日期均早于 completed_before。
+        actions_before (int): 新的操作记录归档分界。
+        completed_before (str): 新的已完成目标归档分界。
+
+        说明：
+        分界只会向后推进，用更短的保留时间归档过之后，改用更长的保留时间不会把记录移回主数据。
+        """
+        groups = {}
+        for record in actions:
+            groups.setdefault(("actions", action_month(record)), []).append(record)
+        for goal in completed_goals:
+            groups.setdefault(("completed", goal['completion_date'][:7]), []).append(goal)
+
+        with self._lock:
+            index = self.index()
+            # 复制后再修改，写入失败时缓存中的索引保持不变
+            index = dict(index, segments=[dict(segment) for segment in index['segments']])
+            segments = {(segment['kind'], segment['month']): segment for segment in index['segments']}
+            if groups:
+                os.makedirs(self.directory, exist_ok=True)
+            for (kind, month), items in sorted(groups.items()):
+                segment = segments.get((kind, month))
+                if segment is None:
+                    extension = COMPRESSIONS[index['compression']][0]
+                    segment = {"kind": kind, "month": month, "file": f"{kind}-{month}.ndjson{extension}",
+                               "count": 0, "first": None, "last": None, "size": 0}
+                    index['segments'].append(segment)
+                    segments[(kind, month)] = segment
+                if self._file_size(segment['file']) != segment.get('size'):
+                    # 上次追加之后、更新索引之前中断，先截掉不算数的记录；旧版索引没有记录大小，同样重写一次
+                    self._rewrite(segment, self._read_file(kind, segment['file'], segment['count']))
+                self._append(segment, items)
+            index['actions_before'] = _later(index['actions_before'], actions_before)
+            index['completed_before'] = _later(index['completed_before'], completed_before)
+            self._save_index(index)
+        self._cache = None
+
+    def _open(self, name, mode):
+        extension = os.path.splitext(name)[1]
+        for suffix, opener in COMPRESSIONS.values():
+            if suffix == extension:
+                return opener(os.path.join(self.directory, name), mode, encoding="utf-8")
+        raise ValueError(f"未知的分段文件: {name}")
+
+    def _file_size(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return 0
+
+    def _append(self, segment, items, mode="at", name=None):
+        """
+        把记录写入分段文件并更新分段的条数、时间范围和文件大小。mode 为 "wt" 时重写文件，name 指定实际写入的文件。
+        """
+        name = name or segment['file']
+        with self._open(name, mode) as f:
+            for item in items:
+                f.write(json.dumps(item.to_json(), ensure_ascii=False, separators=(',', ':')))
+                f.write("\n")
+        segment['size'] = self._file_size(name)
+        segment['count'] += len(items)
+        if segment['kind'] == "actions" and items:
+            first = min(record.time for record in items)
+            last = max(record.time for record in items)
+            segment['first'] = first if segment['first'] is None else min(segment['first'], first)
+            segment['last'] = last if segment['last'] is None else max(segment['last'], last)
+
+    def _rewrite(self, segment, items):
+        """
+        先写入临时文件再替换，用 items 重写分段文件，分段的条数和时间范围按 items 重新计算。
+        """
+        extension = os.path.splitext(segment['file'])[1]
+        tmp_name = f"{segment['file']}.tmp{extension}"
+        segment.update(count=0, first=None, last=None)
+        self._append(segment, items, "wt", tmp_name)
+        os.replace(os.path.join(self.directory, tmp_name), os.path.join(self.directory, segment['file']))
+
+    def read(self, segment):
+        """
+        读取一个分段的前 count 条记录，之后的是中断的追加留下的，不算数。
+
+        返回值：
+        list: 操作记录分段返回按时间从旧到新排列的 ActionRecord，已完成目标分段返回 GoalRecord。
+        """
+        if self._cache is not None and self._cache[0] == segment['file']:
+            return self._cache[1]
+        items = sort_items(segment['kind'], self._read_file(segment['kind'], segment['file'], segment['count']))
+        self._cache = (segment['file'], items)
+        return items
+
+    @instrumentation.timed("archive.read")
+    def _read_file(self, kind, name, limit=None):
+        """
+        读取分段文件中的前 limit 条记录，limit 为 None 时读取全部能读出的记录。
+
+        说明：
+        中断的追加可能在文件末尾留下不完整的压缩数据或半行记录。limit 为 None 时读到这里为止；
+        否则在读够 limit 条之前遇到说明文件损坏，抛出异常。
+        """
+        items = []
+        if limit == 0:
+            return items
+        try:
+            f = self._open(name, "rt")
+        except FileNotFoundError:
+            return items
+        with f:
+            try:
+                for line in f:
+                    if line.strip():
+                        value = json.loads(line)
+                        items.append(ActionRecord.from_json(value) if kind == "actions"
+                                     else GoalRecord.from_json(value))
+                        if limit is not None and len(items) >= limit:
+                            break
+            except (EOFError, OSError, ValueError, lzma.LZMAError):
+                if limit is not None:
+                    raise
+        return items
+
+    def query_actions(self, action_filter=None, cursor=None, limit=100):
+        """
+        按从新到旧的顺序分页查询已归档的操作记录，参数和返回值与 StorageBackend.query_actions 相同。
+
+        说明：
+        游标为 (分段在 segments("actions") 中的位置, 已跳过的条数)。时间范围与筛选条件不相交的分段不读取，
+        每次最多解压当前页用到的分段。
+        """
+        segments = self.segments("actions")
+        position, skipped = cursor if cursor is not None else (0, 0)
+        results = []
+        while position < len(segments):
+            segment = segments[position]
+            if not segment_overlaps(segment, action_filter):
+                position, skipped = position + 1, 0
+                continue
+            records = self.read(segment)
+            for offset in range(len(records) - 1 - skipped, -1, -1):
+                skipped += 1
+                record = records[offset]
+                if action_filter is None or action_filter.matches(record):
+                    results.append(record)
+                    if len(results) >= limit:
+                        if skipped < len(records):
+                            return results, (position, skipped)
+                        return results, ((position + 1, 0) if position + 1 < len(segments) else None)
+            position, skipped = position + 1, 0
+        return results, None
+
+    def repack(self, compression=None):
+        """
+        重写全部分段：清除中断的追加留下的多余记录、按时间排序，并可以改用另一种压缩方式。
+
+        参数：
+        compression (str): 新的压缩方式，为 None 时保持不变。
+
+        返回值：
+        tuple: (重写的分段数, 清除的多余记录数)。
+
+        说明：
+        分段列表按目录中实际存在的文件重新建立。索引中有的分段保留前 count 条记录；
+        索引中没有的分段文件只恢复早于归档分界的记录，之后的记录是中断的归档留下的，仍在主数据中。
+        """
+        with self._lock:
+            index = dict(self.index())
+            if compression is not None:
+                if compression not in COMPRESSIONS:
+                    raise ValueError(f"未知的压缩方式: {compression}")
+                index['compression'] = compression
+            extension = COMPRESSIONS[index['compression']][0]
+
+            files = {}
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    match = _SEGMENT_NAME.match(name)
+                    if match is not None:
+                        files.setdefault((match.group(1), match.group(2)), []).append(name)
+            listed = {(segment['kind'], segment['month']): segment for segment in index['segments']}
+
+            segments = []
+            dropped = 0
+            for (kind, month), names in sorted(files.items()):
+                old = listed.get((kind, month))
+                if old is None:
+                    items = self._read_file(kind, names[0])
+                    kept = [item for item in items if is_before_cutoff(kind, item, index)]
+                else:
+                    # 改变压缩方式时中途崩溃，同一个月会有两种压缩方式、内容相同的文件，以索引中的为准
+                    items = self._read_file(kind, old['file'] if old['file'] in names else names[0])
+                    kept = items[:old['count']]
+                dropped += len(items) - len(kept)
+                if not kept:
+                    for name in names:
+                        os.remove(os.path.join(self.directory, name))
+                    continue
+                segment = {"kind": kind, "month": month, "file": f"{kind}-{month}.ndjson{extension}",
+                           "count": 0, "first": None, "last": None}
+                self._rewrite(segment, sort_items(kind, kept))
+                for name in names:
+                    if name != segment['file']:
+                        os.remove(os.path.join(self.directory, name))
+                segments.append(segment)
+            index['segments'] = segments
+            self._save_index(index)
+        self._cache = None
+        return len(segments), dropped
+
+    def prune(self, before_month, kinds=KINDS):
+        """
+        删除早于某个月的分段。
+
+        参数：
+        before_month (str): "yyyy-MM"，早于该月的分段被删除。
+        kinds (tuple): 要删除的数据种类。
+
+        返回值：
+        tuple: (删除的分段数, 删除的记录数)。
+
+        说明：
+        已完成目标的分段删除后，其按月汇总的完成数仍记在 index.json 中，月度统计不受影响。
+        """
+        removed = records = 0
+        with self._lock:
+            index = dict(self.index())
+            pruned = dict(index['pruned'])
+            kept = []
+            for segment in index['segments']:
+                if segment['kind'] not in kinds or segment['month'] >= before_month:
+                    kept.append(segment)
+                    continue
+                try:
+                    os.remove(os.path.join(self.directory, segment['file']))
+                except FileNotFoundError:
+                    pass
+                if segment['kind'] == "completed":
+                    pruned[segment['month']] = pruned.get(segment['month'], 0) + segment['count']
+                removed += 1
+                records += segment['count']
+            if removed:
+                index.update(segments=kept, pruned=pruned)
+                self._save_index(index)
+        self._cache = None
+        return removed, records
@@ -0,0 +1,308 @@
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from PyQt5.QtCore import QT_VERSION_STR, QTimer
+from PyQt5.QtWidgets import QApplication, QMessageBox
+
+from action_log import ActionKind, ActionRecord
+from goal_record import GoalRecord
+from main import GoalManager
+from storage import JournalStorage, JsonStorage, SqliteStorage, create_storage, empty_data, file_data
+
+# 规模名称到 (活动目标数, 已完成目标数, 操作记录数) 的映射
+SIZES = {
+    "small": (100, 1000, 10000),
+    "medium": (10000, 10000, 100000),
+    "large": (100000, 100000, 1000000),
+}
+
+STORAGE_KINDS = ("json", "journal", "sqlite")
+
+
+def generate_data(goals, completed, actions, seed=0):
+    """
+    生成合成数据。
+
+    参数：
+    goals (int): 活动目标数。
+    completed (int): 已完成目标数。
+    actions (int): 操作记录数。
+    seed (int): 随机数种子，相同的参数总是生成相同的数据。
+
+    返回值：
+    dict: 与 StorageBackend.load_history 返回值格式相同的数据。
+    """
+    rng = random.Random(seed)
+    data = empty_data()
+    for i in range(goals):
+        target_times = rng.randint(2, 999)
+        data['goals'].append(GoalRecord(f"bench-{i}", f"目标{i}"[:10],
+                                        f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                                        target_times, rng.randint(0, target_times - 1)))
+    # 第一个目标留出足够的次数，供单次点击的场景反复增加
+    if goals:
+        data['goals'][0].target_times = 10 ** 9
+        data['goals'][0].completed_times = 0
+
+    for i in range(completed):
+        target_times = rng.randint(1, 50)
+        goal = GoalRecord(f"bench-done-{i}", f"完成{i}"[:10],
+                          f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", target_times, target_times,
+                          f"{rng.randint(2015, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+        data['completed_goals'].append(goal)
+        month = goal['completion_date'][:7]
+        data['monthly_completions'][month] = data['monthly_completions'].get(month, 0) + 1
+
+    start = int(time.time()) - actions * 60
+    kinds = [ActionKind.ADD, ActionKind.COMPLETE, ActionKind.COMPLETE, ActionKind.UNDO, ActionKind.DELETE]
+    for i in range(actions):
+        data['actions'].append(ActionRecord(start + i * 60, rng.choice(kinds), f"bench-{i % max(goals, 1)}",
+                                            f"目标{i % max(goals, 1)}"[:10]))
+    return data
+
+
+def write_dataset(directory, kind, data):
+    """
+    把数据写成指定存储方式的数据文件，返回数据文件路径。
+    """
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, "goals.json")
+    content = file_data(data)
+    if kind == "journal":
+        # 与 JournalStorage 写出的快照一样，把 journal_seq 写在最前面
+        content = dict(journal_seq=0, **content)
+    with open(json_path, "w") as f:
+        json.dump(content, f, separators=(',', ':'))
+    if kind != "sqlite":
+        return json_path
+    db_path = os.path.join(directory, "goals.db")
+    storage = SqliteStorage(db_path)
+    storage.import_json(json_path)
+    storage.close()
+    os.remove(json_path)
+    return db_path
+
+
+def measure(func, repeat):
+    """
+    重复执行 func，返回每次的耗时（秒）。
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    return {"median_ms": statistics.median(timings) * 1000,
+            "min_ms": min(timings) * 1000,
+            "max_ms": max(timings) * 1000,
+            "runs": len(timings)}
+
+
+def time_dialog(app, open_dialog):
+    """
+    测量打开模态对话框所需的时间。
+
+    说明：
+    对话框进入自己的事件循环后，第一个零延时定时器在首次绘制之后执行，
+    此时记录时间并关闭对话框。
+    """
+    shown = []
+
+    def close_dialog():
+        shown.append(time.perf_counter())
+        dialog = QApplication.activeModalWidget()
+        if dialog is not None:
+            dialog.done(0)
+
+    QTimer.singleShot(0, close_dialog)
+    start = time.perf_counter()
+    open_dialog()
+    app.processEvents()
+    return shown[0] - start
+
+
+def run_scenarios(app, kind, path, repeat):
+    """
+    对一份数据文件运行全部场景。
+
+    返回值：
+    dict: 场景名称到耗时汇总的映射。
+    """
+    results = {}
+
+    def cold_load():
+        storage = create_storage(kind, path, 0)
+        storage.load()
+        storage.release()
+
+    def cold_load_history():
+        storage = create_storage(kind, path, 0)
+        storage.load()
+        storage.load_history()
+        storage.release()
+
+    results["cold_load"] = summarize(measure(cold_load, repeat))
+    results["cold_load_history"] = summarize(measure(cold_load_history, repeat))
+
+    windows = []
+
+    def open_window():
+        window = GoalManager(create_storage(kind, path))
+        app.processEvents()
+        windows.append(window)
+
+    results["open_window"] = summarize(measure(open_window, 1))
+    window = windows[0]
+    window.storage.load_history()
+    table = window.goals_table
+
+    def rebuild():
+        window.goals_model.goals_resetting()
+        window.goals_model.goals_reset()
+        table.viewport().repaint()
+
+    results["table_rebuild"] = summarize(measure(rebuild, repeat))
+
+    if window.store.goals:
+        goal_id = window.store.goals[0]['id']
+
+        def click():
+            window.add_completed_times(goal_id)
+            table.viewport().repaint()
+
+        results["click_increment"] = summarize(measure(click, repeat))
+
+    storage = window.storage
+    if isinstance(storage, JsonStorage):
+        results["full_save"] = summarize(measure(storage.save, repeat))
+    elif isinstance(storage, JournalStorage):
+        results["full_save"] = summarize(measure(
+            lambda: storage.compact(storage.snapshot(), background=False), repeat))
+
+    results["open_completed_dialog"] = summarize(
+        [time_dialog(app, window.show_completed_goals) for _ in range(repeat)])
+    results["open_history_dialog"] = summarize(
+        [time_dialog(app, window.show_user_actions) for _ in range(repeat)])
+    if window.store.goals:
+        goal_id = window.store.goals[0]['id']
+        results["open_edit_dialog"] = summarize(
+            [time_dialog(app, lambda: window.edit_goal(goal_id)) for _ in range(repeat)])
+    results["open_logo_dialog"] = summarize([time_dialog(app, window.show_logo) for _ in range(repeat)])
+
+    window.store.close()
+    window.hide()
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    与基准结果比较。
+
+    参数：
+    results (dict): 本次的结果。
+    baseline (dict): 基准结果。
+    threshold (float): 中位数超过基准的倍数时视为变慢。
+    min_delta_ms (float): 变化小于该毫秒数时忽略，避免微小场景的抖动。
+
+    返回值：
+    list: 变慢的场景，每项为 (场景, 基准中位数, 本次中位数)。
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        old, new = previous["median_ms"], current["median_ms"]
+        if new > old * threshold and new - old > min_delta_ms:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def main():
+    """
+    离屏性能基准测试的入口。
+
+    用法：
+        python benchmark.py --sizes small,medium --storage json,sqlite --output results.json
+        python benchmark.py --baseline results.json --threshold 1.25
+
+    说明：
+    按指定规模生成合成数据，在不显示窗口的情况下（QT_QPA_PLATFORM=offscreen）测量冷启动加载、
+    主窗口创建、表格重建、单次点击、完整保存和打开对话框的耗时。结果写入 JSON 文件，
+    指定 --baseline 时与上次的结果比较，有场景变慢超过阈值时以退出码 1 结束。
+    """
+    parser = argparse.ArgumentParser(description="离屏性能基准测试")
+    parser.add_argument("--sizes", default="small,medium",
+                        help="逗号分隔的数据规模：{}".format(", ".join(SIZES)))
+    parser.add_argument("--storage", default="json,journal,sqlite", help="逗号分隔的存储方式")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景重复的次数")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果文件路径")
+    parser.add_argument("--workdir", help="生成数据的目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--baseline", help="与该结果文件比较，有场景变慢时以退出码 1 结束")
+    parser.add_argument("--threshold", type=float, default=1.25, help="中位数超过基准的倍数时视为变慢")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="忽略小于该毫秒数的变化")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    kinds = args.storage.split(",")
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"未知的数据规模: {size}")
+    for kind in kinds:
+        if kind not in STORAGE_KINDS:
+            parser.error(f"未知的存储方式: {kind}")
+
+    app = QApplication(sys.argv[:1])
+    # 基准测试中不弹出提示框
+    QMessageBox.information = QMessageBox.warning = staticmethod(lambda *args: QMessageBox.Ok)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="motivation-bench-")
+    results = {}
+    try:
+        for size in sizes:
+            data = generate_data(*SIZES[size])
+            for kind in kinds:
+                path = write_dataset(os.path.join(workdir, f"{size}-{kind}"), kind, data)
+                for name, summary in run_scenarios(app, kind, path, args.repeat).items():
+                    key = f"{kind}/{size}/{name}"
+                    results[key] = summary
+                    print(f"{key:<48}{summary['median_ms']:10.2f} ms")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                       "qt": QT_VERSION_STR, "platform": platform.platform(), "repeat": args.repeat},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        for name, old, new in regressions:
+            print(f"变慢: {name} {old:.2f} ms -> {new:.2f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import os
+import re
+import shlex
+import sys
+import time
+
+import archive
+import sync_server
+import transfer
+from goal_store import GoalError, GoalStore
+
+
+def build_parser():
+    """
+    创建命令行参数解析器，命令行和脚本文件中的每一行使用相同的命令。
+    """
+    parser = argparse.ArgumentParser(prog="main.py --cli", description="不启动界面，直接批量修改数据")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+
+    commands.add_parser("list", help="列出活动目标")
+
+    command = commands.add_parser("add", help="添加目标")
+    command.add_argument("name", help="目标名称")
+    command.add_argument("times", help="需要完成的次数")
+    command.add_argument("--deadline", default="", help="截止日期，格式为 yyyy-MM-dd")
+
+    command = commands.add_parser("edit", help="修改目标，未指定的项保持不变")
+    command.add_argument("goal", help="目标 id 或名称")
+    command.add_argument("--name", help="新的目标名称")
+    command.add_argument("--deadline", help="新的截止日期")
+    command.add_argument("--times", help="新的需要完成的次数")
+
+    command = commands.add_parser("delete", help="删除目标")
+    command.add_argument("goals", nargs="+", metavar="GOAL", help="目标 id 或名称")
+
+    command = commands.add_parser("inc", help="增加完成次数，达到次数的目标即完成")
+    command.add_argument("goals", nargs="+", metavar="GOAL", help="目标 id 或名称")
+    command.add_argument("--times", type=int, default=1, help="每个目标增加的次数，默认为 1")
+
+    command = commands.add_parser("undo", help="撤销一次完成")
+    command.add_argument("goals", nargs="+", metavar="GOAL", help="目标 id 或名称")
+
+    command = commands.add_parser("complete", help="直接完成目标")
+    command.add_argument("goals", nargs="+", metavar="GOAL", help="目标 id 或名称")
+
+    command = commands.add_parser("import", help="从 CSV 或 NDJSON 文件导入数据，不合法的行只报告不中断")
+    command.add_argument("kind", choices=transfer.KINDS, help="活动目标、已完成目标或操作记录")
+    command.add_argument("path", help="文件路径，为 - 时从标准输入读取")
+    command.add_argument("--format", choices=transfer.FORMATS, help="文件格式，默认由扩展名判断")
+
+    command = commands.add_parser("export", help="把数据导出为 CSV 或 NDJSON 文件")
+    command.add_argument("kind", choices=transfer.KINDS, help="活动目标、已完成目标或操作记录")
+    command.add_argument("path", help="文件路径，为 - 时写到标准输出")
+    command.add_argument("--format", choices=transfer.FORMATS, help="文件格式，默认由扩展名判断")
+    command.add_argument("--no-archive", action="store_true", help="不导出已移入归档的已完成目标和操作记录")
+
+    command = commands.add_parser("archive", help="维护历史数据归档")
+    actions = command.add_subparsers(dest="archive_command", required=True, metavar="ACTION")
+    action = actions.add_parser("run", help="把超过指定天数的操作记录和已完成目标移入归档")
+    action.add_argument("days", type=int, help="保留最近多少天的历史数据")
+    actions.add_parser("list", help="列出归档分段")
+    action = actions.add_parser("repack", help="重写全部分段，清除中断的归档留下的多余记录，可以改用另一种压缩方式")
+    action.add_argument("--compression", choices=archive.COMPRESSIONS, help="新的压缩方式，默认保持不变")
+    action = actions.add_parser("prune", help="删除早于指定月份的分段")
+    action.add_argument("month", help="月份，格式为 yyyy-MM")
+    action.add_argument("--kind", choices=archive.KINDS, help="只删除操作记录或已完成目标的分段，默认两者都删除")
+
+    command = commands.add_parser("serve", help="不启动界面，运行本地 HTTP/JSON 同步服务，按 Ctrl+C 停止")
+    command.add_argument("--host", default=sync_server.DEFAULT_HOST, help="监听的地址，默认只监听本机")
+    command.add_argument("--port", type=int, default=sync_server.DEFAULT_PORT,
+                         help=f"监听的端口，默认为 {sync_server.DEFAULT_PORT}")
+    command.add_argument("--token", help="访问令牌，监听其它地址时应当设置")
+    command.add_argument("--poll", type=float, default=1.0, metavar="SECONDS",
+                         help="每隔多少秒合并一次其它程序对数据文件的修改，默认为 1 秒")
+
+    command = commands.add_parser("run", help="逐行执行脚本中的命令，全部执行完后只保存一次")
+    command.add_argument("script", help="脚本文件路径，为 - 时从标准输入读取")
+    return parser
+
+
+def describe(goal):
+    return "{}\t{}\t{}\t{}/{}".format(goal['id'], goal['name'], goal['deadline'],
+                                      goal['completed_times'], goal['target_times'])
+
+
+def execute(store, args):
+    """
+    执行一条命令。
+
+    参数：
+    store (GoalStore): 目标数据。
+    args (argparse.Namespace): build_parser 解析得到的命令。
+
+    说明：
+    引用的目标全部找到后才开始修改，输入不合法时抛出 GoalError。
+    """
+    if args.command == "list":
+        for goal in store.goals:
+            print(describe(goal))
+    elif args.command == "add":
+        print(describe(store.add_goal(args.name, args.deadline, args.times)))
+    elif args.command == "edit":
+        goal = store.find(args.goal)
+        store.edit_goal(goal['id'],
+                        goal['name'] if args.name is None else args.name,
+                        goal['deadline'] if args.deadline is None else args.deadline,
+                        goal['target_times'] if args.times is None else args.times)
+        print(describe(goal))
+    elif args.command == "import":
+        import_file(store, args)
+    elif args.command == "export":
+        export_file(store, args)
+    elif args.command == "archive":
+        maintain_archive(store, args)
+    elif args.command in ("run", "serve"):
+        raise GoalError(f"脚本中不能使用 {args.command} 命令")
+    else:
+        goal_ids = [store.find(key)['id'] for key in args.goals]
+        if args.command == "delete":
+            with store.batch():
+                for goal_id in goal_ids:
+                    store.delete_goal(goal_id)
+        elif args.command == "undo":
+            with store.batch():
+                for goal_id in goal_ids:
+                    store.decrement(goal_id)
+                    print(describe(store.get(goal_id)))
+        else:
+            if args.command == "inc":
+                goals = store.increment_goals(goal_ids, args.times)
+            else:
+                goals = store.complete_goals(goal_ids)
+            for goal in goals:
+                print(describe(goal) + ("\t已完成" if "completion_date" in goal else ""))
+
+
+def import_file(store, args):
+    """
+    执行 import 命令，逐行报告不合法的数据，有失败的行时抛出 GoalError。
+    """
+    fmt = args.format or ("csv" if args.path == "-" else transfer.detect_format(args.path))
+    source = "标准输入" if args.path == "-" else args.path
+
+    def report(number, message):
+        print(f"{source} 第 {number} 行：{message}", file=sys.stderr)
+
+    if args.path == "-":
+        imported, failed = transfer.import_data(store, args.kind, transfer.read_rows(sys.stdin, fmt), report)
+    else:
+        try:
+            f = transfer.open_file(args.path, fmt, "r")
+        except OSError as e:
+            raise GoalError(f"无法打开文件：{e}") from None
+        with f:
+            imported, failed = transfer.import_data(store, args.kind, transfer.read_rows(f, fmt), report)
+    print(f"已导入 {imported} 行，{failed} 行不合法")
+    if failed:
+        raise GoalError(f"{source} 中有 {failed} 行未能导入")
+
+
+def export_file(store, args):
+    """
+    执行 export 命令，写到标准输出时不打印统计信息。
+    """
+    fmt = args.format or ("csv" if args.path == "-" else transfer.detect_format(args.path))
+    if args.path == "-":
+        transfer.export_data(store, args.kind, sys.stdout, fmt, not args.no_archive)
+        return
+    try:
+        f = transfer.open_file(args.path, fmt, "w")
+    except OSError as e:
+        raise GoalError(f"无法打开文件：{e}") from None
+    with f:
+        count = transfer.export_data(store, args.kind, f, fmt, not args.no_archive)
+    print(f"已导出 {count} 行到 {args.path}")
+
+
+def maintain_archive(store, args):
+    """
+    执行 archive 命令。
+    """
+    history_archive = store.storage.archive
+    if args.archive_command == "run":
+        if args.days < 0:
+            raise GoalError("保留天数不能为负数")
+        actions, completed = store.storage.archive_history(args.days)
+        print(f"已归档 {actions} 条操作记录、{completed} 个已完成目标")
+    elif args.archive_command == "list":
+        actions_before, completed_before = history_archive.cutoff()
+        if actions_before is None and completed_before is None:
+            print("没有归档")
+            return
+        print("操作记录归档至 {}，已完成目标归档至 {}".format(
+            "-" if actions_before is None else time.strftime("%Y-%m-%d %H:%M", time.localtime(actions_before)),
+            completed_before or "-"))
+        for kind in archive.KINDS:
+            for segment in history_archive.segments(kind):
+                path = os.path.join(history_archive.directory, segment['file'])
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                print(f"{kind}\t{segment['month']}\t{segment['count']}\t{size}\t{segment['file']}")
+    elif args.archive_command == "repack":
+        segments, dropped = history_archive.repack(args.compression)
+        print(f"已重写 {segments} 个分段，清除 {dropped} 条多余记录")
+    else:
+        if not re.fullmatch(r"\d{4}-\d{2}", args.month):
+            raise GoalError(f"月份格式应为 yyyy-MM：{args.month}")
+        kinds = archive.KINDS if args.kind is None else (args.kind,)
+        segments, records = history_archive.prune(args.month, kinds)
+        print(f"已删除 {segments} 个分段，共 {records} 条记录")
+
+
+def serve(store, args):
+    """
+    执行 serve 命令：在当前线程中运行同步服务，直到按下 Ctrl+C。
+    """
+    server = sync_server.SyncServer(store, args.host, args.port, args.token)
+
+    def ready():
+        print(f"同步服务已启动：http://{args.host}:{server.port}/goals，按 Ctrl+C 停止", file=sys.stderr)
+
+    try:
+        asyncio.run(server.serve(ready, args.poll))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        raise GoalError(f"无法启动同步服务：{e}") from None
+    finally:
+        server.stop()
+
+
+def run_script(store, parser, lines):
+    """
+    逐行执行脚本中的命令。
+
+    参数：
+    store (GoalStore): 目标数据。
+    parser (argparse.ArgumentParser): build_parser 创建的解析器。
+    lines (iterable): 脚本的各行，# 之后的内容为注释。
+
+    返回值：
+    int: 执行失败的行数。
+
+    说明：
+    所有命令在同一个 batch 中执行，最后只保存一次。某一行失败时报告行号和原因，继续执行其余各行。
+    """
+    errors = 0
+    with store.batch():
+        for number, line in enumerate(lines, 1):
+            try:
+                argv = shlex.split(line, comments=True)
+                if not argv:
+                    continue
+                execute(store, parser.parse_args(argv))
+            except GoalError as e:
+                print(f"第 {number} 行：{e}", file=sys.stderr)
+                errors += 1
+            except (ValueError, SystemExit):
+                # 引号不匹配或命令参数有误，argparse 已经输出了原因
+                print(f"第 {number} 行：无法解析的命令", file=sys.stderr)
+                errors += 1
+    return errors
+
+
+def main(argv, storage):
+    """
+    命令行入口。
+
+    参数：
+    argv (list): --cli 之后的参数。
+    storage (StorageBackend): 存储后端。
+
+    返回值：
+    int: 进程的退出码，全部成功时为 0。
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    store = GoalStore(storage)
+    store.load()
+    try:
+        if args.command == "run":
+            if args.script == "-":
+                errors = run_script(store, parser, sys.stdin)
+            else:
+                with open(args.script, "r", encoding="utf-8") as f:
+                    errors = run_script(store, parser, f)
+            return 1 if errors else 0
+        if args.command == "serve":
+            serve(store, args)
+            return 0
+        execute(store, args)
+        return 0
+    except GoalError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import time
+from datetime import date, datetime
+
+from goal_store import GoalStoreListener
+
+# 截止日期前多少天起视为即将到期，截止日期当天也算即将到期
+DUE_SOON_DAYS = 1
+
+NORMAL = "normal"
+DUE_SOON = "soon"
+OVERDUE = "overdue"
+
+
+def midnight(ordinal):
+    """
+    返回某一天本地时间零点的 Unix 时间戳。
+    """
+    return datetime.combine(date.fromordinal(ordinal), datetime.min.time()).timestamp()
+
+
+class DeadlineScheduler(GoalStoreListener):
+    """
+    截止日期调度器：按截止日期维护活动目标的最小堆，找出即将到期和已经超期的目标。
+
+    说明：
+    每个有截止日期的目标在堆中只有一项，对应它下一次状态变化的时间：
+    截止日期前 DUE_SOON_DAYS 天零点变为即将到期，截止日期次日零点变为超期。
+    添加、修改截止日期时压入新的一项，为 O(log n) 操作；删除目标和修改截止日期时
+    旧的一项只是作废，弹出时丢弃，作废项过多时才整理一次堆。
+
+    通过监听 GoalStore 维护，调用方只需在 next_due 返回的时间调用 pop_due。
+    堆顶可能变化时调用 on_reschedule，界面据此重新设置定时器。
+    """
+
+    def __init__(self, store, due_soon_days=DUE_SOON_DAYS, on_reschedule=None, clock=time.time):
+        """
+        参数：
+        store (GoalStore): 目标数据，调度器会注册为它的监听者。
+        due_soon_days (int): 截止日期前多少天起视为即将到期。
+        on_reschedule (callable): 堆顶可能变化时调用，不带参数。
+        clock (callable): 返回当前 Unix 时间戳，默认为 time.time。
+        """
+        self.store = store
+        self.due_soon_days = due_soon_days
+        self.on_reschedule = None
+        self.clock = clock
+        self._heap = []
+        self._entries = {}  # 目标 id 到其有效堆项序号的映射
+        self._deadlines = {}  # 目标 id 到截止日期序数的映射
+        self._counter = itertools.count()
+        store.add_listener(self)
+        self.goals_reset()
+        # 构造期间调用方还拿不到调度器，建好堆后再开始通知
+        self.on_reschedule = on_reschedule
+
+    def today(self):
+        return date.fromtimestamp(self.clock()).toordinal()
+
+    def state(self, goal_id, today=None):
+        """
+        返回目标当前的状态：NORMAL、DUE_SOON 或 OVERDUE，没有截止日期时为 NORMAL。
+        """
+        deadline = self._deadlines.get(goal_id)
+        if deadline is None:
+            return NORMAL
+        today = self.today() if today is None else today
+        if today > deadline:
+            return OVERDUE
+        if today >= deadline - self.due_soon_days:
+            return DUE_SOON
+        return NORMAL
+
+    def pending(self):
+        """
+        返回当前即将到期和已经超期的目标。
+
+        返回值：
+        tuple: (即将到期的目标列表, 超期的目标列表)。
+        """
+        today = self.today()
+        soon, overdue = [], []
+        for goal_id in self._deadlines:
+            state = self.state(goal_id, today)
+            if state == DUE_SOON:
+                soon.append(self.store.get(goal_id))
+            elif state == OVERDUE:
+                overdue.append(self.store.get(goal_id))
+        return soon, overdue
+
+    def _schedule(self, goal_id, today):
+        """
+        为目标压入下一次状态变化的堆项，同时作废旧的一项。
+        """
+        self._entries.pop(goal_id, None)
+        deadline = self._deadlines.get(goal_id)
+        if deadline is None:
+            return
+        state = self.state(goal_id, today)
+        if state == NORMAL:
+            due = midnight(deadline - self.due_soon_days)
+        elif state == DUE_SOON:
+            due = midnight(deadline + 1)
+        else:
+            return
+        seq = next(self._counter)
+        self._entries[goal_id] = seq
+        heapq.heappush(self._heap, (due, seq, goal_id))
+
+    def _discard_stale(self):
+        while self._heap and self._entries.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        # 作废项超过有效项时整理一次，堆的大小保持在活动目标数的常数倍
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [item for item in self._heap if self._entries.get(item[2]) == item[1]]
+            heapq.heapify(self._heap)
+
+    def _reschedule(self):
+        if self.on_reschedule is not None:
+            self.on_reschedule()
+
+    def next_due(self):
+        """
+        返回下一次状态变化的 Unix 时间戳，没有待变化的目标时返回 None。
+        """
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self):
+        """
+        弹出已到时间的状态变化。
+
+        返回值：
+        list: 每项为 (目标, 新状态)，新状态为 DUE_SOON 或 OVERDUE。
+
+        说明：
+        每个弹出的目标会压入它的下一次状态变化，已经超期的目标不再留在堆中。
+        """
+        now = self.clock()
+        today = self.today()
+        events = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, goal_id = heapq.heappop(self._heap)
+            self._entries.pop(goal_id, None)
+            state = self.state(goal_id, today)
+            if state != NORMAL:
+                events.append((self.store.get(goal_id), state))
+            self._schedule(goal_id, today)
+        return events
+
+    def _update(self, goal):
+        deadline = goal.deadline_day
+        if deadline is None:
+            self._deadlines.pop(goal['id'], None)
+        else:
+            self._deadlines[goal['id']] = deadline
+        self._schedule(goal['id'], self.today())
+        self._reschedule()
+
+    def goal_inserted(self, row):
+        self._update(self.store.goals[row])
+
+    def goal_removing(self, row):
+        goal_id = self.store.goals[row]['id']
+        self._deadlines.pop(goal_id, None)
+        self._entries.pop(goal_id, None)
+
+    def goal_changed(self, row):
+        goal = self.store.goals[row]
+        # 完成次数的变化也会通知，截止日期未变时无需调整堆
+        if goal.deadline_day != self._deadlines.get(goal['id']):
+            self._update(goal)
+
+    def goals_reset(self):
+        today = self.today()
+        self._heap = []
+        self._entries = {}
+        self._deadlines = {}
+        items = []
+        for goal in self.store.goals:
+            deadline = goal.deadline_day
+            if deadline is None:
+                continue
+            self._deadlines[goal['id']] = deadline
+            state = self.state(goal['id'], today)
+            if state == OVERDUE:
+                continue
+            due = midnight(deadline - self.due_soon_days if state == NORMAL else deadline + 1)
+            seq = next(self._counter)
+            self._entries[goal['id']] = seq
+            items.append((due, seq, goal['id']))
+        # 一次建堆为 O(n)
+        heapq.heapify(items)
+        self._heap = items
+        self._reschedule()
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    数据文件的建议锁，多个程序实例写入同一份数据时互斥。
+
+    说明：
+    锁加在 path + ".lock" 上，POSIX 系统使用 flock，Windows 使用 msvcrt.locking，
+    两者都不可用时只在进程内互斥。同一进程内可以重入，不同线程之间同样互斥。
+    """
+
+    def __init__(self, path):
+        self.path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    self._file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            # LK_LOCK 重试约 10 秒后仍失败时抛出 OSError，继续等待
+                            continue
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+
+def file_signature(path_or_fd):
+    """
+    返回文件的 (inode, 大小, 修改时间)，用于判断文件是否被其它程序修改或替换，文件不存在时返回 None。
+    """
+    try:
+        st = os.fstat(path_or_fd) if isinstance(path_or_fd, int) else os.stat(path_or_fd)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def write_json_atomic(path, data, **dump_kwargs):
+    """
+    以原子方式把数据写入 JSON 文件。
+
+    参数：
+    path (str): 目标文件路径。
+    data (object): 要写入的数据。
+    dump_kwargs: 传给 json.dump 的其它参数。
+
+    返回值：
+    int: 写入的字节数。
+
+    说明：
+    先写入同目录下的临时文件并刷新到磁盘，再用 os.replace 替换目标文件。
+    写入过程中程序崩溃时，原文件保持不变。
+    """
+    tmp_path = f"{path}.tmp"
+    size = write_json_file(tmp_path, data, **dump_kwargs)
+    os.replace(tmp_path, path)
+    return size
+
+
+def write_json_file(path, data, **dump_kwargs):
+    """
+    把数据写入 JSON 文件并刷新到磁盘，返回写入的字节数。
+    """
+    with open(path, "w") as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+        return os.fstat(f.fileno()).st_size
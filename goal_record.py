@@ -0,0 +1,317 @@
+import sys
+from bisect import bisect_left
+from datetime import date
+from functools import lru_cache
+
+KEYS = ('id', 'name', 'deadline', 'target_times', 'completed_times')
+DATE_KEYS = ('deadline', 'completion_date')
+KNOWN_KEYS = frozenset(KEYS + DATE_KEYS)
+
+# 没有截止日期的目标排在最后
+NO_DEADLINE = sys.maxsize
+
+
+@lru_cache(maxsize=4096)
+def parse_date(text):
+    """
+    返回规范的 yyyy-MM-dd 日期的序数，为空或不规范时返回 None。
+
+    说明：
+    只接受 isoformat 能原样还原的文字，序数和文字可以互相转换而不改变内容。
+    """
+    if not text or len(text) != 10 or text[4] != '-' or text[7] != '-':
+        return None
+    try:
+        return date.fromisoformat(text).toordinal()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def format_date(day):
+    """
+    返回日期序数对应的 yyyy-MM-dd 文字。
+    """
+    return date.fromordinal(day).isoformat()
+
+
+class GoalRecord:
+    """
+    一个活动目标或已完成目标的紧凑记录。
+
+    属性：
+    id (str): 目标 id。
+    name (str): 目标名称。
+    deadline_day (int): 截止日期的序数，没有截止日期时为 None。
+    target_times (int): 需要完成的次数。
+    completed_times (int): 已完成的次数。
+    completion_day (int): 完成日期的序数，活动目标为 None。
+
+    说明：
+    目标原本是键为字符串的 dict，日期也是字符串，每次比较截止日期都要重新解析。GoalRecord 用 __slots__
+    保存各项，截止日期和完成日期保存为日期序数（date.toordinal），同时保留 dict 式的读写接口。
+    to_json 和 from_json 与数据文件中的格式互相转换，不规范的日期文字和未知的键原样保留，转换不丢失信息。
+
+    也可以像 dict 一样按数据文件中的键读写：goal['deadline'] 返回截止日期的文字，没有截止日期时为空字符串；
+    活动目标没有 'completion_date' 键。日期文字不规范时序数为 None，文字保存在 _texts 中；
+    数据文件中的其它键保存在 _extra 中。两者通常都为 None，不占用额外的内存。
+    """
+    __slots__ = ('id', 'name', 'deadline_day', 'target_times', 'completed_times', 'completion_day',
+                 '_texts', '_extra')
+
+    def __init__(self, goal_id, name, deadline="", target_times=1, completed_times=0, completion_date=None):
+        """
+        参数：
+        goal_id (str): 目标 id。
+        name (str): 目标名称。
+        deadline (str): 截止日期，格式为 yyyy-MM-dd，可以为空。
+        target_times (int): 需要完成的次数。
+        completed_times (int): 已完成的次数。
+        completion_date (str): 完成日期，活动目标为 None。
+        """
+        self.id = goal_id
+        self.name = name
+        self.target_times = target_times
+        self.completed_times = completed_times
+        self._texts = None
+        self._extra = None
+        self._set_date('deadline', deadline or "")
+        self.completion_day = None
+        if completion_date is not None:
+            self._set_date('completion_date', completion_date)
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        由数据文件中的 dict 创建记录，缺少的截止日期视为空。
+        """
+        goal = cls(data.get('id'), data.get('name', ""), data.get('deadline', ""), data.get('target_times', 1),
+                   data.get('completed_times', 0), data.get('completion_date'))
+        if not data.keys() <= KNOWN_KEYS:
+            goal._extra = {key: value for key, value in data.items() if key not in KNOWN_KEYS}
+        return goal
+
+    def to_json(self):
+        """
+        转换为数据文件中的 dict，与 from_json 读入的内容相同。
+        """
+        data = {'id': self.id, 'name': self.name, 'deadline': self['deadline'],
+                'target_times': self.target_times, 'completed_times': self.completed_times}
+        if self.completion_day is not None or (self._texts and 'completion_date' in self._texts):
+            data['completion_date'] = self['completion_date']
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def copy(self):
+        goal = GoalRecord.__new__(GoalRecord)
+        for name in self.__slots__:
+            setattr(goal, name, getattr(self, name))
+        if self._texts is not None:
+            goal._texts = dict(self._texts)
+        if self._extra is not None:
+            goal._extra = dict(self._extra)
+        return goal
+
+    def _set_date(self, key, text):
+        day = parse_date(text)
+        # 空的完成日期也要保留，它表示完成日期未知的已完成目标
+        if day is None and (text or key == 'completion_date'):
+            if self._texts is None:
+                self._texts = {}
+            self._texts[key] = text
+        elif self._texts is not None:
+            self._texts.pop(key, None)
+        if key == 'deadline':
+            self.deadline_day = day
+        else:
+            self.completion_day = day
+
+    def _date_text(self, key, day):
+        if day is not None:
+            return format_date(day)
+        if self._texts is not None and key in self._texts:
+            return self._texts[key]
+        return None
+
+    def __getitem__(self, key):
+        if key == 'deadline':
+            return self._date_text(key, self.deadline_day) or ""
+        if key == 'completion_date':
+            text = self._date_text(key, self.completion_day)
+            if text is None:
+                raise KeyError(key)
+            return text
+        if key in KEYS:
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in DATE_KEYS:
+            self._set_date(key, value)
+        elif key in KEYS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        if key == 'completion_date':
+            return self._date_text(key, self.completion_day) is not None
+        return key in KEYS or (self._extra is not None and key in self._extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = list(KEYS)
+        if 'completion_date' in self:
+            keys.append('completion_date')
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def update(self, other):
+        """
+        按 dict 或另一个 GoalRecord 中的各项更新。
+        """
+        for key in other.keys():
+            self[key] = other[key]
+
+    def __eq__(self, other):
+        if isinstance(other, GoalRecord):
+            other = other.to_json()
+        return isinstance(other, dict) and self.to_json() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"GoalRecord({self.to_json()!r})"
+
+
+def name_key(goal):
+    return goal.name
+
+
+def progress_key(goal):
+    """
+    按完成比例排序的键，比例相同时按已完成次数。
+    """
+    return goal.completed_times / max(goal.target_times, 1), goal.completed_times
+
+
+def deadline_key(goal):
+    """
+    按截止日期排序的键，截止日期相同时按名称，没有截止日期的目标排在最后。
+    """
+    return NO_DEADLINE if goal.deadline_day is None else goal.deadline_day, goal.name
+
+
+class GoalOrder:
+    """
+    按排序键排列的目标 id 序列。
+
+    说明：
+    序列中每项为 (key(goal), 目标 id)，id 使排序键相同的目标也有确定的先后。
+    建立时排序一次，之后添加、删除和修改一个目标都用 bisect 定位，只移动列表中的元素，不重新排序。
+    """
+
+    def __init__(self, key, goals=()):
+        """
+        参数：
+        key (callable): 由 GoalRecord 得到排序键，键中不应含有 None。
+        goals (iterable): 初始的目标。
+        """
+        self.key = key
+        self._keys = {goal.id: key(goal) for goal in goals}
+        self._items = sorted((item_key, goal_id) for goal_id, item_key in self._keys.items())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, position):
+        return self._items[position][1]
+
+    def __iter__(self):
+        return (goal_id for _, goal_id in self._items)
+
+    def copy(self):
+        order = GoalOrder.__new__(GoalOrder)
+        order.key = self.key
+        order._keys = dict(self._keys)
+        order._items = list(self._items)
+        return order
+
+    def position(self, goal_id):
+        """
+        返回目标在序列中的位置，不在序列中时返回 -1。
+        """
+        item_key = self._keys.get(goal_id)
+        if item_key is None:
+            return -1
+        return bisect_left(self._items, (item_key, goal_id))
+
+    def insert_position(self, goal):
+        """
+        返回添加 goal 时它将处于的位置。
+        """
+        return bisect_left(self._items, (self.key(goal), goal.id))
+
+    def updated_position(self, goal):
+        """
+        返回目标的内容变化后它将处于的位置，位置按移出它之后的序列计算，不修改序列。
+        """
+        old = self.position(goal.id)
+        new = bisect_left(self._items, (self.key(goal), goal.id))
+        return new - 1 if new > old else new
+
+    def add(self, goal):
+        """
+        添加目标，返回它的位置。
+        """
+        item_key = self._keys[goal.id] = self.key(goal)
+        position = bisect_left(self._items, (item_key, goal.id))
+        self._items.insert(position, (item_key, goal.id))
+        return position
+
+    def remove(self, goal_id):
+        """
+        删除目标，返回它原来的位置，不在序列中时返回 -1。
+        """
+        position = self.position(goal_id)
+        if position >= 0:
+            del self._items[position]
+            del self._keys[goal_id]
+        return position
+
+    def update(self, goal):
+        """
+        目标的内容变化后调整它的位置。
+
+        返回值：
+        tuple: (原来的位置, 新的位置)，排序键未变时两者相同。
+        """
+        old = self.position(goal.id)
+        item_key = self.key(goal)
+        if item_key == self._keys[goal.id]:
+            return old, old
+        del self._items[old]
+        self._keys[goal.id] = item_key
+        new = bisect_left(self._items, (item_key, goal.id))
+        self._items.insert(new, (item_key, goal.id))
+        return old, new
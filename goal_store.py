@@ -0,0 +1,737 @@
+import time
+from contextlib import contextmanager
+
+import instrumentation
+from action_log import ActionKind, ActionRecord
+from analytics import ProgressStats
+from goal_record import GoalOrder, GoalRecord, deadline_key
+from search import SearchIndex
+from storage import add_monthly_completion, create_storage, goal_values, new_goal_id
+
+NAME_MAX_LENGTH = 10
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class GoalError(ValueError):
+    """
+    目标操作失败，消息可以直接显示给用户。
+    """
+
+
+def validate_goal(name, deadline, target_times):
+    """
+    检查目标的名称、截止日期和需要完成的次数。
+
+    参数：
+    name (str): 目标名称，首尾空格会被去除。
+    deadline (str): 截止日期，格式为 yyyy-MM-dd，可以为空。
+    target_times (str | int): 需要完成的次数，可以是用户输入的文字。
+
+    返回值：
+    tuple: 规范化后的 (名称, 截止日期, 次数)。
+
+    说明：
+    不合法时抛出 GoalError，消息与界面上的提示相同。
+    """
+    name = name.strip()
+    if not name:
+        raise GoalError("请输入目标名称！")
+    if len(name) > NAME_MAX_LENGTH:
+        raise GoalError("目标名称不能超过10个字符！")
+
+    deadline = (deadline or "").strip()
+    if deadline:
+        try:
+            # 统一为补零的格式，截止日期可以保存为日期序数
+            deadline = time.strftime(DATE_FORMAT, time.strptime(deadline, DATE_FORMAT))
+        except ValueError:
+            raise GoalError("截止日期的格式应为 yyyy-MM-dd！") from None
+
+    if isinstance(target_times, str):
+        target_times = target_times.strip()
+        if not target_times:
+            raise GoalError("请输入需要完成的次数！")
+    try:
+        target_times = int(target_times)
+    except (TypeError, ValueError):
+        raise GoalError("请输入有效的次数！") from None
+    if target_times < 1:
+        raise GoalError("目标次数不能小于1次！")
+    return name, deadline, target_times
+
+
+def validate_completed_times(completed_times, target_times):
+    """
+    检查导入的已完成次数，空值视为 0。
+
+    返回值：
+    int: 已完成次数，应在 0 和需要完成的次数之间。
+    """
+    if isinstance(completed_times, str):
+        completed_times = completed_times.strip() or 0
+    try:
+        completed_times = int(completed_times or 0)
+    except (TypeError, ValueError):
+        raise GoalError("请输入有效的完成次数！") from None
+    if not 0 <= completed_times <= target_times:
+        raise GoalError("完成次数应在 0 和目标次数之间！")
+    return completed_times
+
+
+def validate_date(date):
+    """
+    检查 yyyy-MM-dd 格式的日期，返回去除首尾空格并补零后的日期。
+    """
+    date = (date or "").strip()
+    try:
+        return time.strftime(DATE_FORMAT, time.strptime(date, DATE_FORMAT))
+    except ValueError:
+        raise GoalError(f"日期的格式应为 yyyy-MM-dd：{date}") from None
+
+
+class MergeReport:
+    """
+    合并其它程序所做修改的结果。
+
+    属性：
+    added (list): 对方新增的目标。
+    updated (list): 按对方的修改更新的目标。
+    removed (list): 对方删除或完成的目标。
+    completed (list): 对方新增的已完成目标。
+    actions (int): 对方新增的操作记录数。
+    conflicts (list): 双方都修改了的目标，每项为说明文字，冲突时保留本地的修改。
+    """
+
+    def __init__(self):
+        self.added = []
+        self.updated = []
+        self.removed = []
+        self.completed = []
+        self.actions = 0
+        self.conflicts = []
+
+    def summary(self):
+        """
+        返回显示给用户的一行摘要。
+        """
+        parts = []
+        for label, count in (("新增", len(self.added)), ("更新", len(self.updated)), ("移除", len(self.removed)),
+                             ("完成", len(self.completed)), ("新操作记录", self.actions),
+                             ("冲突", len(self.conflicts))):
+            if count:
+                parts.append(f"{label} {count}")
+        return "已合并其它窗口的修改：" + ("，".join(parts) if parts else "无变化")
+
+
+class GoalStoreListener:
+    """
+    监听活动目标列表的变化。
+
+    说明：
+    插入、移除和重置分别在修改列表之前和之后各通知一次，与 Qt 模型的 begin / end 调用一一对应，
+    row 为目标在 GoalStore.goals 中的位置。新增的操作记录和已完成目标（包括从其它程序合并来的）
+    也逐条通知。默认实现什么也不做。
+    """
+
+    def goal_inserting(self, row):
+        """目标即将插入到 row 位置。"""
+
+    def goal_inserted(self, row):
+        """目标已插入到 row 位置。"""
+
+    def goal_removing(self, row):
+        """row 位置的目标即将被移除。"""
+
+    def goal_removed(self, row):
+        """row 位置的目标已被移除。"""
+
+    def goal_changed(self, row):
+        """row 位置的目标内容发生了变化。"""
+
+    def goals_resetting(self):
+        """整个目标列表即将被替换。"""
+
+    def goals_reset(self):
+        """整个目标列表已被替换。"""
+
+    def action_recorded(self, record):
+        """新增了一条操作记录 ActionRecord。"""
+
+    def goal_completed(self, goal):
+        """新增了一个已完成目标。"""
+
+    def external_merged(self, report):
+        """已合并其它程序所做的修改，report 为 MergeReport。"""
+
+
+class GoalStore:
+    """
+    与界面无关的目标管理核心。
+
+    说明：
+    负责输入验证、完成次数的增减、完成判定、操作记录和持久化，界面、命令行和其它调用方
+    都通过它修改数据。每个公开的修改方法结束时调用一次 commit；在 batch 中执行的多个修改
+    只在 batch 结束时持久化一次。
+
+    目标列表的变化通过 GoalStoreListener 通知监听者。目标 id 到位置的映射在删除目标后只把
+    其后的部分标记为过期，下次查询到过期部分时才一并修正。没有删除时查找是 O(1) 操作；
+    删除之后第一次查找过期部分中的目标需要 O(n) 重新编号，与从 goals 中删除元素本身同阶，
+    之后的查找又是 O(1)。连续删除多个目标时每次删除都要重新编号，活动目标不多时可以接受。
+
+    进度统计在第一次调用 progress_stats 时由全部操作记录建立，之后随每条操作记录和每个
+    完成的目标增量更新。搜索索引 search_index 同样在第一次使用时建立，在通知监听者之前增量更新，
+    监听者收到通知时就能搜索到变化后的目标。
+
+    目标保存为 GoalRecord。deadline_order 是按截止日期排列的 GoalOrder，同样在通知监听者之前维护，
+    每次增删改只需一次 bisect 定位，需要按截止日期排列目标时不必解析日期或重新排序。
+
+    其它程序修改了同一份数据时，sync_external 按目标 id 合并对方的修改，只通知发生变化的目标；
+    每次持久化之前也会先检查并合并，不会覆盖对方的数据。
+    """
+
+    def __init__(self, storage=None):
+        """
+        参数：
+        storage (StorageBackend): 存储后端，默认使用当前目录下的 "goals.json"。
+        """
+        self.storage = storage if storage is not None else create_storage()
+        self.goals = []
+        self.goal_index = {}
+        self.deadline_order = GoalOrder(deadline_key)
+        self._rows = {}
+        self._stale_from = 0  # 从该位置开始，_rows 中的位置可能已过期
+        self._listeners = []
+        self._batch_depth = 0
+        self._stats = None
+        self._search = None
+
+    @instrumentation.timed("load_data")
+    def load(self):
+        """
+        从存储后端加载活动目标，已完成目标和操作记录由存储后端推迟加载。
+        """
+        for listener in self._listeners:
+            listener.goals_resetting()
+        self.goals = self.storage.load()['goals']
+        self.goal_index = {goal['id']: goal for goal in self.goals}
+        self.deadline_order = GoalOrder(deadline_key, self.goals)
+        self._rows = {}
+        self._stale_from = 0
+        self._stats = None
+        if self._search is not None:
+            self._search.reset_goals()
+            self._search.reset_history()
+        for listener in self._listeners:
+            listener.goals_reset()
+
+    @property
+    def completed_goals(self):
+        """
+        已完成目标列表，历史数据尚未加载完成时等待加载。
+        """
+        return self.storage.load_history()['completed_goals']
+
+    @property
+    def monthly_completions(self):
+        """
+        按月汇总的完成数，历史数据尚未加载完成时等待加载。
+        """
+        return self.storage.load_history()['monthly_completions']
+
+    def progress_stats(self):
+        """
+        返回进度统计 ProgressStats，第一次调用时由全部操作记录和已完成目标建立。
+        """
+        if self._stats is None:
+            token = instrumentation.begin("progress_stats.build")
+            self._stats = ProgressStats.build(self.storage.iter_actions(), self.completed_goals)
+            instrumentation.end(token)
+        return self._stats
+
+    def search_index(self):
+        """
+        返回搜索索引 SearchIndex，第一次调用时建立活动目标的索引。
+        """
+        if self._search is None:
+            self._search = SearchIndex(self)
+        return self._search
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def get(self, goal_id):
+        """
+        按 id 返回活动目标，不存在时返回 None。
+        """
+        return self.goal_index.get(goal_id)
+
+    def find(self, key):
+        """
+        按 id 或名称查找活动目标。
+
+        参数：
+        key (str): 目标 id，或者唯一的目标名称。
+
+        返回值：
+        dict: 找到的目标。找不到或名称不唯一时抛出 GoalError。
+        """
+        goal = self.goal_index.get(key)
+        if goal is not None:
+            return goal
+        matches = [goal for goal in self.goals if goal['name'] == key]
+        if not matches:
+            raise GoalError(f"找不到目标：{key}")
+        if len(matches) > 1:
+            raise GoalError(f"有多个目标名为 {key}，请使用 id")
+        return matches[0]
+
+    def row_of(self, goal_id):
+        """
+        返回目标在 goals 中的位置，找不到时返回 -1。
+
+        说明：
+        目标在过期部分中时先重新编号从 _stale_from 到末尾的目标，是 O(n) 操作。
+        """
+        row = self._rows.get(goal_id)
+        if (row is None or row >= self._stale_from) and self._stale_from < len(self.goals):
+            for i in range(self._stale_from, len(self.goals)):
+                self._rows[self.goals[i]['id']] = i
+            self._stale_from = len(self.goals)
+            row = self._rows.get(goal_id)
+        return -1 if row is None else row
+
+    @contextmanager
+    def batch(self):
+        """
+        把其中的多个修改合并为一次持久化。
+
+        说明：
+        可以嵌套，最外层结束时才调用存储后端的 commit。中途抛出异常时，已完成的修改仍会被保存。
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self.commit()
+
+    def commit(self):
+        """
+        持久化自上次 commit 以来的修改，在 batch 中时推迟到 batch 结束。
+        """
+        if self._batch_depth == 0:
+            token = instrumentation.begin("save_data")
+            if self.storage.external_changed():
+                self._sync_external()
+            self.storage.commit()
+            instrumentation.end(token)
+
+    def close(self):
+        """
+        保存尚未持久化的数据并释放存储后端的资源。
+        """
+        if self.storage.external_changed():
+            self._sync_external()
+        self.storage.close()
+
+    def sync_external(self):
+        """
+        合并其它程序对数据文件所做的修改并保存合并结果。
+
+        返回值：
+        MergeReport: 合并结果，没有外部修改时返回 None。
+        """
+        report = self._sync_external()
+        if report is not None:
+            self.storage.commit()
+        return report
+
+    def _sync_external(self):
+        """
+        三方合并活动目标：以上次同步时的数据为基准，只有对方修改的目标采用对方的版本，
+        只有本地修改的目标保持不变，双方都修改且结果不同时保留本地的版本并记为冲突。
+        保留本地版本的目标重新告知存储后端，使文件中的数据与内存一致。
+        """
+        external = self.storage.read_external()
+        if external is None:
+            return None
+        token = instrumentation.begin("sync_external")
+        report = MergeReport()
+        base = external['base']
+        theirs = {goal['id']: goal for goal in external['goals']}
+        completed_ids = {goal['id'] for goal in external['completed_goals']}
+
+        for goal in list(self.goals):
+            goal_id = goal['id']
+            ours = goal_values(goal)
+            their_goal = theirs.get(goal_id)
+            their_values = None if their_goal is None else goal_values(their_goal)
+            if their_values == ours:
+                continue
+            if goal_id not in base:
+                if their_values is not None:
+                    report.conflicts.append(f"双方都添加了 id 相同的目标【{goal['name']}】，保留本地的版本")
+                    self.storage.update_goal(goal)
+                continue
+            if ours == base[goal_id]:
+                if their_goal is None:
+                    self._remove(goal_id)
+                    (report.completed if goal_id in completed_ids else report.removed).append(goal)
+                else:
+                    goal.update(their_goal)
+                    self._changed(goal, persist=False)
+                    report.updated.append(goal)
+            elif their_values != base[goal_id]:
+                if their_goal is None:
+                    report.conflicts.append(f"目标【{goal['name']}】已在其它窗口删除或完成，保留本地修改后的目标")
+                    self.storage.add_goal(goal)
+                else:
+                    report.conflicts.append(f"目标【{goal['name']}】在两边都被修改，保留本地的修改")
+                    self.storage.update_goal(goal)
+
+        for goal_id, their_goal in theirs.items():
+            if goal_id in self.goal_index:
+                continue
+            if goal_id not in base:
+                goal = their_goal.copy()
+                self._insert(goal)
+                report.added.append(goal)
+            elif goal_values(their_goal) != base[goal_id]:
+                report.conflicts.append(f"目标【{their_goal['name']}】已在本地删除，但在其它窗口被修改，仍然删除")
+                self.storage.delete_goal(their_goal)
+
+        # 对方新增的已完成目标和操作记录已由存储后端加入历史数据，这里只需更新统计
+        reported = {goal['id'] for goal in report.completed}
+        report.completed.extend(goal for goal in external['completed_goals'] if goal['id'] not in reported)
+        report.actions = len(external['actions'])
+        if self._stats is not None:
+            for record in external['actions']:
+                self._stats.add_action(record)
+            for goal in external['completed_goals']:
+                self._stats.add_completed(goal)
+        if self._search is not None:
+            for record in external['actions']:
+                self._search.action_added(record)
+            for goal in external['completed_goals']:
+                self._search.completed_added(goal)
+        for listener in self._listeners:
+            for record in external['actions']:
+                listener.action_recorded(record)
+            for goal in external['completed_goals']:
+                listener.goal_completed(goal)
+
+        self.storage.external_merged()
+        instrumentation.end(token, conflicts=len(report.conflicts))
+        for listener in self._listeners:
+            listener.external_merged(report)
+        return report
+
+    def record_action(self, kind, goal, old=None, new=None):
+        """
+        记录一条用户操作。
+
+        参数：
+        kind (ActionKind): 操作类型。
+        goal (dict): 操作的目标。
+        old (list): 修改前的 [名称, 截止日期, 次数]，仅修改操作需要。
+        new (list): 修改后的 [名称, 截止日期, 次数]，仅修改操作需要。
+        """
+        self._add_action(ActionRecord.now(kind, goal, old, new))
+
+    def _add_action(self, record):
+        self.storage.add_action(record)
+        if self._stats is not None:
+            self._stats.add_action(record)
+        if self._search is not None:
+            self._search.action_added(record)
+        for listener in self._listeners:
+            listener.action_recorded(record)
+
+    def _add_completed(self, goal):
+        self.completed_goals.append(goal)
+        add_monthly_completion(self.monthly_completions, goal)
+        self.storage.complete_goal(goal)
+        if self._stats is not None:
+            self._stats.add_completed(goal)
+        if self._search is not None:
+            self._search.completed_added(goal)
+        for listener in self._listeners:
+            listener.goal_completed(goal)
+
+    def _insert(self, goal):
+        row = len(self.goals)
+        for listener in self._listeners:
+            listener.goal_inserting(row)
+        self.goals.append(goal)
+        self.goal_index[goal['id']] = goal
+        if self._stale_from == row:
+            self._rows[goal['id']] = row
+            self._stale_from = row + 1
+        self.deadline_order.add(goal)
+        if self._search is not None:
+            self._search.goal_added(goal)
+        for listener in self._listeners:
+            listener.goal_inserted(row)
+
+    def _remove(self, goal_id):
+        row = self.row_of(goal_id)
+        for listener in self._listeners:
+            listener.goal_removing(row)
+        del self.goals[row]
+        del self._rows[goal_id]
+        self._stale_from = min(self._stale_from, row)
+        goal = self.goal_index.pop(goal_id)
+        self.deadline_order.remove(goal_id)
+        if self._search is not None:
+            self._search.goal_removed(goal)
+        for listener in self._listeners:
+            listener.goal_removed(row)
+        return goal
+
+    def _changed(self, goal, persist=True):
+        row = self.row_of(goal['id'])
+        self.deadline_order.update(goal)
+        if self._search is not None:
+            self._search.goal_changed(goal)
+        for listener in self._listeners:
+            listener.goal_changed(row)
+        if persist:
+            self.storage.update_goal(goal)
+
+    def add_goal(self, name, deadline, target_times):
+        """
+        添加新目标。
+
+        参数：
+        name (str): 目标名称。
+        deadline (str): 截止日期，格式为 yyyy-MM-dd，可以为空。
+        target_times (str | int): 需要完成的次数。
+
+        返回值：
+        dict: 新目标。输入不合法时抛出 GoalError，不做任何修改。
+        """
+        goal = self._add_validated(validate_goal(name, deadline, target_times))
+        self.commit()
+        return goal
+
+    def add_goals(self, specs):
+        """
+        批量添加目标，只持久化一次。
+
+        参数：
+        specs (iterable): (名称, 截止日期, 次数) 的序列。
+
+        返回值：
+        list: 新目标列表。
+
+        说明：
+        先检查全部输入，有任何一项不合法时抛出 GoalError，不添加任何目标。
+        """
+        validated = []
+        for position, spec in enumerate(specs, 1):
+            try:
+                validated.append(validate_goal(*spec))
+            except GoalError as e:
+                raise GoalError(f"第 {position} 个目标：{e}") from None
+        goals = [self._add_validated(values) for values in validated]
+        self.commit()
+        return goals
+
+    def import_goal(self, name, deadline, target_times, completed_times=0, goal_id=None):
+        """
+        导入一个活动目标，验证规则与 add_goal 相同。
+
+        参数：
+        completed_times (str | int): 已完成的次数，应小于需要完成的次数。
+        goal_id (str): 原有的目标 id，为空时分配新的 id。
+
+        返回值：
+        dict: 新目标。输入不合法或 id 已被占用时抛出 GoalError，不做任何修改。
+
+        说明：
+        大量导入时应在 batch 中调用，全部导入后只持久化一次。
+        """
+        values = validate_goal(name, deadline, target_times)
+        completed_times = validate_completed_times(completed_times, values[2])
+        if completed_times == values[2]:
+            raise GoalError("已达到目标次数的目标应导入为已完成目标！")
+        if goal_id and goal_id in self.goal_index:
+            raise GoalError(f"目标 id 已存在：{goal_id}")
+        goal = self._add_validated(values, completed_times, goal_id or None)
+        self.commit()
+        return goal
+
+    def import_completed_goal(self, name, deadline, target_times, completion_date,
+                              completed_times=None, goal_id=None):
+        """
+        导入一个已完成目标，并计入按月汇总的完成数。
+
+        参数：
+        completion_date (str): 完成日期，格式为 yyyy-MM-dd。
+        completed_times (str | int): 已完成的次数，为空时等于需要完成的次数。
+        goal_id (str): 原有的目标 id，为空时分配新的 id。
+
+        返回值：
+        dict: 已完成目标。输入不合法时抛出 GoalError，不做任何修改。
+        """
+        name, deadline, target_times = validate_goal(name, deadline, target_times)
+        if completed_times in (None, ""):
+            completed_times = target_times
+        completed_times = validate_completed_times(completed_times, target_times)
+        goal = GoalRecord(goal_id or new_goal_id(), name, deadline, target_times, completed_times,
+                          validate_date(completion_date))
+        self._add_completed(goal)
+        self.commit()
+        return goal
+
+    def import_action(self, record):
+        """
+        导入一条操作记录 ActionRecord，追加在已有记录之后。
+        """
+        self._add_action(record)
+        self.commit()
+
+    def _add_validated(self, values, completed_times=0, goal_id=None):
+        name, deadline, target_times = values
+        goal = GoalRecord(goal_id or new_goal_id(), name, deadline, target_times, completed_times)
+        self._insert(goal)
+        self.storage.add_goal(goal)
+        self.record_action(ActionKind.ADD, goal)
+        return goal
+
+    def edit_goal(self, goal_id, name, deadline, target_times):
+        """
+        修改目标的名称、截止日期和需要完成的次数。
+
+        返回值：
+        dict: 修改后的目标，目标不存在时返回 None。输入不合法时抛出 GoalError。
+        """
+        name, deadline, target_times = validate_goal(name, deadline, target_times)
+        goal = self.goal_index.get(goal_id)
+        if goal is None:
+            return None
+
+        old = [goal["name"], goal["deadline"], goal["target_times"]]
+        goal["name"] = name
+        goal["deadline"] = deadline
+        goal["target_times"] = target_times
+        self._changed(goal)
+        self.record_action(ActionKind.EDIT, goal, old, [name, deadline, target_times])
+        self.commit()
+        return goal
+
+    def delete_goal(self, goal_id):
+        """
+        删除目标。
+
+        返回值：
+        dict: 被删除的目标，目标不存在时返回 None。
+        """
+        if goal_id not in self.goal_index:
+            return None
+        goal = self._remove(goal_id)
+        self.storage.delete_goal(goal)
+        self.record_action(ActionKind.DELETE, goal)
+        self.commit()
+        return goal
+
+    def _complete(self, goal):
+        """
+        把达到次数的目标移入已完成目标，记录完成日期并计入按月汇总的完成数。
+
+        说明：
+        目标从列表中移除但不记录删除操作，完成只由调用方记录的一条完成操作表示。
+        """
+        goal["completion_date"] = time.strftime(DATE_FORMAT)
+        self._add_completed(goal)
+        self._remove(goal['id'])
+        self.storage.delete_goal(goal)
+
+    def increment(self, goal_id, times=1):
+        """
+        增加目标的完成次数，达到需要完成的次数时目标即完成。
+
+        参数：
+        goal_id (str): 目标 id。
+        times (int): 增加的次数，每次都记录一条完成操作。
+
+        返回值：
+        dict: 目标，目标不存在时返回 None。目标已完成时带有 completion_date。
+        """
+        goal = self.goal_index.get(goal_id)
+        if goal is None:
+            return None
+        with self.batch():
+            for _ in range(times):
+                goal["completed_times"] += 1
+                if goal["completed_times"] >= goal["target_times"]:
+                    self._complete(goal)
+                    self.record_action(ActionKind.COMPLETE, goal)
+                    break
+                self._changed(goal)
+                self.record_action(ActionKind.COMPLETE, goal)
+        return goal
+
+    def increment_goals(self, goal_ids, times=1):
+        """
+        批量增加多个目标的完成次数，只持久化一次。
+
+        返回值：
+        list: 各目标，顺序与 goal_ids 相同。
+
+        说明：
+        先检查全部 id，有目标不存在时抛出 GoalError，不做任何修改。
+        """
+        missing = [goal_id for goal_id in goal_ids if goal_id not in self.goal_index]
+        if missing:
+            raise GoalError("找不到目标：{}".format(", ".join(missing)))
+        with self.batch():
+            return [self.increment(goal_id, times) for goal_id in goal_ids]
+
+    def complete_goals(self, goal_ids):
+        """
+        把多个目标直接标记为完成，只持久化一次。
+
+        返回值：
+        list: 已完成的目标，顺序与 goal_ids 相同。
+
+        说明：
+        先检查全部 id，有目标不存在时抛出 GoalError，不做任何修改。
+        完成次数直接设为需要完成的次数，每个目标只记录一条完成操作。
+        """
+        missing = [goal_id for goal_id in goal_ids if goal_id not in self.goal_index]
+        if missing:
+            raise GoalError("找不到目标：{}".format(", ".join(missing)))
+        goals = [self.goal_index[goal_id] for goal_id in goal_ids]
+        with self.batch():
+            for goal in goals:
+                # 同一个 id 出现多次时只完成一次
+                if goal['id'] in self.goal_index:
+                    goal["completed_times"] = goal["target_times"]
+                    self._complete(goal)
+                    self.record_action(ActionKind.COMPLETE, goal)
+        return goals
+
+    def decrement(self, goal_id):
+        """
+        撤销一次完成。
+
+        返回值：
+        bool: 是否减少了完成次数，目标不存在或完成次数已为 0 时返回 False。
+
+        说明：
+        与界面上的行为一致，完成次数已为 0 时也会记录一条撤销操作。
+        """
+        goal = self.goal_index.get(goal_id)
+        if goal is None:
+            return False
+        reduced = goal["completed_times"] > 0
+        if reduced:
+            goal["completed_times"] -= 1
+            self._changed(goal)
+        self.record_action(ActionKind.UNDO, goal)
+        self.commit()
+        return reduced
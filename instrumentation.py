@@ -0,0 +1,217 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 耗时分布的各区间上限（毫秒），最后一个区间没有上限
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# 最多保留的 trace 事件数，超出后丢弃最早的事件
+MAX_TRACE_EVENTS = 100000
+
+_enabled = False
+_lock = threading.Lock()
+_origin = time.perf_counter()
+_timings = {}
+_sizes = {}
+_events = deque(maxlen=MAX_TRACE_EVENTS)
+
+
+class TimingStats:
+    """
+    一项操作的耗时统计。
+    """
+    __slots__ = ('count', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        milliseconds = seconds * 1000
+        for bucket, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if milliseconds <= bound:
+                break
+        else:
+            bucket = len(HISTOGRAM_BOUNDS_MS)
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction):
+        """
+        由耗时分布估计百分位数，返回所在区间的上限（毫秒），落在最后一个区间时返回最大值。
+        """
+        target = self.count * fraction
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target and count:
+                if bucket < len(HISTOGRAM_BOUNDS_MS):
+                    return min(HISTOGRAM_BOUNDS_MS[bucket], self.max * 1000)
+                break
+        return self.max * 1000
+
+
+class SizeStats:
+    """
+    一项持久化操作写入的数据量统计。
+    """
+    __slots__ = ('count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def add(self, size):
+        self.count += 1
+        self.total += size
+        self.max = max(self.max, size)
+        self.last = size
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(on=True):
+    """
+    开启或关闭埋点，已有的统计保留。
+
+    说明：
+    埋点默认关闭，关闭时每个埋点只多一次全局变量判断。开启后记录各操作的调用次数、耗时分布、
+    持久化写入的数据量，以及可以在 chrome://tracing 或 Perfetto 中查看的 trace 事件。
+    """
+    global _enabled
+    _enabled = on
+
+
+def reset():
+    """
+    清空全部统计和 trace 事件。
+    """
+    with _lock:
+        _timings.clear()
+        _sizes.clear()
+        _events.clear()
+
+
+def _record(name, start, end, args=None):
+    duration = end - start
+    event = {"name": name, "ph": "X", "ts": (start - _origin) * 1e6, "dur": duration * 1e6,
+             "pid": os.getpid(), "tid": threading.get_ident()}
+    if args:
+        event["args"] = args
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = TimingStats()
+        stats.add(duration)
+        _events.append(event)
+
+
+def timed(name):
+    """
+    装饰器，记录每次调用的耗时。
+
+    说明：
+    包装后的函数接收任意参数，不能直接连接到会传递额外参数的 Qt 信号（如 clicked），
+    这类槽函数应在内部使用 begin / end。
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, start, time.perf_counter())
+        return wrapper
+    return decorate
+
+
+def begin(name):
+    """
+    开始记录一段操作，返回传给 end 的标记；埋点关闭时返回 None。
+    """
+    if not _enabled:
+        return None
+    return name, time.perf_counter()
+
+
+def end(token, **args):
+    """
+    结束 begin 开始的一段操作，args 作为 trace 事件的附加信息。
+    """
+    if token is not None:
+        _record(token[0], token[1], time.perf_counter(), args)
+
+
+def record_size(name, size):
+    """
+    记录一次持久化写入的字节数。
+    """
+    if not _enabled:
+        return
+    with _lock:
+        stats = _sizes.get(name)
+        if stats is None:
+            stats = _sizes[name] = SizeStats()
+        stats.add(size)
+        _events.append({"name": name, "ph": "C", "ts": (time.perf_counter() - _origin) * 1e6,
+                        "pid": os.getpid(), "args": {"bytes": size}})
+
+
+def timing_report():
+    """
+    返回耗时统计的副本，按总耗时从多到少排列。
+
+    返回值：
+    list: 每项为 dict，包含 name、count、total_ms、mean_ms、p50_ms、p95_ms、max_ms 和 histogram。
+    """
+    with _lock:
+        items = list(_timings.items())
+        report = [{"name": name, "count": stats.count, "total_ms": stats.total * 1000,
+                   "mean_ms": stats.total * 1000 / stats.count, "p50_ms": stats.percentile(0.5),
+                   "p95_ms": stats.percentile(0.95), "max_ms": stats.max * 1000,
+                   "histogram": list(stats.histogram)} for name, stats in items]
+    report.sort(key=lambda item: item["total_ms"], reverse=True)
+    return report
+
+
+def size_report():
+    """
+    返回写入数据量统计的副本。
+
+    返回值：
+    list: 每项为 dict，包含 name、count、total、max 和 last（字节）。
+    """
+    with _lock:
+        return [{"name": name, "count": stats.count, "total": stats.total, "max": stats.max, "last": stats.last}
+                for name, stats in sorted(_sizes.items())]
+
+
+def export_trace(path):
+    """
+    把 trace 事件写成 Chrome trace event 格式的 JSON 文件。
+
+    返回值：
+    int: 写出的事件数。
+    """
+    with _lock:
+        events = list(_events)
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in names.items()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return len(events)
@@ -1,9 +1,29 @@
+import time
+STARTUP_TIME = time.perf_counter()  # 启动计时的起点，供 --profile-startup 使用
+
 import sys
-import json
+import argparse
+import concurrent.futures
 import os
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QCalendarWidget, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QHeaderView, QListWidget, QProgressBar
-from PyQt5.QtCore import QDate, Qt, QDateTime, QSize
-from PyQt5.QtGui import QIcon, QPixmap
+import sqlite3
+from functools import lru_cache
+from itertools import islice
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QCalendarWidget, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QHeaderView, QListView, QTableView, QCheckBox, QComboBox, QDateEdit, QStyledItemDelegate, QStyle, QStyleOptionButton, QStyleOptionProgressBar, QAbstractItemView, QFileDialog, QInputDialog, QSystemTrayIcon
+from PyQt5.QtCore import QDate, Qt, QDateTime, QSize, QRect, QEvent, QTimer, QFileSystemWatcher, QObject, QAbstractTableModel, QAbstractListModel, QSortFilterProxyModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap, QPainter, QColor
+
+from datetime import date
+
+import archive
+import cli
+import instrumentation
+from action_log import ActionFilter, ActionKind
+from deadlines import DUE_SOON, OVERDUE, DeadlineScheduler
+from goal_record import GoalOrder, deadline_key, name_key, progress_key
+from goal_store import GoalError, GoalStore, GoalStoreListener
+from storage import SqliteStorage
+from sync_server import DEFAULT_HOST, DEFAULT_PORT, SyncServer
+from workspaces import DEFAULT_CAPACITY, DEFAULT_WORKSPACE, WorkspaceError, create_workspaces
 
 
 def resource_path(relative_path):
@@ -24,21 +44,1157 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-class GoalManager(QWidget):
-    def __init__(self):
+@lru_cache(maxsize=None)
+def load_icon(relative_path):
+    """
+    返回图标文件对应的 QIcon，同一文件只加载一次，主窗口、代理和对话框共用。
+    """
+    return QIcon(resource_path(relative_path))
+
+
+@lru_cache(maxsize=None)
+def load_pixmap(relative_path, width):
+    """
+    返回缩放到指定宽度的图片，同一文件和宽度只加载并缩放一次。
+    """
+    return QPixmap(resource_path(relative_path)).scaledToWidth(width)
+
+
+class StartupProfiler:
+    """
+    记录启动过程中各阶段的耗时，用于 --profile-startup。
+    """
+
+    def __init__(self, start):
+        """
+        参数：
+        start (float): 计时起点，time.perf_counter() 的返回值。
+        """
+        self.start = start
+        self._last = start
+        self.phases = []
+
+    def mark(self, name):
+        """
+        结束当前阶段，记录从上一阶段结束到现在的耗时。
+        """
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self):
+        """
+        打印各阶段的耗时和总耗时。
+        """
+        for name, seconds in self.phases:
+            print(f"{name:<16}{seconds * 1000:9.1f} ms")
+        print(f"{'total':<16}{(self._last - self.start) * 1000:9.1f} ms")
+
+
+class GoalsTableModel(QAbstractTableModel, GoalStoreListener):
+    """
+    目标列表的表格模型。
+
+    说明：
+    模型直接读取 GoalStore 中的目标列表，并作为监听者接收列表的变化：
+    增删目标时视图只插入或移除对应的行，目标内容变化时只刷新一行。
+    超期和即将到期的目标由 DeadlineScheduler 判断，以不同的背景色显示。
+
+    点击表头排序时，模型按该列的排序键维护一个 GoalOrder：按截止日期排序时直接复制 GoalStore 维护的
+    deadline_order，按其它列排序时排序一次。之后增删改目标都用 bisect 定位，视图只插入、移除或移动一行，
+    不再重新排序。点击操作列恢复添加的顺序。
+
+    set_query 按名称筛选时，模型只显示搜索索引找到的目标，_rows 为它们按显示顺序排列的 id；
+    筛选期间增删目标时重新搜索并重置模型，筛选结果通常很少，重置的开销很小。
+    """
+    HEADERS = ["名称", "截止时间", "完成次数", "操作"]
+    ACTION_COLUMN = 3
+    DEADLINE_COLUMN = 1
+    SORT_KEYS = {0: name_key, DEADLINE_COLUMN: deadline_key, 2: progress_key}
+    STATE_COLORS = {OVERDUE: QColor("#FDDCDC"), DUE_SOON: QColor("#FFF3CD")}
+
+    def __init__(self, store, deadlines=None, parent=None):
+        """
+        参数：
+        store (GoalStore): 目标数据。
+        deadlines (DeadlineScheduler): 截止日期调度器，为 None 时不标记超期的目标。
+        """
+        super().__init__(parent)
+        self._store = store
+        self._deadlines = deadlines
+        self._query = ""
+        self._rows = None  # 筛选时显示的目标 id，按显示顺序排列；不筛选时为 None
+        self._order = None  # 排序时为按排序键排列的 GoalOrder；按添加顺序显示时为 None
+        self._descending = False
+        store.add_listener(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self._rows is not None:
+            return len(self._rows)
+        return len(self._store.goals) if self._order is None else len(self._order)
+
+    def set_query(self, query):
+        """
+        只显示名称包含 query 的目标，query 为空时显示全部目标。
+        """
+        self.beginResetModel()
+        self._query = query.strip()
+        self._update_rows()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        按 column 列排序，没有排序键的列（以及 column 为 -1 时）恢复添加的顺序。
+        """
+        token = instrumentation.begin("goals.sort")
+        key = self.SORT_KEYS.get(column)
+        self.beginResetModel()
+        if key is None:
+            self._order = None
+        elif column == self.DEADLINE_COLUMN:
+            self._order = self._store.deadline_order.copy()
+        else:
+            self._order = GoalOrder(key, self._store.goals)
+        self._descending = order == Qt.DescendingOrder
+        self._update_rows()
+        self.endResetModel()
+        instrumentation.end(token, column=column)
+
+    def _update_rows(self):
+        if not self._query:
+            self._rows = None
+            return
+        goal_ids = self._store.search_index().search_goals(self._query)
+        if self._order is None:
+            self._rows = sorted(goal_ids, key=self._store.row_of)
+        else:
+            self._rows = sorted(goal_ids, key=self._order.position, reverse=self._descending)
+
+    def _display_row(self, position, count=None):
+        """
+        把 GoalOrder 中的位置转换为显示的行号，降序时从末尾数起。count 为序列的长度，默认为当前长度。
+        """
+        if not self._descending:
+            return position
+        return (len(self._order) if count is None else count) - 1 - position
+
+    def goal_at(self, row):
+        """
+        返回显示在第 row 行的目标。
+        """
+        if self._rows is not None:
+            return self._store.goal_index[self._rows[row]]
+        if self._order is not None:
+            return self._store.goal_index[self._order[self._display_row(row)]]
+        return self._store.goals[row]
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        goal = self.goal_at(index.row())
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return goal['name']
+            if column == 1:
+                return goal['deadline']
+            if column == 2:
+                return f"{goal['completed_times']}/{goal['target_times']}"
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        elif role == Qt.BackgroundRole:
+            if self._deadlines is not None:
+                return self.STATE_COLORS.get(self._deadlines.state(goal['id']))
+        elif role == Qt.UserRole:
+            return goal
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        # 表格内容不可编辑
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def _refresh(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def goal_inserting(self, row):
+        if self._rows is not None:
+            self.beginResetModel()
+        elif self._order is None:
+            self.beginInsertRows(QModelIndex(), row, row)
+
+    def goal_inserted(self, row):
+        goal = self._store.goals[row]
+        if self._rows is not None:
+            if self._order is not None:
+                self._order.add(goal)
+            self._update_rows()
+            self.endResetModel()
+        elif self._order is None:
+            self.endInsertRows()
+        else:
+            # 目标已加入 GoalStore，但在加入 _order 之前模型仍按原来的行数显示
+            row = self._display_row(self._order.insert_position(goal), len(self._order) + 1)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._order.add(goal)
+            self.endInsertRows()
+
+    def goal_removing(self, row):
+        goal_id = self._store.goals[row]['id']
+        if self._rows is not None:
+            self.beginResetModel()
+            if self._order is not None:
+                self._order.remove(goal_id)
+        elif self._order is None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+        else:
+            row = self._display_row(self._order.position(goal_id))
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._order.remove(goal_id)
+            self.endRemoveRows()
+
+    def goal_removed(self, row):
+        if self._rows is not None:
+            self._update_rows()
+            self.endResetModel()
+        elif self._order is None:
+            self.endRemoveRows()
+
+    def goal_changed(self, row):
+        """
+        刷新 GoalStore.goals 中第 row 个目标所在的行。
+
+        说明：
+        排序时排序键的变化使目标移到新的位置，视图只移动这一行。筛选时名称的变化使它进出筛选结果，
+        或者排序后它在筛选结果中的位置变化，则重置模型。
+        """
+        goal = self._store.goals[row]
+        if self._rows is not None:
+            moved = False
+            if self._order is not None:
+                old, new = self._order.update(goal)
+                moved = old != new
+            visible = goal['id'] in self._rows
+            if moved or visible != (goal['id'] in self._store.search_index().search_goals(self._query)):
+                self.set_query(self._query)
+            elif visible:
+                self._refresh(self._rows.index(goal['id']))
+            return
+        if self._order is None:
+            self._refresh(row)
+            return
+        source = self._display_row(self._order.position(goal['id']))
+        target = self._display_row(self._order.updated_position(goal))
+        if target != source:
+            # destinationChild 是移动前的行号，向下移动时要指向目标位置的下一行
+            self.beginMoveRows(QModelIndex(), source, source, QModelIndex(),
+                               target + 1 if target > source else target)
+            self._order.update(goal)
+            self.endMoveRows()
+        else:
+            # 位置未变时排序键也可能已变化，同样要更新
+            self._order.update(goal)
+        self._refresh(target)
+
+    def goals_resetting(self):
+        self.beginResetModel()
+
+    def goals_reset(self):
+        if self._order is not None and self._order.key is deadline_key:
+            self._order = self._store.deadline_order.copy()
+        elif self._order is not None:
+            self._order = GoalOrder(self._order.key, self._store.goals)
+        self._update_rows()
+        self.endResetModel()
+
+    def set_store(self, store, deadlines=None):
+        """
+        改为显示另一个 GoalStore 中的目标，排序列和筛选条件保持不变。
+
+        参数：
+        store (GoalStore): 目标数据，已加载。
+        deadlines (DeadlineScheduler): store 的截止日期调度器。
+        """
+        self.goals_resetting()
+        self._store.remove_listener(self)
+        self._store = store
+        self._deadlines = deadlines
+        store.add_listener(self)
+        self.goals_reset()
+
+
+class GoalActionsDelegate(QStyledItemDelegate):
+    """
+    绘制“操作”列的代理。
+
+    说明：
+    不再为每一行创建按钮和进度条控件，而是直接绘制增加、编辑、删除、撤销四个按钮和进度条，
+    并在 editorEvent 中根据点击位置发出对应的信号。
+    """
+    add_clicked = pyqtSignal(str)
+    edit_clicked = pyqtSignal(str)
+    delete_clicked = pyqtSignal(str)
+    reduce_clicked = pyqtSignal(str)
+
+    BUTTON_WIDTH = 50
+    BUTTON_HEIGHT = 30
+    PROGRESS_WIDTH = 80
+    MARGIN = 9
+    SPACING = 6
+    BUTTON_ICONS = ['./icons/add.png', './icons/edit.png', './icons/delete.png', './icons/undo.png']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._icons = [load_icon(path) for path in self.BUTTON_ICONS]
+        self._signals = [self.add_clicked, self.edit_clicked, self.delete_clicked, self.reduce_clicked]
+        self._pressed = None  # (行号, 按钮序号)
+
+    def button_rects(self, rect):
+        """
+        计算单元格内四个按钮和进度条的位置。
+
+        参数：
+        rect (QRect): 单元格区域。
+
+        返回值：
+        tuple: (按钮区域列表, 进度条区域)。
+        """
+        x = rect.x() + self.MARGIN
+        y = rect.y() + (rect.height() - self.BUTTON_HEIGHT) // 2
+        buttons = []
+        for _ in self._icons:
+            buttons.append(QRect(x, y, self.BUTTON_WIDTH, self.BUTTON_HEIGHT))
+            x += self.BUTTON_WIDTH + self.SPACING
+        progress = QRect(x, y, self.PROGRESS_WIDTH, self.BUTTON_HEIGHT)
+        return buttons, progress
+
+    def paint(self, painter, option, index):
+        goal = index.data(Qt.UserRole)
+        if goal is None:
+            super().paint(painter, option, index)
+            return
+        style = option.widget.style() if option.widget else QApplication.style()
+        button_rects, progress_rect = self.button_rects(option.rect)
+
+        for i, rect in enumerate(button_rects):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.icon = self._icons[i]
+            button.iconSize = QSize(16, 16)
+            button.state = QStyle.State_Enabled
+            if self._pressed == (index.row(), i):
+                button.state |= QStyle.State_Sunken
+            else:
+                button.state |= QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+        # 绘制进度条
+        progress = QStyleOptionProgressBar()
+        progress.rect = progress_rect
+        progress.minimum = 0
+        progress.maximum = goal['target_times']
+        progress.progress = min(goal['completed_times'], goal['target_times'])
+        progress.text = f"{goal['completed_times']}/{goal['target_times']}"
+        progress.textVisible = True
+        progress.textAlignment = Qt.AlignCenter
+        progress.state = QStyle.State_Enabled | QStyle.State_Horizontal
+        style.drawControl(QStyle.CE_ProgressBar, progress, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        width = self.MARGIN * 2 + (self.BUTTON_WIDTH + self.SPACING) * len(self._icons) + self.PROGRESS_WIDTH
+        return QSize(width, self.BUTTON_HEIGHT + self.MARGIN * 2)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return super().editorEvent(event, model, option, index)
+        if event.button() != Qt.LeftButton:
+            return False
+
+        button_rects, _ = self.button_rects(option.rect)
+        hit = next((i for i, rect in enumerate(button_rects) if rect.contains(event.pos())), None)
+        if event.type() == QEvent.MouseButtonPress:
+            self._pressed = (index.row(), hit) if hit is not None else None
+            return hit is not None
+
+        pressed, self._pressed = self._pressed, None
+        if hit is None or pressed != (index.row(), hit):
+            return pressed is not None
+        self._signals[hit].emit(index.data(Qt.UserRole)['id'])
+        return True
+
+
+class CompletedGoalsModel(QAbstractTableModel):
+    """
+    已完成目标的表格模型。
+
+    说明：
+    已完成目标列表可能很长，模型按页通过 canFetchMore / fetchMore 逐步加入行，
+    打开对话框时只创建可见部分需要的行。Qt.UserRole 返回用于排序的值。
+    主数据中的目标全部加入后，再从新到旧每次读取一个月的归档分段。
+    set_query 按名称搜索时，主数据和归档分段中的目标都由搜索索引查找。
+    """
+    HEADERS = ["名称", "截止时间", "完成次数", "完成日期"]
+    PAGE_SIZE = 500
+
+    def __init__(self, completed_goals, history_archive=None, search=None, parent=None):
+        """
+        参数：
+        completed_goals (list): 主数据中的已完成目标。
+        history_archive (HistoryArchive): 归档，为 None 时只显示主数据中的目标。
+        search (SearchIndex): 搜索索引，为 None 时不能按名称搜索。
+        parent (QObject): 父对象。
+        """
+        super().__init__(parent)
+        self._all = completed_goals
+        self._archive = history_archive
+        self._search = search
+        self._query = ""
+        self._reset_rows()
+
+    def _reset_rows(self):
+        self._goals = self._search.search_completed(self._query) if self._query else self._all
+        self._count = len(self._goals)  # 主数据中的目标数，归档中的目标排在其后
+        self._loaded = 0
+        self._segments = [] if self._archive is None else self._archive.segments("completed")
+        self._archived_total = sum(segment['count'] for segment in self._segments)
+        self._archived = []
+
+    def set_query(self, query):
+        """
+        只显示名称包含 query 的目标，query 为空时显示全部目标。
+        """
+        self.beginResetModel()
+        self._query = query.strip() if self._search is not None else ""
+        self._reset_rows()
+        self.endResetModel()
+
+    def refresh(self, completed_goals, history_archive=None, search=None):
+        """
+        重新打开对话框时换成当前的数据。
+
+        参数与构造函数相同。
+
+        说明：
+        数据来源不变、只是主数据中追加了新完成的目标时，只加入新的行，已加载的行和代理模型的排序保持不变；
+        数据来源变化、有目标移入归档或正在按名称搜索时重置模型。
+        """
+        archived_total = 0 if history_archive is None else history_archive.count("completed")
+        added = len(completed_goals) - self._count
+        if (completed_goals is not self._all or history_archive is not self._archive or search is not self._search
+                or self._query or added < 0 or archived_total != self._archived_total):
+            self.beginResetModel()
+            self._all = completed_goals
+            self._archive = history_archive
+            self._search = search
+            self._reset_rows()
+            self.endResetModel()
+            return
+        if added == 0:
+            return
+        if self._loaded < self._count:
+            # 新的行排在尚未加载的行之后，增加可加载的行数即可
+            self._count += added
+            return
+        # 主数据已全部加载，新的行插入在主数据之后、归档中的目标之前
+        self.beginInsertRows(QModelIndex(), self._count, self._count + added - 1)
+        self._count += added
+        self._loaded += added
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        goal = self._goals[row] if row < self._count else self._archived[row - self._count]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return goal['name']
+            if column == 1:
+                return goal['deadline']
+            if column == 2:
+                return str(goal['completed_times'])
+            return goal.get('completion_date', '')
+        if role == Qt.UserRole:
+            # 排序用的值：完成次数按数字排序，日期字符串格式为 yyyy-MM-dd，可直接按文字排序
+            if column == 2:
+                return goal['completed_times']
+            return self.data(index, Qt.DisplayRole)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self._loaded < self._count or bool(self._segments))
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self._loaded < self._count:
+            self._insert(min(self.PAGE_SIZE, self._count - self._loaded))
+        elif self._segments:
+            self._fetch_segment()
+
+    def _insert(self, count):
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def _fetch_segment(self):
+        segment = self._segments.pop(0)
+        if self._query:
+            goals = self._search.search_segment(self._archive, segment, self._query)
+        else:
+            goals = self._archive.read(segment)
+        if goals:
+            self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + len(goals) - 1)
+            self._archived.extend(goals)
+            self._loaded += len(goals)
+            self.endInsertRows()
+
+    def fetch_all(self):
+        """
+        一次加入剩余的全部行（包括归档中的目标），排序前需要所有行都已加载。
+        """
+        if self._loaded < self._count:
+            self._insert(self._count - self._loaded)
+        while self._segments:
+            self._fetch_segment()
+
+
+class CompletedGoalsProxyModel(QSortFilterProxyModel):
+    """
+    已完成目标的排序代理模型。
+
+    说明：
+    按名称筛选由源模型通过搜索索引完成；排序需要完整的数据，因此在第一次按某列排序时才加载全部行。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(Qt.UserRole)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column >= 0:
+            self.sourceModel().fetch_all()
+        super().sort(column, order)
+
+
+class ActionHistoryModel(QAbstractListModel):
+    """
+    目标记录的列表模型。
+
+    说明：
+    记录不会一次性全部加载，视图滚动到底部时通过 canFetchMore / fetchMore 从存储后端再取一页。
+    筛选条件交给存储后端在返回记录之前应用，模型中只保存已经显示过的记录，
+    显示用的文字在视图需要时才生成。主数据中的记录取完后，继续从归档中按月份从新到旧分页读取。
+    有搜索索引时，按名称筛选改由索引查找，不再逐条比较全部记录。
+    """
+    PAGE_SIZE = 200
+
+    def __init__(self, storage, search=None, parent=None):
+        """
+        参数：
+        storage (StorageBackend): 存储后端。
+        search (SearchIndex): 搜索索引，为 None 时按名称筛选也交给存储后端。
+        parent (QObject): 父对象。
+        """
+        super().__init__(parent)
+        self._storage = storage
+        self._search = search
+        self._results = None  # 按名称搜索时逐条产生结果的迭代器
+        self._filter = None
+        self._records = []
+        self._cursor = None
+        self._in_archive = False
+        self._exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._records[index.row()].render()
+        if role == Qt.UserRole:
+            return self._records[index.row()]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        history_archive = self._storage.archive
+        if self._results is not None:
+            records = list(islice(self._results, self.PAGE_SIZE))
+            self._exhausted = len(records) < self.PAGE_SIZE
+        elif self._in_archive:
+            records, self._cursor = history_archive.query_actions(self._filter, self._cursor, self.PAGE_SIZE)
+            self._exhausted = self._cursor is None
+        else:
+            records, self._cursor = self._storage.query_actions(self._filter, self._cursor, self.PAGE_SIZE)
+            if self._cursor is None:
+                self._in_archive = history_archive is not None and bool(history_archive.segments("actions"))
+                self._exhausted = not self._in_archive
+        if not records:
+            return
+        row = len(self._records)
+        self.beginInsertRows(QModelIndex(), row, row + len(records) - 1)
+        self._records.extend(records)
+        self.endInsertRows()
+
+    def set_filter(self, action_filter):
+        """
+        更换筛选条件，清空已加载的记录并从最新的记录重新分页加载。
+
+        参数：
+        action_filter (ActionFilter): 筛选条件，为 None 时显示全部记录。
+        """
+        self.beginResetModel()
+        self._filter = action_filter
+        self._records = []
+        self._cursor = None
+        self._in_archive = False
+        self._exhausted = False
+        self._results = None
+        if action_filter is not None and action_filter.name and self._search is not None:
+            self._results = self._search_results(action_filter)
+        self.endResetModel()
+
+    def _search_results(self, action_filter):
+        """
+        由搜索索引按名称查找记录，再按其余条件筛选，主数据中的记录之后是归档中的记录。
+        """
+        rest = ActionFilter(action_filter.start, action_filter.end, action_filter.kinds)
+        for record in self._search.search_actions(action_filter.name):
+            if rest.matches(record):
+                yield record
+        history_archive = self._storage.archive
+        if history_archive is None:
+            return
+        for segment in history_archive.segments("actions"):
+            if archive.segment_overlaps(segment, rest):
+                for record in self._search.search_segment(history_archive, segment, action_filter.name):
+                    if rest.matches(record):
+                        yield record
+
+
+class ActivityHeatmap(QWidget):
+    """
+    每日完成数的热力图。
+
+    说明：
+    每列是一周，从上到下为星期一到星期日，颜色越深当天完成的次数越多。
+    """
+    CELL = 11
+    GAP = 2
+    EMPTY_COLOR = QColor("#EBEDF0")
+    FULL_COLOR = QColor("#5171F0")
+
+    def __init__(self, first_day, counts, parent=None):
+        """
+        参数：
+        first_day (int): 第一天（星期一）的日期序数。
+        counts (list): 从第一天开始每天的完成数。
+        """
+        super().__init__(parent)
+        self.setMouseTracking(True)
+        self.set_counts(first_day, counts)
+
+    def set_counts(self, first_day, counts):
+        """
+        换成新的每日完成数，参数与构造函数相同。
+        """
+        self._first_day = first_day
+        self._counts = counts
+        self._max = max(counts, default=0)
+        weeks = (len(counts) + 6) // 7
+        step = self.CELL + self.GAP
+        self.setFixedSize(weeks * step, 7 * step)
+        self.update()
+
+    def _color(self, count):
+        if count <= 0 or self._max <= 0:
+            return self.EMPTY_COLOR
+        # 按完成数分为四档，最少的一档也要和空白明显区分
+        level = min(4, 1 + (count * 4 - 1) // self._max) / 4
+        empty, full = self.EMPTY_COLOR, self.FULL_COLOR
+        return QColor(int(empty.red() + (full.red() - empty.red()) * level),
+                      int(empty.green() + (full.green() - empty.green()) * level),
+                      int(empty.blue() + (full.blue() - empty.blue()) * level))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        step = self.CELL + self.GAP
+        for index, count in enumerate(self._counts):
+            week, weekday = divmod(index, 7)
+            painter.fillRect(week * step, weekday * step, self.CELL, self.CELL, self._color(count))
+
+    def mouseMoveEvent(self, event):
+        step = self.CELL + self.GAP
+        index = event.pos().x() // step * 7 + event.pos().y() // step
+        if 0 <= index < len(self._counts):
+            day = date.fromordinal(self._first_day + index)
+            self.setToolTip("{}：完成 {} 次".format(day.isoformat(), self._counts[index]))
+        else:
+            self.setToolTip("")
+
+
+class EditGoalDialog(QDialog):
+    """
+    编辑目标的对话框。
+
+    说明：
+    对话框在第一次编辑时创建，之后一直保留，每次打开时由 set_goal 填入要编辑的目标，
+    不必每次重新创建日历等控件。点击保存时发出 save_clicked 信号，由主窗口验证并保存。
+    """
+    save_clicked = pyqtSignal(str, str, str, str)  # 目标 id、名称、截止日期、需要完成的次数
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("编辑目标")
+        self.goal_id = None
+        layout = QVBoxLayout()
+
+        self.name_input = QLineEdit()
+        self.name_input.setMaxLength(10)  # 设置最大输入长度为10
+        layout.addWidget(QLabel("目标名称:"))
+        layout.addWidget(self.name_input)
+
+        self.deadline_label = QLabel()
+        layout.addWidget(QLabel("截止日期:"))
+        layout.addWidget(self.deadline_label)
+
+        self.calendar = QCalendarWidget()
+        self.calendar.clicked[QDate].connect(lambda date: self.deadline_label.setText(date.toString("yyyy-MM-dd")))
+        layout.addWidget(self.calendar)
+
+        self.times_input = QLineEdit()
+        self.times_input.setMaxLength(3)  # 设置最大输入长度为3
+        layout.addWidget(QLabel("需要完成的次数:"))
+        layout.addWidget(self.times_input)
+
+        save_button = QPushButton("保存")
+        save_button.clicked.connect(lambda: self.save_clicked.emit(
+            self.goal_id, self.name_input.text(), self.deadline_label.text(), self.times_input.text()))
+        layout.addWidget(save_button)
+
+        self.setLayout(layout)
+
+    def set_goal(self, goal):
+        """
+        填入要编辑的目标，日历选中它的截止日期，没有截止日期时选中今天。
+        """
+        self.goal_id = goal["id"]
+        self.name_input.setText(goal["name"])
+        self.deadline_label.setText(goal["deadline"])
+        deadline = QDate.fromString(goal["deadline"], "yyyy-MM-dd")
+        self.calendar.setSelectedDate(deadline if deadline.isValid() else QDate.currentDate())
+        self.times_input.setText(str(goal["target_times"]))
+        self.name_input.setFocus()
+
+
+class CompletedGoalsDialog(QDialog):
+    """
+    已完成目标列表的对话框。
+
+    说明：
+    对话框在第一次打开时创建，之后一直保留。每次打开时由 refresh 换成当前的数据：
+    表格模型只加入新完成的目标，按月汇总的表格只改写完成数有变化的行。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("已完成目标列表")
+        layout = QHBoxLayout()
+
+        table_layout = QVBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("按名称搜索")
+        self.filter_input.setMaxLength(10)
+        table_layout.addWidget(self.filter_input)
+
+        self.archived_label = QLabel()
+        self.archived_label.hide()
+        table_layout.addWidget(self.archived_label)
+
+        self.completed_model = CompletedGoalsModel([], parent=self)
+        proxy_model = CompletedGoalsProxyModel(self)
+        proxy_model.setSourceModel(self.completed_model)
+        self.filter_input.textChanged.connect(self.completed_model.set_query)
+
+        self.completed_table = QTableView()
+        self.completed_table.setModel(proxy_model)
+        self.completed_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.completed_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        # 不指定初始排序列，打开时不必加载全部数据
+        self.completed_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.completed_table.setSortingEnabled(True)
+        table_layout.addWidget(self.completed_table)
+        layout.addLayout(table_layout)
+
+        # 按月汇总的完成数
+        self.summary_table = QTableWidget(0, 2)
+        self.summary_table.setHorizontalHeaderLabels(["月份", "完成数"])
+        self.summary_table.verticalHeader().hide()
+        self.summary_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.summary_table.setFixedWidth(180)
+        self._months = []  # 汇总表格中显示的 (月份, 完成数)
+        layout.addWidget(self.summary_table)
+
+        self.setLayout(layout)
+        self.resize(700, 400)
+
+    def refresh(self, store, query):
+        """
+        换成当前的数据。
+
+        参数：
+        store (GoalStore): 目标数据。
+        query (str): 主窗口搜索框中的文字，打开后直接显示搜索结果。
+        """
+        history_archive = store.storage.archive
+        archived = 0 if history_archive is None else history_archive.count("completed")
+        self.archived_label.setText(f"较早完成的 {archived} 个目标已归档，滚动到底部时按月读取")
+        self.archived_label.setVisible(bool(archived))
+
+        self.completed_model.refresh(store.completed_goals, history_archive, store.search_index())
+        if self.filter_input.text() != query:
+            # 文字变化时由 textChanged 重新搜索
+            self.filter_input.setText(query)
+
+        months = sorted(store.monthly_completions.items(), reverse=True)
+        if months == self._months:
+            return
+        self.summary_table.setRowCount(len(months))
+        for row, (month, count) in enumerate(months):
+            if row < len(self._months) and self._months[row] == (month, count):
+                continue
+            self.summary_table.setItem(row, 0, QTableWidgetItem(month))
+            self.summary_table.setItem(row, 1, QTableWidgetItem(str(count)))
+        self._months = months
+
+
+class ActionHistoryDialog(QDialog):
+    """
+    目标记录的对话框。
+
+    说明：
+    对话框在第一次打开时创建，之后一直保留，日期范围和操作类型的筛选条件也保留到下次打开。
+    每次打开时由 refresh 从最新的记录重新分页加载，只读取第一页。
+    """
+    KINDS = [("全部操作", None), ("添加", ActionKind.ADD), ("修改", ActionKind.EDIT), ("删除", ActionKind.DELETE),
+             ("完成", ActionKind.COMPLETE), ("撤销", ActionKind.UNDO)]
+
+    def __init__(self, storage, search=None, parent=None):
+        """
+        参数：
+        storage (StorageBackend): 存储后端。
+        search (SearchIndex): 搜索索引，为 None 时按名称筛选也交给存储后端。
+        parent (QWidget): 父窗口。
+        """
+        super().__init__(parent)
+        self.setWindowTitle("目标记录")
+        self._storage = storage
+        layout = QVBoxLayout()
+
+        # 筛选条件
+        filter_layout = QHBoxLayout()
+        self.date_check = QCheckBox("日期:")
+        self.start_edit = QDateEdit()
+        self.end_edit = QDateEdit()
+        for date_edit in (self.start_edit, self.end_edit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            date_edit.setEnabled(False)
+        self.kind_combo = QComboBox()
+        for text, kind in self.KINDS:
+            self.kind_combo.addItem(text, kind)
+        self.name_input = QLineEdit()
+        self.name_input.setPlaceholderText("目标名称")
+        self.name_input.setMaxLength(10)
+        filter_layout.addWidget(self.date_check)
+        filter_layout.addWidget(self.start_edit)
+        filter_layout.addWidget(QLabel("至"))
+        filter_layout.addWidget(self.end_edit)
+        filter_layout.addWidget(self.kind_combo)
+        filter_layout.addWidget(self.name_input)
+        layout.addLayout(filter_layout)
+
+        self.archived_label = QLabel()
+        self.archived_label.hide()
+        layout.addWidget(self.archived_label)
+
+        self.actions_model = ActionHistoryModel(storage, search, self)
+        actions_list = QListView()
+        actions_list.setUniformItemSizes(True)  # 行高相同，滚动时不必逐行计算尺寸
+        actions_list.setModel(self.actions_model)
+        layout.addWidget(actions_list)
+
+        self.date_check.toggled.connect(self.toggle_dates)
+        self.start_edit.dateChanged.connect(self.apply_filter)
+        self.end_edit.dateChanged.connect(self.apply_filter)
+        self.kind_combo.currentIndexChanged.connect(self.apply_filter)
+        self.name_input.textChanged.connect(self.apply_filter)
+
+        self.setLayout(layout)
+        self.resize(700, 450)
+
+    def refresh(self, query):
+        """
+        从最新的记录重新加载。
+
+        参数：
+        query (str): 主窗口搜索框中的文字，作为目标名称的筛选条件。
+
+        说明：
+        没有按日期筛选时，日期范围更新为最近一个月。各控件的信号暂时屏蔽，最后只应用一次筛选条件。
+        """
+        history_archive = self._storage.archive
+        archived = 0 if history_archive is None else history_archive.count("actions")
+        self.archived_label.setText(f"较早的 {archived} 条记录已归档，滚动到底部时按月读取")
+        self.archived_label.setVisible(bool(archived))
+
+        widgets = (self.start_edit, self.end_edit, self.name_input)
+        for widget in widgets:
+            widget.blockSignals(True)
+        if not self.date_check.isChecked():
+            self.start_edit.setDate(QDate.currentDate().addMonths(-1))
+            self.end_edit.setDate(QDate.currentDate())
+        self.name_input.setText(query)
+        for widget in widgets:
+            widget.blockSignals(False)
+        self.apply_filter()
+
+    def apply_filter(self):
+        start = end = None
+        if self.date_check.isChecked():
+            start = QDateTime(self.start_edit.date()).toSecsSinceEpoch()
+            end = QDateTime(self.end_edit.date().addDays(1)).toSecsSinceEpoch()
+        kind = self.kind_combo.currentData()
+        kinds = None if kind is None else {kind}
+        name = self.name_input.text().strip()
+        if start is None and kinds is None and not name:
+            self.actions_model.set_filter(None)
+        else:
+            self.actions_model.set_filter(ActionFilter(start, end, kinds, name))
+
+    def toggle_dates(self, checked):
+        self.start_edit.setEnabled(checked)
+        self.end_edit.setEnabled(checked)
+        self.apply_filter()
+
+
+class StatisticsDialog(QDialog):
+    """
+    进度统计的对话框。
+
+    说明：
+    对话框在第一次打开时创建，之后一直保留。每次打开时由 refresh 换成当前的统计：
+    热力图只替换每日完成数，连续天数的表格只改写有变化的行。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("统计")
+        layout = QVBoxLayout(self)
+
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+        self.heatmap = ActivityHeatmap(0, [], self)
+        layout.addWidget(self.heatmap)
+        self.on_time_label = QLabel()
+        layout.addWidget(self.on_time_label)
+        self.average_label = QLabel()
+        layout.addWidget(self.average_label)
+
+        self.streak_table = QTableWidget(0, 4)
+        self.streak_table.setHorizontalHeaderLabels(["目标名称", "当前连续天数", "最长连续天数", "完成天数"])
+        self.streak_table.verticalHeader().hide()
+        self.streak_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.streak_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self._streaks = []  # 表格中显示的各行
+        layout.addWidget(self.streak_table)
+
+        self.resize(760, 500)
+
+    def refresh(self, stats):
+        """
+        换成当前的统计。
+
+        参数：
+        stats (ProgressStats): GoalStore.progress_stats 返回的统计。
+        """
+        first_day, counts = stats.heatmap()
+        self.total_label.setText("最近一年共完成 {} 次，活跃 {} 天".format(
+            sum(counts), sum(1 for count in counts if count > 0)))
+        self.heatmap.set_counts(first_day, counts)
+
+        rate = stats.on_time_rate()
+        average = stats.average_days_to_complete()
+        self.on_time_label.setText("按时完成率：{}（按时 {} 个，超期 {} 个，无截止日期 {} 个）".format(
+            "-" if rate is None else f"{rate:.0%}", stats.on_time, stats.late, stats.no_deadline))
+        self.average_label.setText("平均完成用时：{}".format("-" if average is None else f"{average:.1f} 天"))
+
+        streaks = [tuple(values) for values in stats.streaks()]
+        if streaks == self._streaks:
+            return
+        self.streak_table.setRowCount(len(streaks))
+        for row, values in enumerate(streaks):
+            if row < len(self._streaks) and self._streaks[row] == values:
+                continue
+            for column, value in enumerate(values):
+                self.streak_table.setItem(row, column, QTableWidgetItem(str(value)))
+        self._streaks = streaks
+
+
+class AboutDialog(QDialog):
+    """
+    关于对话框，内容不变，创建一次后一直保留。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("About")
+        self.setWindowIcon(load_icon('./icons/logo.ico'))
+        layout = QVBoxLayout(self)
+
+        # 添加程序logo
+        logo_label = QLabel(self)
+        logo_label.setPixmap(load_pixmap('./icons/logo.ico', 100))
+        layout.addWidget(logo_label, alignment=Qt.AlignCenter)
+
+        # 添加GitHub链接
+        github_label = QLabel("<a href='https://github.com/SJTUzeroking'>GitHub</a>", self)
+        github_label.setOpenExternalLinks(True)
+        layout.addWidget(github_label, alignment=Qt.AlignCenter)
+
+        # 添加作者信息
+        author_label = QLabel("Developed By Zou Ruoqin", self)
+        layout.addWidget(author_label, alignment=Qt.AlignCenter)
+
+        self.resize(300, 150)
+
+
+class WorkspaceComboBox(QComboBox):
+    """
+    工作区下拉列表，弹出之前发出 about_to_show 信号，以便先更新各工作区的摘要。
+    """
+    about_to_show = pyqtSignal()
+
+    def showPopup(self):
+        self.about_to_show.emit()
+        super().showPopup()
+
+
+class MainThreadDispatcher(QObject):
+    """
+    把函数交给 GUI 线程执行，同步服务通过它读写 GoalStore。
+
+    说明：
+    从其它线程发射信号时，Qt 把调用排入 GUI 线程的事件循环，结果通过 Future 返回给调用方。
+    """
+    called = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.called.connect(self._run)
+
+    def __call__(self, function):
+        future = concurrent.futures.Future()
+        self.called.emit(function, future)
+        return future
+
+    def _run(self, function, future):
+        # 请求已被取消（例如服务已停止）时不再执行
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function())
+        except Exception as e:
+            future.set_exception(e)
+
+
+class GoalManager(QWidget, GoalStoreListener):
+    # 搜索索引在后台建立完成，由后台线程发射，在 GUI 线程中刷新搜索结果
+    search_index_ready = pyqtSignal()
+
+    def __init__(self, storage=None, profiler=None, workspaces=None, workspace=DEFAULT_WORKSPACE):
         """
         类构造函数，初始化实例属性并调用加载数据和初始化界面的方法。
+
+        参数：
+        storage (StorageBackend): 存储后端，默认使用当前目录下的 "goals.json"，指定 workspaces 时不使用。
+        profiler (StartupProfiler): 启动计时，为 None 时不计时。
+        workspaces (Workspaces): 工作区，为 None 时只使用 storage，不显示工作区切换。
+        workspace (str): 启动时打开的工作区。
         """
         super().__init__()
 
-        # 初始化目标列表、已完成目标列表和用户操作记录列表
-        self.goals = []
-        self.completed_goals = []
-        self.user_actions = []
+        # 目标的增删改都交给 GoalStore，窗口只负责显示和收集输入
+        self.workspaces = workspaces
+        self.workspace = workspace
+        self.store = GoalStore(storage) if workspaces is None else workspaces.open(workspace)
+        self.storage = self.store.storage
+        self.profiler = profiler
+        self._first_paint_done = False
+
+        # 只用一个定时器，在下一个目标到期或超期时触发
+        self.deadline_timer = QTimer(self)
+        self.deadline_timer.setSingleShot(True)
+        self.deadline_timer.timeout.connect(self.check_deadlines)
+        self.deadlines = DeadlineScheduler(self.store, on_reschedule=self.arm_deadline_timer)
+        self.tray_icon = None
+        self.sync_server = None
+        # 对话框在第一次打开时创建，之后重复使用
+        self.edit_dialog = None
+        self.completed_dialog = None
+        self.history_dialog = None
+        self.statistics_dialog = None
+        self.about_dialog = None
+        self.store.add_listener(self)
+
+        # 其它窗口或程序修改数据文件时合并它们的修改；保存时文件会连续变化多次，稍等再合并
+        self.external_timer = QTimer(self)
+        self.external_timer.setSingleShot(True)
+        self.external_timer.setInterval(300)
+        self.external_timer.timeout.connect(self.reload_external)
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.external_timer.start)
+        self.file_watcher.directoryChanged.connect(self.external_timer.start)
 
         # 调用加载数据和初始化界面的方法
         self.load_data()
+        if profiler is not None:
+            profiler.mark("data load")
         self.init_ui()
+        if profiler is not None:
+            profiler.mark("widgets")
 
     def init_ui(self):
         """
@@ -49,6 +1205,24 @@ class GoalManager(QWidget):
         # 左侧布局
         left_layout = QVBoxLayout()  # 创建垂直布局
 
+        # 工作区切换，下拉列表中显示各工作区的目标数和最近的截止日期
+        workspace_layout = QHBoxLayout()
+        self.workspace_combo = WorkspaceComboBox()
+        self.workspace_combo.about_to_show.connect(self.refresh_workspaces)
+        self.workspace_combo.activated.connect(
+            lambda index: self.switch_workspace(self.workspace_combo.itemData(index)))
+        self.new_workspace_button = QPushButton("新建")
+        self.new_workspace_button.clicked.connect(self.create_workspace)
+        workspace_layout.addWidget(QLabel("工作区:"))
+        workspace_layout.addWidget(self.workspace_combo, 1)
+        workspace_layout.addWidget(self.new_workspace_button)
+        left_layout.addLayout(workspace_layout)
+        if self.workspaces is None:
+            for index in range(workspace_layout.count()):
+                workspace_layout.itemAt(index).widget().hide()
+        else:
+            self.refresh_workspaces()
+
         # 目标名称输入框
         self.goal_name_input = QLineEdit()
         self.goal_name_input.setMaxLength(10)  # 设置最大长度
@@ -88,10 +1262,55 @@ class GoalManager(QWidget):
         # 右侧布局
         right_layout = QVBoxLayout()  # 创建垂直布局
 
+        # 到期提醒，显示一段时间后自动隐藏
+        self.deadline_banner = QLabel()
+        self.deadline_banner.setWordWrap(True)
+        self.deadline_banner.setStyleSheet("background-color: #FFF3CD; border: 1px solid #F0C36D; "
+                                           "border-radius: 5px; padding: 6px;")
+        self.deadline_banner.hide()
+        self.banner_timer = QTimer(self)
+        self.banner_timer.setSingleShot(True)
+        self.banner_timer.timeout.connect(self.deadline_banner.hide)
+        right_layout.addWidget(self.deadline_banner)
+
+        # 搜索框，输入时筛选目标列表，并显示已完成目标和目标记录中的匹配数
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("搜索目标名称")
+        self.search_input.setMaxLength(10)
+        self.search_input.setClearButtonEnabled(True)
+        self.set_border_radius(self.search_input)
+        self.search_input.textChanged.connect(self.search)
+        self.search_index_ready.connect(lambda: self.search(self.search_input.text()))
+        search_layout.addWidget(self.search_input)
+        self.search_label = QLabel()
+        search_layout.addWidget(self.search_label)
+        right_layout.addLayout(search_layout)
+
         # 目标列表表格
-        self.goals_table = QTableWidget()
-        self.goals_table.setColumnCount(4)
-        self.goals_table.setHorizontalHeaderLabels(["名称", "截止时间", "完成次数", "操作"])
+        self.goals_model = GoalsTableModel(self.store, self.deadlines, self)
+        self.goals_table = QTableView()
+        self.goals_table.setModel(self.goals_model)
+        self.goals_table.setEditTriggers(QAbstractItemView.NoEditTriggers)  # 禁止编辑表格内容
+        # 点击表头按该列排序，启动时按添加的顺序显示
+        self.goals_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.goals_table.setSortingEnabled(True)
+
+        # 操作列由代理绘制按钮和进度条，点击通过信号回调
+        self.goals_delegate = GoalActionsDelegate(self.goals_table)
+        self.goals_delegate.add_clicked.connect(self.add_completed_times, Qt.QueuedConnection)
+        self.goals_delegate.edit_clicked.connect(self.edit_goal, Qt.QueuedConnection)
+        self.goals_delegate.delete_clicked.connect(self.confirm_delete_goal, Qt.QueuedConnection)
+        self.goals_delegate.reduce_clicked.connect(self.reduce_completed_times, Qt.QueuedConnection)
+        self.goals_table.setItemDelegateForColumn(GoalsTableModel.ACTION_COLUMN, self.goals_delegate)
+
+        # 设置表格列宽和行高
+        column_widths = [130, 130, 70, 320]
+        for i, width in enumerate(column_widths):
+            self.goals_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Fixed)
+            self.goals_table.horizontalHeader().resizeSection(i, width)
+        self.goals_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.goals_table.verticalHeader().setDefaultSectionSize(75)
         right_layout.addWidget(self.goals_table)
 
         # 按钮布局
@@ -99,7 +1318,7 @@ class GoalManager(QWidget):
 
         # 已完成目标按钮
         self.completed_goals_button = QPushButton()
-        self.completed_goals_button.setIcon(QIcon(resource_path('./icons/complete.png')))  # 设置图标
+        self.completed_goals_button.setIcon(load_icon('./icons/complete.png'))  # 设置图标
         self.completed_goals_button.setText("已完成目标")  # 设置按钮文本
         self.completed_goals_button.clicked.connect(self.show_completed_goals)
         self.completed_goals_button.setFixedHeight(50)
@@ -108,15 +1327,22 @@ class GoalManager(QWidget):
 
         # 目标记录按钮
         self.record_button = QPushButton()
-        self.record_button.setIcon(QIcon(resource_path('./icons/rizhi.png')))  # 设置图标
+        self.record_button.setIcon(load_icon('./icons/rizhi.png'))  # 设置图标
         self.record_button.setText("目标记录")  # 设置按钮文本
         self.record_button.clicked.connect(self.show_user_actions)
         self.record_button.setFixedHeight(50)
         self.set_border_radius(self.record_button)
         buttons_layout.addWidget(self.record_button)
 
+        # 统计按钮
+        self.stats_button = QPushButton("统计")
+        self.stats_button.clicked.connect(self.show_statistics)
+        self.stats_button.setFixedHeight(50)
+        self.set_border_radius(self.stats_button)
+        buttons_layout.addWidget(self.stats_button)
+
         self.logo_button = QPushButton()
-        icon = QIcon(resource_path('./icons/logo.ico'))  # 设置图标
+        icon = load_icon('./icons/logo.ico')  # 设置图标
         self.logo_button.setFixedSize(50, 50)
         icon_size = QSize(50, 50)  # 设置图标大小
         self.logo_button.setIcon(icon)
@@ -136,258 +1362,344 @@ class GoalManager(QWidget):
         layout.addWidget(right_widget)
 
         self.setLayout(layout)  # 设置窗口布局
-        self.setWindowTitle("Motivation")  # 设置窗口标题
+        self.update_title()  # 设置窗口标题
         self.show()  # 显示窗口
         self.setFixedHeight(600)  # 设置窗口初始高度
-        self.update_goals_list()  # 更新目标列表显示
 
-    def show_deadline(self, date):
-        self.deadline_label.setText(date.toString("yyyy-MM-dd"))
+    def paintEvent(self, event):
+        """
+        首次绘制时，安排在本轮绘制结束后执行 after_first_paint。
+        """
+        super().paintEvent(event)
+        if not self._first_paint_done:
+            self._first_paint_done = True
+            QTimer.singleShot(0, self.after_first_paint)
 
-    def set_border_radius(self, widget):
-        widget.setStyleSheet("border: 2px solid #5171F0; border-radius: 5px;")  # 设置边框样式和圆角
+    def after_first_paint(self):
+        """
+        主窗口首次绘制完成后，打印启动耗时，并在后台线程中加载已完成目标和操作记录。
+        """
+        if self.profiler is not None:
+            self.profiler.mark("first paint")
+            self.profiler.report()
+            self.profiler = None
+        self.storage.preload_history()
+
+        soon, overdue = self.deadlines.pending()
+        if soon or overdue:
+            self.notify("目标提醒", self.describe_deadlines(soon, overdue))
 
-    def update_goals_list(self):
+    def describe_deadlines(self, soon, overdue):
+        """
+        生成到期提醒的文字，目标较多时只列出前几个名称。
         """
-        更新目标列表显示。
+        def names(goals):
+            text = "、".join(goal['name'] for goal in goals[:5])
+            return text + (f" 等 {len(goals)} 个目标" if len(goals) > 5 else "")
+
+        parts = []
+        if overdue:
+            parts.append("已超期：" + names(overdue))
+        if soon:
+            parts.append("即将到期：" + names(soon))
+        return "；".join(parts)
+
+    def arm_deadline_timer(self):
+        """
+        按调度器中最早的到期时间设置定时器。
 
         说明：
-        根据当前的目标数据，更新目标列表的显示内容和操作按钮。
-        """
-        self.goals_table.setRowCount(len(self.goals))
-        for row, goal in enumerate(self.goals):
-            self.goals_table.setItem(row, 0, QTableWidgetItem(goal['name']))
-            self.goals_table.setItem(row, 1, QTableWidgetItem(goal['deadline']))
-            self.goals_table.setItem(row, 2, QTableWidgetItem(f"{goal['completed_times']}/{goal['target_times']}"))
-
-            # 添加操作按钮
-            add_button = QPushButton()
-            add_button.setIcon(QIcon(resource_path('./icons/add.png')))  # 设置图标
-            add_button.clicked.connect(lambda _, g=goal: self.add_completed_times(g))
-            add_button.setFixedWidth(50)
-
-            edit_button = QPushButton()
-            edit_button.setIcon(QIcon(resource_path('./icons/edit.png')))  # 设置图标
-            edit_button.clicked.connect(lambda _, g=goal: self.edit_goal(g))
-            edit_button.setFixedWidth(50)
-
-            delete_button = QPushButton()
-            delete_button.setIcon(QIcon(resource_path('./icons/delete.png')))  # 设置图标
-            delete_button.clicked.connect(lambda _, g=goal: self.confirm_delete_goal(g))
-            delete_button.setFixedWidth(50)
-
-            reduce_button = QPushButton()
-            reduce_button.setIcon(QIcon(resource_path('./icons/undo.png')))  # 设置图标
-            reduce_button.clicked.connect(lambda _, g=goal: self.reduce_completed_times(g))
-            reduce_button.setFixedWidth(50)
-
-            # 创建进度条
-            progress_bar = QProgressBar()
-            progress_bar.setRange(0, goal['target_times'])  # 设置进度条范围
-            progress_bar.setValue(goal['completed_times'])  # 设置进度条当前值
-            progress_bar.setFormat(f"{goal['completed_times']}/{goal['target_times']}")  # 设置进度条上方文字显示
-            progress_bar.setFixedWidth(80)  # 设置进度条的默认长度
-
-            # 将操作按钮和进度条放置在水平布局中
-            btn_layout = QHBoxLayout()
-            btn_layout.addWidget(add_button)
-            btn_layout.addWidget(edit_button)
-            btn_layout.addWidget(delete_button)
-            btn_layout.addWidget(reduce_button)
-            btn_layout.addWidget(progress_bar)
-
-            btn_widget = QWidget()
-            btn_widget.setLayout(btn_layout)
-
-            # 将操作按钮和进度条添加到表格的单元格中
-            self.goals_table.setCellWidget(row, 3, btn_widget)
-
-        # 设置表格列宽
-        column_widths = [130, 130, 70, 320]
-        for i, width in enumerate(column_widths):
-            self.goals_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Fixed)
-            self.goals_table.horizontalHeader().resizeSection(i, width)
+        定时器最长等待一小时，系统休眠或调整时钟后也能及时重新检查。
+        """
+        due = self.deadlines.next_due()
+        if due is None:
+            self.deadline_timer.stop()
+            return
+        delay = max(0, min(int((due - time.time()) * 1000) + 1, 3600 * 1000))
+        self.deadline_timer.start(delay)
 
-        # 禁止编辑表格内容
-        self.goals_table.setEditTriggers(QTableWidget.NoEditTriggers)
+    def check_deadlines(self):
+        """
+        定时器触发时处理到期的目标：只刷新状态变化的行，并发出提醒。
+        """
+        events = self.deadlines.pop_due()
+        if events:
+            for goal, _ in events:
+                self.goals_model.goal_changed(self.store.row_of(goal['id']))
+            self.notify("目标提醒", self.describe_deadlines(
+                [goal for goal, state in events if state == DUE_SOON],
+                [goal for goal, state in events if state == OVERDUE]))
+        self.arm_deadline_timer()
+
+    def notify(self, title, message):
+        """
+        显示提醒：窗口内的提示条，系统支持时同时显示托盘通知。
+        """
+        self.deadline_banner.setText(message)
+        self.deadline_banner.show()
+        self.banner_timer.start(15000)
+        if QSystemTrayIcon.isSystemTrayAvailable() and QSystemTrayIcon.supportsMessages():
+            if self.tray_icon is None:
+                self.tray_icon = QSystemTrayIcon(load_icon('./icons/logo.ico'), self)
+                self.tray_icon.show()
+            self.tray_icon.showMessage(title, message)
+
+    def search(self, text):
+        """
+        按名称筛选目标列表，并显示已完成目标和目标记录中的匹配数，点击对应按钮可以查看它们。
 
-        # 设置表格行高和内容居中显示
-        for i in range(self.goals_table.rowCount()):
-            self.goals_table.setRowHeight(i, 75)
-            for j in range(self.goals_table.columnCount()):
-                item = self.goals_table.item(i, j)
-                if item:
-                    item.setTextAlignment(Qt.AlignCenter)
+        说明：
+        每次输入只查询增量维护的搜索索引。已完成目标和操作记录的索引在第一次搜索时于后台线程中建立，
+        建立完成之前只显示活动目标的匹配数，完成后再刷新一次；之后不再扫描历史数据。
+        """
+        token = instrumentation.begin("search")
+        query = text.strip()
+        self.goals_model.set_query(query)
+        search = self.store.search_index() if query else None
+        if search is None:
+            self.search_label.clear()
+        elif search.history_ready():
+            goals, completed, actions = search.count(query)
+            self.search_label.setText(f"目标 {goals} 个，已完成 {completed} 个，记录 {actions} 条")
+        else:
+            search.preload_history(self.search_index_ready.emit)
+            goals = len(search.search_goals(query))
+            self.search_label.setText(f"目标 {goals} 个，正在建立已完成目标和记录的索引…")
+        instrumentation.end(token, query=query)
+
+    def show_deadline(self, date):
+        self.deadline_label.setText(date.toString("yyyy-MM-dd"))
+
+    def set_border_radius(self, widget):
+        widget.setStyleSheet("border: 2px solid #5171F0; border-radius: 5px;")  # 设置边框样式和圆角
 
     def load_data(self):
         """
         加载数据并更新实例属性。
 
         说明：
-        尝试从文件 "goals.json" 中加载数据，更新目标列表、已完成目标列表和用户操作记录列表。
-        如果文件不存在，则忽略异常。
+        由 GoalStore 从存储后端加载活动目标，已完成目标和操作记录由存储后端推迟加载。
+        默认从文件 "goals.json" 中加载，文件不存在时数据为空。使用工作区时 GoalStore 在打开工作区时已加载。
         """
-        try:
-            with open("goals.json", "r") as f:
-                data = json.load(f)
-                self.goals = data.get('goals', [])
-                self.completed_goals = data.get('completed_goals', [])
-                self.user_actions = data.get('user_actions', [])
-        except FileNotFoundError:
-            pass
+        if self.workspaces is None:
+            self.store.load()
+        self.watch_data_files()
 
-    def save_data(self):
+    def watch_data_files(self):
         """
-        保存数据到文件 "goals.json"。
+        监视存储后端的数据文件。
 
         说明：
-        将目标列表、已完成目标列表和用户操作记录列表保存为 JSON 格式，并写入到文件 "goals.json" 中。
+        原子替换文件后原来的文件不再被监视，每次合并后都重新加入不在监视中的路径。
         """
-        data = {'goals': self.goals, 'completed_goals': self.completed_goals, 'user_actions': self.user_actions}
-        with open("goals.json", "w") as f:
-            json.dump(data, f, indent=4)
+        watched = set(self.file_watcher.files()) | set(self.file_watcher.directories())
+        paths = [path for path in self.storage.watch_paths() if path not in watched and os.path.exists(path)]
+        if paths:
+            self.file_watcher.addPaths(paths)
 
-    def add_goal(self):
+    def reload_external(self):
         """
-        添加新目标。
+        数据文件变化时合并其它程序所做的修改，本程序自己写入引起的变化会被存储后端忽略。
+        """
+        self.watch_data_files()
+        if self.storage.external_changed():
+            self.store.sync_external()
+
+    def external_merged(self, report):
+        """
+        合并了其它程序的修改后提示用户，有冲突时列出保留了本地修改的目标。
+        """
+        self.notify("同步", report.summary())
+        if report.conflicts:
+            QMessageBox.warning(self, "同步冲突", "以下目标在其它窗口中也被修改，已保留本窗口的修改：\n"
+                                + "\n".join(report.conflicts))
+
+    def start_sync_server(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+        """
+        在后台线程中启动本地同步服务，其它设备和脚本通过它读写同一份数据。
 
         说明：
-        从用户输入中获取目标名称、截止日期和需要完成的次数，进行输入验证。
-        如果输入合法，则创建新目标并添加到目标列表中，并更新目标列表显示。
-        同时记录用户的操作，记录格式为 "你在{时间}添加了目标{目标名称}"。
+        服务的修改在 GUI 线程中交给 GoalStore 执行，表格通过监听 GoalStore 只更新变化的行。
+        端口被占用等原因无法启动时提示用户，程序照常运行。
+        """
+        server = SyncServer(self.store, host, port, token, MainThreadDispatcher(self))
+        try:
+            server.start()
+        except OSError as e:
+            server.stop()
+            QMessageBox.warning(self, "同步服务", f"无法在 {host}:{port} 启动同步服务：{e}")
+            return
+        self.sync_server = server
+        self.update_title()
+
+    def update_title(self):
+        """
+        在窗口标题中显示当前工作区和同步服务的地址。
         """
-        goal_name = self.goal_name_input.text().strip()  # 去除首尾空格
-        deadline = self.deadline_label.text()
-        completed_times_str = self.goal_times_input.text()
+        parts = ["Motivation"]
+        if self.workspaces is not None:
+            parts.append(self.workspace)
+        if self.sync_server is not None:
+            parts.append(f"同步服务 {self.sync_server.host}:{self.sync_server.port}")
+        self.setWindowTitle(" - ".join(parts))
+
+    def refresh_workspaces(self):
+        """
+        重新填写工作区下拉列表，打开下拉列表前调用。
 
-        # 输入验证
-        if not goal_name:
-            QMessageBox.warning(self, "警告", "请输入目标名称！")
+        说明：
+        打开的工作区由内存中的数据得到摘要，其它工作区只读取索引文件中的摘要。
+        """
+        combo = self.workspace_combo
+        combo.blockSignals(True)
+        combo.clear()
+        for name in self.workspaces.names():
+            try:
+                summary = self.workspaces.summary(name)
+            except (OSError, ValueError):
+                combo.addItem(f"{name}（无法读取）", name)
+                continue
+            text = f"{name}（{summary['goals']} 个目标"
+            if summary['next_deadline']:
+                text += f"，最近截止 {summary['next_deadline']}"
+            combo.addItem(text + "）", name)
+        combo.setCurrentIndex(combo.findData(self.workspace))
+        combo.blockSignals(False)
+
+    def create_workspace(self):
+        """
+        新建工作区并切换过去。
+        """
+        name, ok = QInputDialog.getText(self, "新建工作区", "工作区名称:")
+        if not ok:
             return
-        if len(goal_name) > 10:
-            QMessageBox.warning(self, "警告", "目标名称不能超过10个字符！")
+        try:
+            name = self.workspaces.create(name)
+        except (WorkspaceError, OSError) as e:
+            QMessageBox.warning(self, "警告", str(e))
             return
-        if not completed_times_str:
-            QMessageBox.warning(self, "警告", "请输入需要完成的次数！")
+        self.switch_workspace(name)
+
+    def switch_workspace(self, name):
+        """
+        切换到工作区 name。
+
+        说明：
+        原来的工作区留在 Workspaces 的缓存中，切换回来时不必重新加载。表格模型改为显示新工作区的 GoalStore，
+        截止日期调度器、文件监视和同步服务也改用新的 GoalStore；目标记录对话框绑定了存储后端，下次打开时重新创建。
+        """
+        if self.workspaces is None or name == self.workspace:
             return
+        token = instrumentation.begin("workspace.switch")
         try:
-            completed_times = int(completed_times_str)
-        except ValueError:
-            QMessageBox.warning(self, "警告", "请输入有效的次数！")
-            return
-        if completed_times < 1:
-            QMessageBox.warning(self, "警告", "目标次数不能小于1次！")
+            store = self.workspaces.open(name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "警告", f"无法打开工作区“{name}”：{e}")
+            self.refresh_workspaces()
             return
+        old_store = self.store
+        old_store.remove_listener(self)
+        old_store.remove_listener(self.deadlines)
+        self.store = store
+        self.storage = store.storage
+        self.workspace = name
+        self.deadlines = DeadlineScheduler(store, on_reschedule=self.arm_deadline_timer)
+        self.goals_model.set_store(store, self.deadlines)
+        store.add_listener(self)
+
+        if self.history_dialog is not None:
+            self.history_dialog.deleteLater()
+            self.history_dialog = None
+        watched = self.file_watcher.files() + self.file_watcher.directories()
+        if watched:
+            self.file_watcher.removePaths(watched)
+        self.watch_data_files()
+        self.storage.preload_history()
+        self.search(self.search_input.text())
+        self.arm_deadline_timer()
+
+        if self.sync_server is not None:
+            server, self.sync_server = self.sync_server, None
+            server.stop()
+            self.start_sync_server(server.host, server.port, server.token)
+        self.update_title()
+        self.refresh_workspaces()
+        instrumentation.end(token, workspace=name)
+
+    def add_goal(self):
+        """
+        添加新目标。
 
-        # 创建新目标并添加到目标列表
-        new_goal = {"name": goal_name, "deadline": deadline, "target_times": completed_times, "completed_times": 0}
-        self.goals.append(new_goal)
-        self.update_goals_list()
+        说明：
+        从用户输入中获取目标名称、截止日期和需要完成的次数，交给 GoalStore 验证并添加。
+        输入不合法时提示用户，否则清空输入框，表格通过监听 GoalStore 插入新的一行。
+        """
+        try:
+            self.store.add_goal(self.goal_name_input.text(), self.deadline_label.text(),
+                                self.goal_times_input.text())
+        except GoalError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
         self.goal_name_input.clear()
         self.deadline_label.clear()
         self.goal_times_input.clear()
 
-        # 记录用户操作
-        action_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm")
-        self.user_actions.insert(0, f"你在{action_time}添加了目标【{goal_name}】")
-        self.save_data()
-
-    def edit_goal(self, goal):
+    def edit_goal(self, goal_id):
         """
         编辑目标信息。
 
         参数：
-        goal (dict): 要编辑的目标。
+        goal_id (str): 要编辑的目标的 id。
 
         说明：
-        打开一个对话框，允许用户编辑目标的名称、截止日期和需要完成的次数。
+        打开编辑对话框，允许用户编辑目标的名称、截止日期和需要完成的次数。
+        对话框在第一次编辑时创建，之后重复使用，每次打开时填入要编辑的目标。
         用户点击保存按钮后，调用保存编辑目标的方法。
         """
-        dialog = QDialog(self)
-        dialog.setWindowTitle("编辑目标")
-        layout = QVBoxLayout()
-
-        name_input = QLineEdit()
-        name_input.setText(goal["name"])
-        name_input.setMaxLength(10)  # 设置最大输入长度为10
-        layout.addWidget(QLabel("目标名称:"))
-        layout.addWidget(name_input)
-
-        deadline_label = QLabel()
-        deadline_label.setText(goal["deadline"])
-        layout.addWidget(QLabel("截止日期:"))
-        layout.addWidget(deadline_label)
-
-        calendar = QCalendarWidget()
-        calendar.clicked[QDate].connect(lambda date: deadline_label.setText(date.toString("yyyy-MM-dd")))
-        layout.addWidget(calendar)
-
-        times_input = QLineEdit()
-        times_input.setText(str(goal["target_times"]))
-        times_input.setMaxLength(3)  # 设置最大输入长度为3
-        layout.addWidget(QLabel("需要完成的次数:"))
-        layout.addWidget(times_input)
-
-        save_button = QPushButton("保存")
-        save_button.clicked.connect(
-            lambda: self.save_edit_goal(goal, name_input.text(), deadline_label.text(), times_input.text(), dialog))
-        layout.addWidget(save_button)
-
-        dialog.setLayout(layout)
-        dialog.exec_()
+        goal = self.store.get(goal_id)
+        if goal is None:
+            return
 
-    def save_edit_goal(self, goal, new_name, new_deadline, new_times, dialog):
+        token = instrumentation.begin("dialog.edit")
+        if self.edit_dialog is None:
+            self.edit_dialog = EditGoalDialog(self)
+            self.edit_dialog.save_clicked.connect(
+                lambda goal_id, name, deadline, times: self.save_edit_goal(goal_id, name, deadline, times,
+                                                                           self.edit_dialog))
+        self.edit_dialog.set_goal(goal)
+        instrumentation.end(token)
+        self.edit_dialog.exec_()
+
+    def save_edit_goal(self, goal_id, new_name, new_deadline, new_times, dialog):
         """
         保存编辑后的目标信息。
 
         参数：
-        goal (dict): 要保存的目标。
+        goal_id (str): 要保存的目标的 id。
         new_name (str): 编辑后的目标名称。
         new_deadline (str): 编辑后的截止日期。
         new_times (str): 编辑后的需要完成的次数。
         dialog (QDialog): 编辑目标的对话框。
 
         说明：
-        验证编辑后的目标名称和需要完成的次数的合法性，如果合法则更新目标信息并保存。
-        同时记录用户的操作，记录格式为 "你在{时间}将目标【旧名称】【旧截止日期】【旧次数】修改为【新名称】【新截止日期】【新次数】"。
+        由 GoalStore 验证并保存修改，输入不合法时提示用户并保持对话框打开。
         """
-        if not new_name.strip():
-            QMessageBox.warning(dialog, "警告", "请输入目标名称！")
-            return
-        if len(new_name) > 10:
-            QMessageBox.warning(dialog, "警告", "目标名称不能超过10个字符！")
-            return
         try:
-            target_times = int(new_times)
-        except ValueError:
-            QMessageBox.warning(dialog, "警告", "请输入有效的次数！")
-            return
-        if int(new_times) < 1:
-            QMessageBox.warning(dialog, "警告", "目标次数不能小于1次！")
+            goal = self.store.edit_goal(goal_id, new_name, new_deadline, new_times)
+        except GoalError as e:
+            QMessageBox.warning(dialog, "警告", str(e))
             return
+        if goal is None:
+            dialog.reject()
+        else:
+            dialog.accept()
 
-        old_name = goal["name"]
-        old_deadline = goal["deadline"]
-        old_times = goal["target_times"]
-
-        goal["name"] = new_name
-        goal["deadline"] = new_deadline
-        goal["target_times"] = target_times
-        self.update_goals_list()
-        dialog.accept()
-
-        # 记录用户操作
-        action_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm")
-        action_str = f"你在{action_time}将目标【{old_name}】【{old_deadline}】【{old_times}】修改为【{new_name}】【{new_deadline}】【{target_times}】"
-        self.user_actions.insert(0, action_str)
-        self.save_data()
-
-    def confirm_delete_goal(self, goal):
+    def confirm_delete_goal(self, goal_id):
         """
         确认删除目标。
 
         参数：
-        goal (dict): 要删除的目标对象。
+        goal_id (str): 要删除的目标的 id。
 
         说明：
         弹出对话框以确认用户是否要删除目标。
@@ -397,152 +1709,201 @@ class GoalManager(QWidget):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            self.delete_goal(goal)
+            self.delete_goal(goal_id)
 
-    def delete_goal(self, goal):
+    def delete_goal(self, goal_id):
         """
         删除目标。
 
         参数：
-        goal (dict): 要删除的目标对象。
+        goal_id (str): 要删除的目标的 id。
 
         说明：
-        从目标列表中删除指定索引的目标，并更新目标列表显示。
-        同时记录用户的操作，记录格式为 "你在{时间}删除了目标{目标名称}"。
+        由 GoalStore 删除目标并记录操作，表格通过监听 GoalStore 移除对应的行。
         """
-        self.goals.remove(goal)
-        self.update_goals_list()
-
-        # 记录用户操作
-        action_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm")
-        self.user_actions.insert(0, f"你在{action_time}删除了目标【{goal['name']}】")
-        self.save_data()
+        self.store.delete_goal(goal_id)
 
-    def add_completed_times(self, goal):
+    @instrumentation.timed("click.increment")
+    def add_completed_times(self, goal_id):
         """
         增加目标的完成次数。
 
         参数：
-        goal (dict): 要增加完成次数的目标。
+        goal_id (str): 要增加完成次数的目标的 id。
 
         说明：
-        增加目标的完成次数，如果完成次数达到目标设定的次数，则提示用户已完成目标，并记录目标的完成日期。
-        同时更新目标列表显示和保存数据。
-        记录用户的操作，记录格式为 "你在{时间}完成了目标{目标名称}"。
+        由 GoalStore 增加完成次数；完成次数达到目标设定的次数时，目标移入已完成目标，
+        这里再提示用户已完成目标。
         """
-        goal["completed_times"] += 1
-        if goal["completed_times"] == goal["target_times"]:
+        goal = self.store.increment(goal_id)
+        if goal is not None and "completion_date" in goal:
             QMessageBox.information(self, "恭喜", "您已经完成目标：{}".format(goal["name"]))
-            goal["completion_date"] = QDate.currentDate().toString("yyyy-MM-dd")  # 记录目标完成日期
-            self.completed_goals.append(goal)
-            self.delete_goal(goal)
-        else:
-            self.update_goals_list()
 
-        # 记录用户操作
-        action_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm")
-        self.user_actions.insert(0, f"你在{action_time}完成了目标【{goal['name']}】")
-        self.save_data()
-
-    def reduce_completed_times(self, goal):
+    @instrumentation.timed("click.reduce")
+    def reduce_completed_times(self, goal_id):
         """
         减少目标的完成次数。
 
         参数：
-        goal (dict): 要删除的目标对象。
+        goal_id (str): 要减少完成次数的目标的 id。
 
         说明：
-        减少目标的完成次数，如果已完成次数大于0，则更新目标列表显示和保存数据。
-        否则弹出警告提示已完成次数不能再减少。
-        同时记录用户的操作，记录格式为 "你在{时间}撤销完成了目标{目标名称}"。
+        由 GoalStore 减少完成次数，已完成次数为 0 时弹出警告提示已完成次数不能再减少。
         """
-        if goal["completed_times"] > 0:
-            goal["completed_times"] -= 1
-            self.update_goals_list()
-        else:
+        if self.store.get(goal_id) is None:
+            return
+        if not self.store.decrement(goal_id):
             QMessageBox.warning(self, "警告", "已完成次数不能再减少了！")
 
-        # 记录用户操作
-        action_time = QDateTime.currentDateTime().toString("yyyy-MM-dd hh:mm")
-        self.user_actions.insert(0, f"你在{action_time}撤销完成了目标【{goal['name']}】")
-        self.save_data()
-
     def show_completed_goals(self):
         """
         显示已完成目标列表。
 
         说明：
         弹出对话框展示已完成目标列表，包括目标的名称、截止时间、完成次数和完成日期。
+        可以点击表头按截止时间、完成日期或完成次数排序，按名称搜索，数据在滚动时逐步加载。
+        主窗口的搜索框中有文字时，打开后直接显示搜索结果。
+        右侧显示按月汇总的完成数，汇总结果在目标完成时已更新，打开对话框时无需重新统计。
+        对话框在第一次打开时创建，之后重复使用，打开时只加入上次关闭后的变化。
         """
-        dialog = QDialog(self)
-        dialog.setWindowTitle("已完成目标列表")
-        layout = QVBoxLayout()
-
-        completed_table = QTableWidget()
-        completed_table.setColumnCount(4)
-        completed_table.setHorizontalHeaderLabels(["名称", "截止时间", "完成次数", "完成日期"])
-        completed_table.setRowCount(len(self.completed_goals))
-        layout.addWidget(completed_table)
-
-        for row, goal in enumerate(self.completed_goals):
-            completed_table.setItem(row, 0, QTableWidgetItem(goal['name']))
-            completed_table.setItem(row, 1, QTableWidgetItem(goal['deadline']))
-            completed_table.setItem(row, 2, QTableWidgetItem(str(goal['completed_times'])))
-            if 'completion_date' in goal:
-                completed_table.setItem(row, 3, QTableWidgetItem(goal['completion_date']))
-
-        # 设置单元格内容居中显示
-        for i in range(completed_table.rowCount()):
-            for j in range(completed_table.columnCount()):
-                item = completed_table.item(i, j)
-                if item:
-                    item.setTextAlignment(Qt.AlignCenter)
-        dialog.setLayout(layout)
-        dialog.resize(500, 400)
-        dialog.exec_()
+        token = instrumentation.begin("dialog.completed")
+        if self.completed_dialog is None:
+            self.completed_dialog = CompletedGoalsDialog(self)
+        self.completed_dialog.refresh(self.store, self.search_input.text().strip())
+        instrumentation.end(token, goals=len(self.store.completed_goals))
+        self.completed_dialog.exec_()
 
     def show_user_actions(self):
         """
         显示用户的操作记录。
 
         说明：
-        弹出对话框展示用户的操作记录，以列表形式呈现。
+        弹出对话框展示用户的操作记录，以列表形式呈现，可按日期范围、操作类型和目标名称筛选，
+        目标名称由搜索索引查找，主窗口的搜索框中有文字时打开后直接显示搜索结果。
+        记录按从新到旧的顺序分页加载，滚动到底部时才读取下一页。
+        对话框在第一次打开时创建，之后重复使用，每次打开时从最新的记录重新加载。
         """
-        dialog = QDialog(self)
-        dialog.setWindowTitle("目标记录")
-        layout = QVBoxLayout()
-
-        actions_list = QListWidget()
-        actions_list.addItems(self.user_actions)  # 将操作记录添加到列表中
-        layout.addWidget(actions_list)
+        token = instrumentation.begin("dialog.history")
+        if self.history_dialog is None:
+            self.history_dialog = ActionHistoryDialog(self.storage, self.store.search_index(), self)
+        self.history_dialog.refresh(self.search_input.text().strip())
+        instrumentation.end(token)
+        self.history_dialog.exec_()
+
+    def show_statistics(self):
+        """
+        显示进度统计。
 
-        dialog.setLayout(layout)
-        dialog.resize(700, 450)
-        dialog.exec_()
+        说明：
+        弹出对话框展示最近一年的每日完成热力图、按时完成率、平均完成用时和各目标的连续完成天数。
+        统计由 GoalStore 随操作增量更新，只有第一次打开时需要扫描全部操作记录。
+        对话框在第一次打开时创建，之后重复使用，每次打开时换成当前工作区的统计。
+        """
+        token = instrumentation.begin("dialog.statistics")
+        if self.statistics_dialog is None:
+            self.statistics_dialog = StatisticsDialog(self)
+        self.statistics_dialog.refresh(self.store.progress_stats())
+        instrumentation.end(token)
+        self.statistics_dialog.exec_()
 
     def show_logo(self):
-        dialog = QDialog()
-        dialog.setWindowTitle("About")
-        dialog.setWindowIcon(QIcon(resource_path('./icons/logo.ico')))
-        layout = QVBoxLayout(dialog)
+        """
+        显示关于对话框，按住 Ctrl 点击 logo 时打开诊断对话框。
+        """
+        if QApplication.keyboardModifiers() & Qt.ControlModifier:
+            self.show_diagnostics()
+            return
+        token = instrumentation.begin("dialog.logo")
+        if self.about_dialog is None:
+            self.about_dialog = AboutDialog(self)
+        instrumentation.end(token)
+        self.about_dialog.exec_()
 
-        # 添加程序logo
-        logo_label = QLabel(dialog)
-        logo_pixmap = QPixmap(resource_path('./icons/logo.ico')).scaledToWidth(100)
-        logo_label.setPixmap(logo_pixmap)
-        layout.addWidget(logo_label, alignment=Qt.AlignCenter)
+    def show_diagnostics(self):
+        """
+        显示诊断对话框。
 
-        # 添加GitHub链接
-        github_label = QLabel("<a href='https://github.com/SJTUzeroking'>GitHub</a>", dialog)
-        github_label.setOpenExternalLinks(True)
-        layout.addWidget(github_label, alignment=Qt.AlignCenter)
+        说明：
+        列出各操作的调用次数和耗时分布、持久化写入的数据量以及后台写入线程的状态，
+        可以开启或关闭埋点、清空统计，并把 trace 事件导出为 Chrome trace event 格式的 JSON 文件。
+        """
+        dialog = QDialog(self)
+        dialog.setWindowTitle("诊断")
+        layout = QVBoxLayout(dialog)
 
-        # 添加作者信息
-        author_label = QLabel("Developed By Zou Ruoqin", dialog)
-        layout.addWidget(author_label, alignment=Qt.AlignCenter)
+        enable_check = QCheckBox("开启性能埋点")
+        enable_check.setChecked(instrumentation.is_enabled())
+        layout.addWidget(enable_check)
+
+        timing_table = QTableWidget(0, 8)
+        timing_table.setHorizontalHeaderLabels(["操作", "次数", "总耗时(ms)", "平均(ms)", "p50(ms)", "p95(ms)",
+                                                "最大(ms)", "分布"])
+        timing_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        timing_table.verticalHeader().hide()
+        layout.addWidget(QLabel("耗时:"))
+        layout.addWidget(timing_table)
+
+        size_table = QTableWidget(0, 5)
+        size_table.setHorizontalHeaderLabels(["写入", "次数", "总字节数", "最大字节数", "最近字节数"])
+        size_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        size_table.verticalHeader().hide()
+        layout.addWidget(QLabel("写入数据量:"))
+        layout.addWidget(size_table)
+
+        writer_label = QLabel()
+        layout.addWidget(writer_label)
+
+        def fill(table, rows):
+            table.setRowCount(len(rows))
+            for row, values in enumerate(rows):
+                for column, value in enumerate(values):
+                    table.setItem(row, column, QTableWidgetItem(value))
+            table.resizeColumnsToContents()
+
+        def refresh():
+            fill(timing_table, [[item["name"], str(item["count"]), f"{item['total_ms']:.2f}",
+                                 f"{item['mean_ms']:.2f}", f"{item['p50_ms']:.2f}", f"{item['p95_ms']:.2f}",
+                                 f"{item['max_ms']:.2f}", " ".join(map(str, item["histogram"]))]
+                                for item in instrumentation.timing_report()])
+            fill(size_table, [[item["name"], str(item["count"]), str(item["total"]), str(item["max"]),
+                               str(item["last"])] for item in instrumentation.size_report()])
+            write_stats = getattr(self.storage, "write_stats", None)
+            stats = write_stats() if write_stats is not None else None
+            if stats is None:
+                writer_label.setText("后台写入：未启用")
+            else:
+                latency = stats['last_latency_ms']
+                writer_label.setText("后台写入：提交 {} 次，写入 {} 次，因文件被其它程序修改放弃 {} 次，最近耗时 {}，{}".format(
+                    stats['requests'], stats['writes'], stats.get('skipped', 0),
+                    "-" if latency is None else f"{latency:.2f} ms",
+                    "有待写入数据" if stats['pending'] else "无待写入数据"))
+
+        def reset():
+            instrumentation.reset()
+            refresh()
+
+        def export():
+            path, _ = QFileDialog.getSaveFileName(dialog, "导出 trace", "trace.json", "JSON (*.json)")
+            if not path:
+                return
+            try:
+                count = instrumentation.export_trace(path)
+            except OSError as e:
+                QMessageBox.warning(dialog, "警告", f"无法写入文件：{e}")
+                return
+            QMessageBox.information(dialog, "导出完成", f"已导出 {count} 个事件，可在 chrome://tracing 或 Perfetto 中打开")
+
+        enable_check.toggled.connect(instrumentation.enable)
 
-        dialog.setLayout(layout)
-        dialog.resize(300, 150)
+        buttons_layout = QHBoxLayout()
+        for text, slot in (("刷新", refresh), ("清空", reset), ("导出 trace", export)):
+            button = QPushButton(text)
+            button.clicked.connect(lambda checked=False, slot=slot: slot())
+            buttons_layout.addWidget(button)
+        layout.addLayout(buttons_layout)
+
+        refresh()
+        dialog.resize(800, 500)
         dialog.exec_()
 
     def closeEvent(self, event):
@@ -559,12 +1920,83 @@ class GoalManager(QWidget):
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            self.save_data()
+            if self.sync_server is not None:
+                self.sync_server.stop()
+            if self.workspaces is None:
+                self.store.close()
+            else:
+                # 关闭全部打开的工作区，并记录它们的摘要
+                self.workspaces.close()
             event.accept()
         else:
             event.ignore()
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = GoalManager()
+    parser = argparse.ArgumentParser(description="Motivation")
+    parser.add_argument('--storage', choices=['json', 'journal', 'sqlite'], default='json',
+                        help="数据存储方式：json 单文件、journal 快照加追加日志、sqlite 数据库")
+    parser.add_argument('--data', help="数据文件路径，默认为 goals.json（sqlite 为 goals.db）")
+    parser.add_argument('--workspace', default=DEFAULT_WORKSPACE, metavar='NAME',
+                        help="打开的工作区，不存在时新建；默认工作区使用 --data 指定的数据文件")
+    parser.add_argument('--workspace-dir', default="workspaces", metavar='DIR',
+                        help="其它工作区的数据文件所在的目录，默认为 workspaces")
+    parser.add_argument('--workspace-cache', type=int, default=DEFAULT_CAPACITY, metavar='N',
+                        help=f"同时保持打开的工作区数，默认为 {DEFAULT_CAPACITY}")
+    parser.add_argument('--write-delay', type=int, default=500, metavar='MS',
+                        help="json 存储合并写入的时间窗口（毫秒），为 0 时每次修改都同步写入")
+    parser.add_argument('--history-limit', type=int, metavar='N',
+                        help="只保留最新的 N 条操作记录，默认不限制")
+    parser.add_argument('--archive-after', type=int, metavar='DAYS',
+                        help="退出时把超过 DAYS 天的操作记录和已完成目标按月压缩归档，默认不归档")
+    parser.add_argument('--import-json', metavar='PATH', help="把 JSON 数据文件导入 SQLite 数据库后退出")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="打印启动各阶段（导入、加载数据、创建界面、首次绘制）的耗时")
+    parser.add_argument('--instrument', action='store_true',
+                        help="启动时开启性能埋点，按住 Ctrl 点击 logo 可查看统计并导出 trace")
+    parser.add_argument('--serve', type=int, nargs='?', const=DEFAULT_PORT, metavar='PORT',
+                        help=f"启动本地 HTTP/JSON 同步服务，默认端口为 {DEFAULT_PORT}")
+    parser.add_argument('--serve-host', default=DEFAULT_HOST, metavar='HOST',
+                        help="同步服务监听的地址，默认只监听本机")
+    parser.add_argument('--serve-token', metavar='TOKEN', help="同步服务的访问令牌，监听其它地址时应当设置")
+    parser.add_argument('--cli', nargs=argparse.REMAINDER, metavar='COMMAND',
+                        help="不启动界面，执行命令行批量操作，必须放在最后，详见 --cli --help")
+    args, qt_args = parser.parse_known_args()
+    if args.instrument:
+        instrumentation.enable()
+    profiler = StartupProfiler(STARTUP_TIME) if args.profile_startup else None
+    if profiler is not None:
+        profiler.mark("imports")
+
+    if args.import_json:
+        try:
+            storage = SqliteStorage(args.data or "goals.db")
+            try:
+                counts = storage.import_json(args.import_json)
+            finally:
+                storage.close()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"导入失败：{e}", file=sys.stderr)
+            sys.exit(1)
+        print("已导入 {} 个目标、{} 个已完成目标、{} 条操作记录，已存在的数据已跳过".format(*counts))
+        sys.exit(0)
+
+    # 命令行操作结束后立即退出，不需要合并写入
+    workspaces = create_workspaces(args.storage, args.data, args.workspace_dir,
+                                   0 if args.cli is not None else args.write_delay / 1000, args.history_limit,
+                                   args.archive_after, args.workspace_cache)
+    if args.workspace not in workspaces:
+        try:
+            workspaces.create(args.workspace)
+        except (WorkspaceError, OSError) as e:
+            parser.error(str(e))
+
+    if args.cli is not None:
+        sys.exit(cli.main(args.cli, workspaces.open_storage(workspaces.path(args.workspace))))
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    if profiler is not None:
+        profiler.mark("QApplication")
+    window = GoalManager(profiler=profiler, workspaces=workspaces, workspace=args.workspace)
+    if args.serve is not None:
+        window.start_sync_server(args.serve_host, args.serve, args.serve_token)
     sys.exit(app.exec_())
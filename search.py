@@ -0,0 +1,359 @@
+import heapq
+import threading
+from collections import deque
+
+import instrumentation
+
+
+def normalize(text):
+    """
+    统一大小写，英文字母不区分大小写。
+    """
+    return text.casefold()
+
+
+def grams(text):
+    """
+    返回文字中的全部单字和相邻两字。
+    """
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def query_grams(query):
+    """
+    返回查找 query 所需的倒排表键：一个字时为该字本身，否则为其中各个相邻两字。
+    """
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+class NgramIndex:
+    """
+    字符 n-gram 倒排索引，把键（目标 id 或名称）按其文字编入索引。
+
+    说明：
+    目标名称是最多 10 个字的中文短语，没有可以切分的词，因此按字符建立倒排索引：每个名称的所有单字和
+    相邻两字都指向该名称。查询一个字时直接取单字的倒排表，查询更长的文字时取其中各个两字组合的倒排表求交集，
+    再逐个确认名称确实包含查询文字。
+    添加、删除一个键只涉及它的文字中的十几个 gram，与索引的大小无关。
+    """
+
+    def __init__(self):
+        self._postings = {}  # gram 到键集合的映射
+        self._texts = {}  # 键到规范化文字的映射
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def add(self, key, text):
+        """
+        添加或更新一个键，文字未变时什么也不做。
+        """
+        text = normalize(text)
+        old = self._texts.get(key)
+        if old == text:
+            return
+        if old is not None:
+            self.remove(key)
+        self._texts[key] = text
+        for gram in grams(text):
+            self._postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in grams(text):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def search(self, query):
+        """
+        返回文字包含 query 的全部键。
+
+        参数：
+        query (str): 查询文字，不区分英文大小写。
+
+        返回值：
+        set: 匹配的键，query 为空时返回全部键。
+        """
+        query = normalize(query)
+        if not query:
+            return set(self._texts)
+        postings = []
+        for gram in query_grams(query):
+            keys = self._postings.get(gram)
+            if not keys:
+                return set()
+            postings.append(keys)
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        result = set(postings[0])
+        for keys in postings[1:]:
+            result &= keys
+            if not result:
+                return result
+        if len(query) > 2:
+            # 各个两字组合都出现不代表它们相邻，逐个确认
+            result = {key for key in result if query in self._texts[key]}
+        return result
+
+
+class HistoryIndex:
+    """
+    已完成目标或操作记录的索引：名称编入 NgramIndex，每个名称对应使用该名称的记录列表。
+
+    说明：
+    同一个目标的记录很多，只为不同的名称建立 n-gram，索引的大小与不同名称的数量有关。
+    记录按追加的顺序（即从旧到新）保存在各名称的列表中。
+    设置 maxlen 后与 ActionLog 一样只保留最新的 maxlen 条记录，追加时丢弃最早的一条。
+    """
+
+    def __init__(self, items=(), maxlen=None):
+        self.names = NgramIndex()
+        self.items = {}  # 名称到记录列表的映射
+        self.maxlen = maxlen
+        self._order = None if maxlen is None else deque()  # 各条记录的名称，从旧到新
+        for item, name in items:
+            self.add(item, name)
+
+    def add(self, item, name):
+        items = self.items.get(name)
+        if items is None:
+            items = self.items[name] = deque()
+            self.names.add(name, name)
+        items.append(item)
+        if self._order is not None:
+            self._order.append(name)
+            if len(self._order) > self.maxlen:
+                self._drop_oldest()
+
+    def _drop_oldest(self):
+        # 最早的一条记录一定在它的名称的列表开头
+        name = self._order.popleft()
+        items = self.items[name]
+        items.popleft()
+        if not items:
+            del self.items[name]
+            self.names.remove(name)
+
+    def count(self, query):
+        return sum(len(self.items[name]) for name in self.names.search(query))
+
+    def newest_first(self, query, key):
+        """
+        按 key 从大到小逐个返回名称包含 query 的记录，各名称的记录列表已经有序，只需归并。
+        """
+        return heapq.merge(*(reversed(self.items[name]) for name in self.names.search(query)),
+                           key=key, reverse=True)
+
+
+def _action_time(record):
+    return record.time
+
+
+def _completion_date(goal):
+    return goal.get('completion_date', '')
+
+
+class SearchIndex:
+    """
+    活动目标、已完成目标和操作记录的搜索索引，由 GoalStore 在每次增删改时增量维护。
+
+    说明：
+    活动目标的索引在创建时建立。已完成目标和操作记录的索引在第一次用到时才扫描全部历史数据建立，
+    之后随新的记录增量更新；归档的每个分段在搜索到它时才读取并建立索引，建立后一直缓存。
+    操作记录的索引保存对全部记录的引用，SQLite 后端原本不在内存中保存操作记录，建立索引后也会占用相应的内存。
+
+    preload_history 在后台线程中建立历史数据的索引，界面在输入时调用它，不必等待扫描完成。
+    后台线程只读取开始时已有的记录，之后追加的记录在 GUI 线程第一次使用索引时补上。
+    存储后端的 history_generation 变化（记录被移入归档或删除）后，历史数据的索引在下次使用时重新建立。
+    """
+
+    def __init__(self, store):
+        """
+        参数：
+        store (GoalStore): 目标数据，只在建立索引时读取。
+        """
+        self._store = store
+        self.goals = NgramIndex()
+        self._completed = None
+        self._actions = None
+        self._generation = None  # 建立历史数据的索引时存储后端的 history_generation
+        self._loader = None  # 在后台建立历史数据索引的线程
+        self._built = None  # 后台线程建立的索引，尚未补上之后追加的记录
+        self._build_id = 0  # reset_history 时增加，丢弃此前开始的后台建立
+        self._lock = threading.Lock()
+        self._segments = {}  # 归档分段文件名到 (建立时的条数, HistoryIndex) 的映射
+        self.reset_goals()
+
+    def reset_goals(self):
+        self.goals = NgramIndex()
+        for goal in self._store.goals:
+            self.goals.add(goal['id'], goal['name'])
+
+    def goal_added(self, goal):
+        self.goals.add(goal['id'], goal['name'])
+
+    def goal_removed(self, goal):
+        self.goals.remove(goal['id'])
+
+    def goal_changed(self, goal):
+        # 完成次数的变化也会通知，名称未变时 add 什么也不做
+        self.goals.add(goal['id'], goal['name'])
+
+    def action_added(self, record):
+        if self._actions is not None:
+            self._actions.add(record, record.name)
+
+    def completed_added(self, goal):
+        if self._completed is not None:
+            self._completed.add(goal, goal['name'])
+
+    def reset_history(self):
+        """
+        丢弃已完成目标和操作记录的索引，下次使用时重新建立；正在后台建立的索引同样丢弃。
+        """
+        with self._lock:
+            self._build_id += 1
+            self._built = None
+        self._completed = None
+        self._actions = None
+
+    def history_ready(self):
+        """
+        使用历史数据的索引时是否不必等待：索引已建立，或者后台建立已经结束。
+        """
+        if self._completed is not None:
+            return self._generation == self._store.storage.history_generation
+        return self._loader is not None and not self._loader.is_alive()
+
+    def preload_history(self, on_ready=None):
+        """
+        在后台线程中建立已完成目标和操作记录的索引，已建立或正在建立时什么也不做。
+
+        参数：
+        on_ready (callable): 后台建立结束后在后台线程中调用，调用方负责转到 GUI 线程。
+        """
+        if self.history_ready() or (self._loader is not None and self._loader.is_alive()):
+            return
+        self.reset_history()
+        storage = self._store.storage
+        completed_goals = self._store.completed_goals
+        actions, mark = storage.actions_since()
+        state = (len(completed_goals), mark, storage.history_generation, self._build_id)
+        self._loader = threading.Thread(target=self._build_history,
+                                        args=(completed_goals, actions, state, self._action_limit(), on_ready),
+                                        name="SearchIndexLoader", daemon=True)
+        self._loader.start()
+
+    def _action_limit(self):
+        # 操作记录只保留 maxlen 条时，索引同样只保留这么多条
+        return self._store.storage.load_history()['actions'].maxlen
+
+    def _build_history(self, completed_goals, actions, state, limit, on_ready):
+        count, mark, generation, build_id = state
+        token = instrumentation.begin("search.preload_history")
+        try:
+            completed = HistoryIndex((completed_goals[i], completed_goals[i]['name']) for i in range(count))
+            action_index = HistoryIndex(((record, record.name) for record in actions), limit)
+        except Exception:
+            # 建立期间历史数据被移入归档等，下次使用时在 GUI 线程中重新建立
+            completed = None
+        with self._lock:
+            if completed is not None and build_id == self._build_id:
+                self._built = (completed, action_index, count, mark, generation)
+        instrumentation.end(token)
+        if on_ready is not None:
+            on_ready()
+
+    def _ensure_history(self):
+        """
+        确保历史数据的索引可用：过期时丢弃，后台建立的索引补上之后追加的记录，都没有时同步建立。
+        """
+        storage = self._store.storage
+        if self._completed is not None and self._generation != storage.history_generation:
+            self.reset_history()
+        if self._completed is not None:
+            return
+        if self._loader is not None:
+            self._loader.join()
+            self._loader = None
+        with self._lock:
+            built, self._built = self._built, None
+        completed_goals = self._store.completed_goals
+        if built is not None and built[4] == storage.history_generation:
+            completed, actions, count, mark, generation = built
+            for goal in completed_goals[count:]:
+                completed.add(goal, goal['name'])
+            for record in storage.actions_since(mark)[0]:
+                actions.add(record, record.name)
+        else:
+            token = instrumentation.begin("search.build_history")
+            generation = storage.history_generation
+            completed = HistoryIndex((goal, goal['name']) for goal in completed_goals)
+            actions = HistoryIndex(((record, record.name) for record in storage.actions_since()[0]),
+                                   self._action_limit())
+            instrumentation.end(token, items=len(completed.names) + len(actions.names))
+        self._completed, self._actions, self._generation = completed, actions, generation
+
+    @property
+    def completed(self):
+        self._ensure_history()
+        return self._completed
+
+    @property
+    def actions(self):
+        self._ensure_history()
+        return self._actions
+
+    def search_goals(self, query):
+        """
+        返回名称包含 query 的活动目标 id 集合。
+        """
+        return self.goals.search(query)
+
+    def search_completed(self, query):
+        """
+        返回名称包含 query 的已完成目标，按完成日期从新到旧排列。
+        """
+        return list(self.completed.newest_first(query, _completion_date))
+
+    def search_actions(self, query):
+        """
+        按从新到旧的顺序逐条返回名称包含 query 的操作记录，调用方按需取用。
+        """
+        return self.actions.newest_first(query, _action_time)
+
+    def count(self, query):
+        """
+        返回 (活动目标数, 已完成目标数, 操作记录数) 中名称包含 query 的数量。
+        """
+        return len(self.goals.search(query)), self.completed.count(query), self.actions.count(query)
+
+    def search_segment(self, history_archive, segment, query):
+        """
+        返回归档分段中名称包含 query 的记录，按时间从新到旧排列。
+
+        参数：
+        history_archive (HistoryArchive): 归档。
+        segment (dict): history_archive.segments 返回的分段。
+        query (str): 查询文字。
+        """
+        # 分段追加过记录后条数会变化，此时重新建立
+        count, index = self._segments.get(segment['file'], (None, None))
+        if count != segment['count']:
+            token = instrumentation.begin("search.build_segment")
+            items = history_archive.read(segment)
+            name_of = (lambda item: item.name) if segment['kind'] == "actions" else (lambda item: item['name'])
+            index = HistoryIndex((item, name_of(item)) for item in items)
+            self._segments[segment['file']] = (segment['count'], index)
+            instrumentation.end(token, items=len(items))
+        key = _action_time if segment['kind'] == "actions" else _completion_date
+        return list(index.newest_first(query, key))
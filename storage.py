@@ -0,0 +1,1852 @@
+import atexit
+import contextlib
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date
+
+import archive
+import instrumentation
+from action_log import ActionKind, ActionLog, ActionRecord, RecordView, load_action_log
+from fileutil import FileLock, file_signature, write_json_atomic, write_json_file
+from goal_record import GoalRecord
+
+
+def goal_values(goal):
+    """
+    返回目标中可修改的各项，用于比较两份数据中的同一个目标。
+    """
+    return goal['name'], goal['deadline'], goal['target_times'], goal['completed_times']
+
+
+def goal_map(goals):
+    """
+    返回目标 id 到 goal_values 的映射。
+    """
+    return {goal['id']: goal_values(goal) for goal in goals}
+
+
+def goal_from_values(goal_id, values):
+    return GoalRecord(goal_id, *values)
+
+
+def _action_key(record):
+    return record.time, int(record.kind), record.goal_id, record.name, repr(record.old), repr(record.new)
+
+
+def diff_actions(memory, disk):
+    """
+    比较内存中和文件中的操作记录。
+
+    参数：
+    memory (ActionLog): 内存中的操作记录。
+    disk (iterable): 从文件中读出的操作记录。
+
+    返回值：
+    tuple: (文件中有而内存中没有的记录列表, 内存中是否有文件中没有的记录)。
+
+    说明：
+    两个实例各自追加后再合并，双方记录的先后顺序可能不同，因此按内容逐条配对，
+    内容完全相同的多条记录按条数配对。内存中的记录因 history_limit 已被丢弃时，
+    文件中早于内存中最早一条的记录不视为新记录。
+    """
+    counts = Counter(_action_key(record) for record in memory)
+    oldest = None
+    if memory.maxlen is not None and len(memory) >= memory.maxlen:
+        oldest = next(iter(memory)).time
+    new = []
+    for record in disk:
+        key = _action_key(record)
+        if counts[key]:
+            counts[key] -= 1
+        elif oldest is None or record.time >= oldest:
+            new.append(record)
+    return new, any(counts.values())
+
+
+class WriteBehindWriter:
+    """
+    后台写入线程。
+
+    说明：
+    schedule 提交的数据不会立即写入，而是在第一次提交后的 delay 秒内合并后续提交，
+    到期后只把最新的一份交给 write 写入磁盘，连续点击时只产生一次写入。
+    写入在专用线程中进行，不阻塞 GUI 线程。
+    """
+
+    def __init__(self, write, delay=0.5):
+        """
+        参数：
+        write (callable): 实际执行写入的函数，接收 schedule 提交的数据。
+        delay (float): 合并写入的时间窗口，单位为秒。
+        """
+        self._write = write
+        self.delay = delay
+        self._cond = threading.Condition()
+        self._pending = None
+        self._due = None
+        self._writing = False
+        self._closed = False
+
+        self.requests = 0
+        self.writes = 0
+        self.last_latency = None
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="WriteBehindWriter", daemon=True)
+        self._thread.start()
+        # 程序未经 close 直接退出时，也要写入尚未写入的数据
+        atexit.register(self.flush)
+
+    def schedule(self, data):
+        """
+        提交一份待写入的数据，替换尚未写入的旧数据。
+        """
+        with self._cond:
+            self._pending = data
+            self.requests += 1
+            if self._due is None:
+                self._due = time.monotonic() + self.delay
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                while not self._closed and time.monotonic() < self._due:
+                    self._cond.wait(self._due - time.monotonic())
+                data, self._pending, self._due = self._pending, None, None
+                self._writing = True
+
+            start = time.perf_counter()
+            try:
+                self._write(data)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            latency = time.perf_counter() - start
+
+            with self._cond:
+                self._writing = False
+                self.writes += 1
+                self.last_latency = latency
+                self._cond.notify_all()
+
+    def has_pending(self):
+        """
+        是否有尚未写入完成的数据。
+        """
+        with self._cond:
+            return self._pending is not None or self._writing
+
+    def flush(self):
+        """
+        立即写入尚未写入的数据，并等待写入完成。
+        """
+        with self._cond:
+            if self._pending is not None:
+                self._due = time.monotonic()
+                self._cond.notify_all()
+            while self._pending is not None or self._writing:
+                self._cond.wait()
+
+    def close(self):
+        """
+        写入剩余数据并结束后台线程。
+
+        说明：
+        同时取消退出时的 flush，atexit 不再引用已关闭的写入线程，存储后端关闭后即可被回收。
+        """
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        """
+        返回写入状态，用于监控。
+
+        返回值：
+        dict: pending 是否有待写入数据，requests 提交次数，writes 实际写入次数，
+        last_latency_ms 最近一次写入耗时（毫秒），last_error 最近一次写入错误。
+        """
+        with self._cond:
+            pending = self._pending is not None or self._writing
+        return {'pending': pending,
+                'requests': self.requests,
+                'writes': self.writes,
+                'last_latency_ms': None if self.last_latency is None else self.last_latency * 1000,
+                'last_error': None if self.last_error is None else str(self.last_error)}
+
+
+def empty_data(history_limit=None):
+    return {'goals': [], 'completed_goals': [], 'actions': ActionLog(maxlen=history_limit),
+            'monthly_completions': {}}
+
+
+def add_monthly_completion(monthly_completions, goal):
+    """
+    把一个已完成目标计入按月汇总的完成数，没有完成日期的旧数据不计入。
+
+    参数：
+    monthly_completions (dict): 月份 "yyyy-MM" 到完成目标数的映射。
+    goal (dict): 已完成的目标。
+    """
+    month = goal.get('completion_date', '')[:7]
+    if month:
+        monthly_completions[month] = monthly_completions.get(month, 0) + 1
+
+
+def count_monthly_completions(completed_goals):
+    """
+    统计每个月完成的目标数，只在数据文件中没有汇总结果时使用。
+    """
+    monthly_completions = {}
+    for goal in completed_goals:
+        add_monthly_completion(monthly_completions, goal)
+    return monthly_completions
+
+
+def new_goal_id():
+    """
+    生成新的目标 id。
+    """
+    return uuid.uuid4().hex
+
+
+def ensure_goal_ids(goals, prefix):
+    """
+    为旧版数据中没有 id 的目标分配 id。
+
+    参数：
+    goals (list): 目标列表。
+    prefix (str): id 前缀。
+
+    说明：
+    id 由前缀和目标在列表中的位置组成，同一份旧数据每次加载得到的 id 相同，
+    保证在数据重新保存之前写入的追加日志仍能按 id 找到目标。
+    """
+    for position, goal in enumerate(goals):
+        if 'id' not in goal:
+            goal['id'] = f"{prefix}-{position}"
+
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+def _parse_json_head(text, keys):
+    """
+    解析 JSON 对象开头的键值，直到 keys 中的键全部读到。
+
+    返回值：
+    tuple: (已解析的键值 dict, 剩余部分的起始位置)，整个对象都已解析时位置为 None。
+    文本不完整或格式不符时抛出 ValueError 或 IndexError。
+    """
+    wanted = set(keys)
+    decoder = json.JSONDecoder()
+    head = {}
+    pos = _WHITESPACE.match(text).end()
+    if text[pos] != '{':
+        raise ValueError("顶层不是对象")
+    pos = _WHITESPACE.match(text, pos + 1).end()
+    if text[pos] == '}':
+        return head, None
+    while True:
+        key, pos = decoder.raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] != ':':
+            raise ValueError("缺少冒号")
+        pos = _WHITESPACE.match(text, pos + 1).end()
+        head[key], pos = decoder.raw_decode(text, pos)
+        pos = _WHITESPACE.match(text, pos).end()
+        if text[pos] == '}':
+            return head, None
+        if text[pos] != ',':
+            raise ValueError("缺少逗号")
+        wanted.discard(key)
+        if not wanted:
+            return head, pos + 1
+        pos = _WHITESPACE.match(text, pos + 1).end()
+
+
+def read_json_head(f, keys, chunk_size=64 * 1024):
+    """
+    从文件中只读取并解析 JSON 对象开头的部分键，其余部分留待以后解析。
+
+    参数：
+    f (file): 以文本方式打开的 JSON 文件，顶层必须是对象。
+    keys (iterable): 需要的键，全部读到后即停止读取。
+    chunk_size (int): 第一次读取的字符数，不够时每次加倍。
+
+    返回值：
+    tuple: (已解析的键值 dict, 剩余部分的开头)。剩余部分的开头加上 f 中尚未读取的内容，
+    即为由其余键值组成的 JSON 对象文本；整个对象都已解析时为 None。
+
+    说明：
+    数据文件把活动目标写在最前面，启动时只需读取并解析这一小段即可显示主窗口，
+    已完成目标和操作记录可以稍后在后台线程中解析。读到文件末尾仍无法解析时退回完整解析。
+    """
+    text = f.read(chunk_size)
+    while True:
+        try:
+            head, pos = _parse_json_head(text, keys)
+        except (ValueError, IndexError):
+            more = f.read(max(len(text), chunk_size))
+            if not more:
+                return json.loads(text), None
+            text += more
+            continue
+        return head, (None if pos is None else '{' + text[pos:])
+
+
+def read_json_rest(head, rest, f):
+    """
+    读取 read_json_head 留下的其余部分，与已解析的键值合并后关闭文件。
+
+    参数：
+    head (dict): read_json_head 返回的已解析的键值。
+    rest (str): read_json_head 返回的剩余部分的开头。
+    f (file): 传给 read_json_head 的文件，为 None 时表示没有文件。
+
+    返回值：
+    dict: 完整的 JSON 对象。
+    """
+    if f is None:
+        return head
+    with f:
+        if rest is None:
+            return head
+        return dict(head, **json.loads(rest + f.read()))
+
+
+def read_goals(raw):
+    """
+    从 JSON 文件的内容中读取活动目标，没有 id 的目标在此时分配 id。
+    """
+    goals = raw.get('goals', [])
+    ensure_goal_ids(goals, "legacy")
+    return [GoalRecord.from_json(goal) for goal in goals]
+
+
+def read_history(raw, history_limit=None):
+    """
+    从 JSON 文件的内容中读取已完成目标、操作记录和按月汇总的完成数。
+
+    说明：
+    旧版文字操作记录在此时迁移为结构化记录，没有 id 的已完成目标在此时分配 id。
+    """
+    completed_goals = raw.get('completed_goals', [])
+    ensure_goal_ids(completed_goals, "legacy-done")
+    completed_goals = [GoalRecord.from_json(goal) for goal in completed_goals]
+    monthly_completions = raw.get('monthly_completions')
+    if monthly_completions is None:
+        monthly_completions = count_monthly_completions(completed_goals)
+    return {'completed_goals': completed_goals,
+            'actions': load_action_log(raw, history_limit),
+            'monthly_completions': monthly_completions}
+
+
+def read_data(raw, history_limit=None):
+    """
+    把 JSON 文件的内容转换为内存中的数据。
+    """
+    return dict(read_history(raw, history_limit), goals=read_goals(raw))
+
+
+def archive_cutoff(days, now=None):
+    """
+    返回保留最近 days 天历史数据时的归档分界 (操作记录的分界时间戳, 已完成目标的分界日期 yyyy-MM-dd)。
+    """
+    before = (time.time() if now is None else now) - days * 86400
+    return int(before), date.fromtimestamp(before).isoformat()
+
+
+def drop_archived(data, cutoff):
+    """
+    从内存中的历史数据中移除早于归档分界的部分。
+
+    参数：
+    data (dict): 包含 completed_goals 和 actions 的数据。
+    cutoff (tuple): HistoryArchive.cutoff 返回的归档分界。
+
+    返回值：
+    bool: 是否移除了数据。
+
+    说明：
+    其它实例归档之后，或者归档后保存主数据之前崩溃时，主数据中还留有已归档的记录，
+    读取时按分界移除，下次保存时它们就不再写入主数据。按月汇总的完成数保持不变。
+    """
+    actions_before, completed_before = cutoff
+    dropped = False
+    if actions_before is not None and data['actions'].drop_before(actions_before):
+        dropped = True
+    if completed_before is not None:
+        completed_goals = data['completed_goals']
+        kept = [goal for goal in completed_goals if not archive.is_archivable(goal, completed_before)]
+        if len(kept) < len(completed_goals):
+            # 原地修改，界面中的模型仍引用这个列表
+            completed_goals[:] = kept
+            dropped = True
+    return dropped
+
+
+def file_data(data):
+    """
+    把内存中的数据（或其副本）转换为写入 JSON 文件的格式。
+    """
+    return {'goals': [goal.to_json() for goal in data['goals']],
+            'completed_goals': [goal.to_json() for goal in data['completed_goals']],
+            'actions': [record.to_json() for record in data['actions']],
+            'monthly_completions': data['monthly_completions']}
+
+
+class StorageBackend:
+    """
+    存储后端接口。
+
+    说明：
+    GoalManager 先修改内存中的数据，再调用下列方法告知后端发生了哪些变化，
+    一次用户操作结束后调用 commit 持久化。load 返回的列表与 GoalManager 共用，
+    需要整体保存的后端可以直接读取它们。
+
+    操作记录保存在 ActionLog 中，history_limit 不为 None 时只保留最新的 history_limit 条。
+
+    为了尽快显示主窗口，load 可以只加载活动目标，已完成目标、操作记录和按月汇总的完成数
+    （统称历史数据）推迟到 load_history 中加载。需要历史数据的方法都先调用 load_history。
+
+    archive 为数据文件旁的归档目录 HistoryArchive。设置 archive_after 后，关闭时把超过 archive_after 天的
+    操作记录和已完成目标移入归档，主数据中只保留最近的部分；早于归档分界的记录在加载时从内存中移除。
+
+    history_generation 在历史数据中的记录被移除（移入归档、按 history_limit 删除）时加一，
+    缓存了历史数据的调用方（例如搜索索引）据此判断缓存是否过期。
+    """
+    history_limit = None
+    archive_after = None
+    archive = None
+
+    def __init__(self):
+        self.data = empty_data(self.history_limit)
+        self.history_generation = 0
+        self._history_loaded = True
+        self._history_lock = threading.Lock()
+
+    def load(self):
+        """
+        加载数据。
+
+        返回值：
+        dict: 数据，其中的 goals 已加载；completed_goals、actions 和 monthly_completions
+        可能要等 load_history 之后才可用。
+        """
+        raise NotImplementedError
+
+    @instrumentation.timed("load_history")
+    def load_history(self):
+        """
+        确保历史数据已加载，正在后台加载时等待其完成。
+
+        返回值：
+        dict: 包含 goals、completed_goals、actions 和 monthly_completions 的数据。
+        """
+        if not self._history_loaded:
+            with self._history_lock:
+                if not self._history_loaded:
+                    self._load_history()
+                    self._history_loaded = True
+        return self.data
+
+    def _load_history(self):
+        """
+        由推迟加载历史数据的后端实现，把历史数据填入 self.data。
+        """
+
+    def preload_history(self):
+        """
+        在后台线程中加载历史数据，已加载时什么也不做。
+
+        说明：
+        后台加载失败时不做处理，下次调用 load_history 时会在调用方线程中重新加载并抛出异常。
+        """
+        if self._history_loaded:
+            return
+        threading.Thread(target=self.load_history, name="HistoryLoader", daemon=True).start()
+
+    def add_goal(self, goal):
+        """新目标已追加到目标列表末尾。"""
+
+    def update_goal(self, goal):
+        """目标的内容发生了变化。"""
+
+    def delete_goal(self, goal):
+        """目标已从目标列表中移除。"""
+
+    def complete_goal(self, goal):
+        """目标已追加到已完成目标列表末尾。"""
+
+    def add_action(self, record):
+        """
+        追加一条操作记录 ActionRecord。
+
+        说明：
+        默认追加到内存中的操作记录，数据库等可以直接查询记录的后端不必在内存中保留它们。
+        """
+        self.load_history()['actions'].append(record)
+
+    def commit(self):
+        """持久化自上次 commit 以来的所有变化。"""
+
+    def close(self):
+        """保存尚未持久化的数据并释放资源。"""
+        self.commit()
+
+    def release(self):
+        """只读取过数据时释放资源，不写入任何数据，也不归档。"""
+
+    def archive_history(self, days=None):
+        """
+        把超过保留天数的操作记录和已完成目标移入归档。
+
+        参数：
+        days (int): 保留最近多少天的历史数据，为 None 时使用 archive_after，两者都为 None 时不归档。
+
+        返回值：
+        tuple: 归档的 (操作记录数, 已完成目标数)。
+
+        说明：
+        默认实现适用于把历史数据保存在内存中的后端：先把要归档的数据写入归档，再从内存中移除，
+        由 _history_dropped 安排重新保存主数据。
+        """
+        days = self.archive_after if days is None else days
+        if days is None:
+            return 0, 0
+        actions_before, completed_before = archive_cutoff(days)
+        data = self.load_history()
+        actions = [record for record in data['actions'] if record.time < actions_before]
+        completed_goals = [goal for goal in data['completed_goals']
+                           if archive.is_archivable(goal, completed_before)]
+        if not actions and not completed_goals:
+            return 0, 0
+        self.archive.add(actions, completed_goals, actions_before, completed_before)
+        if self._drop_archived(data):
+            self._history_dropped()
+        return len(actions), len(completed_goals)
+
+    def _drop_archived(self, data):
+        """
+        从内存中的历史数据中移除已归档的部分，见 drop_archived；移除了记录时增加 history_generation。
+        """
+        if drop_archived(data, self.archive.cutoff()):
+            self.history_generation += 1
+            return True
+        return False
+
+    def _history_dropped(self):
+        """
+        历史数据中的一部分已移入归档，需要重新保存主数据。
+        """
+
+    def _archive_expired(self):
+        """
+        关闭时按 archive_after 归档。历史数据从未加载过时跳过，避免为此解析整个数据文件。
+        """
+        if self.archive_after is not None and self._history_loaded:
+            self.archive_history()
+
+    def watch_paths(self):
+        """
+        返回需要监视的文件和目录，其它程序修改数据时它们会发生变化。
+        """
+        return []
+
+    def external_changed(self):
+        """
+        数据是否被其它程序修改过且尚未通过 read_external 合并，只检查文件状态，开销很小。
+        """
+        return False
+
+    def read_external(self):
+        """
+        读取其它程序所做的修改。
+
+        返回值：
+        dict: 没有外部修改时为 None。否则包含 goals（外部当前的全部活动目标）、
+        base（上次同步时活动目标的 goal_map）、completed_goals（新增的已完成目标）
+        和 actions（新增的操作记录）。
+
+        说明：
+        新增的已完成目标和操作记录在返回之前已经加入内存中的历史数据；活动目标由调用方
+        对照 base 合并，合并时不能再调用 add_goal 等方法，合并后调用 external_merged。
+        """
+        return None
+
+    def external_merged(self):
+        """
+        调用方已把 read_external 返回的活动目标合并到内存中。
+        """
+
+    def snapshot(self):
+        """
+        返回当前数据的副本，供后台线程写入快照。
+
+        说明：
+        活动目标会被继续修改，因此逐个复制；已完成目标和操作记录只会追加且不再修改，复制列表即可。
+        """
+        self.load_history()
+        return {'goals': [goal.copy() for goal in self.data['goals']],
+                'completed_goals': list(self.data['completed_goals']),
+                'actions': list(self.data['actions']),
+                'monthly_completions': dict(self.data['monthly_completions'])}
+
+    def count_actions(self):
+        """
+        返回操作记录的总数。
+        """
+        return len(self.load_history()['actions'])
+
+    def iter_actions(self):
+        """
+        按从旧到新的顺序逐条返回全部操作记录，迭代期间不能追加记录。
+        """
+        return iter(self.load_history()['actions'])
+
+    def actions_since(self, mark=None):
+        """
+        返回上次调用之后追加的操作记录。
+
+        参数：
+        mark (object): 上次调用返回的位置，为 None 时返回全部记录。
+
+        返回值：
+        tuple: (按从旧到新排列的记录, 下次调用使用的位置)。记录的范围在调用时确定，
+        可以在其它线程中逐条读取，期间追加的记录留给下次调用。
+        """
+        return self.load_history()['actions'].since(mark)
+
+    def query_actions(self, action_filter=None, cursor=None, limit=100):
+        """
+        按从新到旧的顺序分页查询操作记录 ActionRecord。
+
+        参数：
+        action_filter (ActionFilter): 筛选条件，在返回之前就已应用。
+        cursor (object): 上一页返回的游标，为 None 时从最新的记录开始。
+        limit (int): 每页最多返回的条数。
+
+        返回值：
+        tuple: (记录列表, 下一页的游标)，没有更多记录时游标为 None。
+        """
+        return self.load_history()['actions'].query(action_filter, cursor, limit)
+
+
+class JsonStorage(StorageBackend):
+    """
+    单个 JSON 文件的存储方式，每次 commit 都完整保存全部数据。
+
+    说明：
+    write_delay 大于 0 时，commit 只把数据快照交给后台写入线程，
+    write_delay 秒内的多次 commit 合并为一次写入；close 时同步写入剩余数据。
+    快照中的历史数据只是只读视图，活动目标只重新复制上次快照之后变化过的，每次点击的开销与历史数据的多少无关。
+
+    加载时只读取并解析文件开头的活动目标，文件保持打开，其余部分在 load_history 中再读取和解析。
+    写入之前总是先加载历史数据，因此替换文件时它已经关闭。
+
+    写入时持有文件锁，并检查文件自上次读写之后是否被其它程序替换过；被替换过时放弃本次写入，
+    等调用方通过 read_external 合并对方的修改后再写入，不会覆盖对方的数据。
+    """
+
+    def __init__(self, path="goals.json", write_delay=0.5, history_limit=None, archive_after=None):
+        self.path = path
+        self.history_limit = history_limit
+        self.archive_after = archive_after
+        self.archive = archive.HistoryArchive(f"{path}.archive")
+        super().__init__()
+        self._head = None
+        self._rest = None
+        self._file = None
+        self._dirty = False
+        self._lock = FileLock(path)
+        self._signature = None  # 上次读写后数据文件的 file_signature
+        self._base = {}  # 上次读写时文件中活动目标的 goal_map
+        self._unsaved_history = False
+        self._goal_copies = {}  # 目标 id 到快照中目标副本的映射
+        self._changed_goals = {}  # 上次快照之后变化过的目标，id 到目标的映射
+        self.skipped_writes = 0
+        self._writer = WriteBehindWriter(self._write, write_delay) if write_delay > 0 else None
+
+    def load(self):
+        self.data = empty_data(self.history_limit)
+        self._signature = None
+        self._base = {}
+        self._goal_copies = {}
+        self._changed_goals = {}
+        try:
+            f = open(self.path, "r")
+        except FileNotFoundError:
+            return self.data
+        try:
+            self._signature = file_signature(f.fileno())
+            self._head, self._rest = read_json_head(f, ('goals',))
+        except BaseException:
+            f.close()
+            raise
+        self._file = f
+        self.data['goals'] = read_goals(self._head)
+        self._base = goal_map(self.data['goals'])
+        self._history_loaded = False
+        return self.data
+
+    def _load_history(self):
+        self.data.update(read_history(read_json_rest(self._head, self._rest, self._file), self.history_limit))
+        self._head = self._rest = self._file = None
+        self._drop_archived(self.data)
+
+    def add_goal(self, goal):
+        self._changed_goals[goal['id']] = goal
+        self._dirty = True
+
+    def update_goal(self, goal):
+        self._changed_goals[goal['id']] = goal
+        self._dirty = True
+
+    def delete_goal(self, goal):
+        self._changed_goals.pop(goal['id'], None)
+        self._goal_copies.pop(goal['id'], None)
+        self._dirty = True
+
+    def complete_goal(self, goal):
+        self._dirty = True
+
+    def add_action(self, record):
+        super().add_action(record)
+        self._dirty = True
+
+    def commit(self):
+        if not self._dirty:
+            return
+        if self._writer is not None:
+            self._writer.schedule(self.snapshot())
+            self._dirty = False
+        else:
+            self.save()
+
+    def snapshot(self):
+        """
+        返回交给后台写入线程的数据快照。
+
+        说明：
+        操作记录取 ActionLog 的只读视图，已完成目标取列表当前长度以内的部分，两者都是 O(1) 操作；
+        已完成目标列表只会在移入归档时原地缩短，此前先等待写入线程写完。活动目标的副本在快照之间保留，
+        只为通过 add_goal、update_goal 告知变化的目标重新复制。
+        """
+        data = self.load_history()
+        copies = self._goal_copies
+        for goal_id, goal in self._changed_goals.items():
+            copies[goal_id] = goal.copy()
+        self._changed_goals = {}
+        goals = []
+        for goal in data['goals']:
+            copy = copies.get(goal['id'])
+            if copy is None:
+                copy = copies[goal['id']] = goal.copy()
+            goals.append(copy)
+        completed_goals = data['completed_goals']
+        return {'goals': goals,
+                'completed_goals': RecordView(completed_goals, 0, len(completed_goals)),
+                'actions': data['actions'].view(),
+                'monthly_completions': dict(data['monthly_completions'])}
+
+    def archive_history(self, days=None):
+        # 移入归档时原地缩短已完成目标列表，先让写入线程写完仍引用它的快照
+        if self._writer is not None:
+            self._writer.flush()
+        return super().archive_history(days)
+
+    def save(self):
+        """
+        同步完整保存全部数据，文件已被其它程序修改时保持未保存状态。
+        """
+        if self._writer is not None:
+            self._writer.flush()
+        self._dirty = not self._write(self.load_history())
+
+    def _write(self, data):
+        """
+        先写入临时文件再替换原文件，写入中途崩溃不会破坏已有数据。
+
+        返回值：
+        bool: 是否已写入。文件在上次读写之后被其它程序修改过时不写入，返回 False。
+        """
+        with self._lock:
+            if file_signature(self.path) != self._signature:
+                self.skipped_writes += 1
+                return False
+            token = instrumentation.begin("json.write")
+            size = write_json_atomic(self.path, file_data(data), separators=(',', ':'))
+            instrumentation.end(token, bytes=size)
+            instrumentation.record_size("json.write", size)
+            self._signature = file_signature(self.path)
+            self._base = goal_map(data['goals'])
+        return True
+
+    def watch_paths(self):
+        return [self.path, os.path.dirname(os.path.abspath(self.path))]
+
+    def external_changed(self):
+        return file_signature(self.path) != self._signature
+
+    def read_external(self):
+        # 先让后台写入线程处理完已提交的数据，它们要么已写入，要么因文件已被修改而放弃
+        if self._writer is not None:
+            self._writer.flush()
+        memory = self.load_history()
+        with self._lock:
+            if file_signature(self.path) == self._signature:
+                return None
+            try:
+                with open(self.path, "r") as f:
+                    signature = file_signature(f.fileno())
+                    raw = json.load(f)
+            except FileNotFoundError:
+                signature, raw = None, {}
+        disk = read_data(raw, self.history_limit)
+        # 其它实例可能刚归档过，双方都先移除已归档的部分再比较
+        self._drop_archived(memory)
+        drop_archived(disk, self.archive.cutoff())
+
+        known = {goal['id'] for goal in memory['completed_goals']}
+        completed_goals = [goal for goal in disk['completed_goals'] if goal['id'] not in known]
+        actions, unsaved_actions = diff_actions(memory['actions'], disk['actions'])
+        # 内存中有文件中没有的历史数据时，合并后需要写入
+        on_disk = {goal['id'] for goal in disk['completed_goals']}
+        self._unsaved_history = unsaved_actions or any(goal['id'] not in on_disk
+                                                       for goal in memory['completed_goals'])
+        for goal in completed_goals:
+            memory['completed_goals'].append(goal)
+            add_monthly_completion(memory['monthly_completions'], goal)
+        for record in actions:
+            memory['actions'].append(record)
+
+        base = self._base
+        self._signature = signature
+        self._base = goal_map(disk['goals'])
+        return {'goals': disk['goals'], 'base': base, 'completed_goals': completed_goals, 'actions': actions}
+
+    def external_merged(self):
+        # 合并时目标被直接修改，不经过 update_goal，已有的副本都可能过期
+        self._goal_copies = {}
+        self._changed_goals = {}
+        # 只有内存中的数据与文件不同时才需要写入，避免两个实例互相触发写入
+        if self._unsaved_history or goal_map(self.data['goals']) != self._base:
+            self._dirty = True
+        self._unsaved_history = False
+
+    def write_stats(self):
+        """
+        返回后台写入线程的状态，未启用后台写入时返回 None。
+        """
+        if self._writer is None:
+            return None
+        return dict(self._writer.stats(), skipped=self.skipped_writes)
+
+    def _history_dropped(self):
+        self._dirty = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._archive_expired()
+        if self._dirty:
+            self.save()
+
+    def release(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._head = self._rest = self._file = None
+
+
+def apply_record(data, goals_by_id, record):
+    """
+    把一条日志记录应用到数据上。
+
+    参数：
+    data (dict): 包含 completed_goals、actions 和 monthly_completions 的数据。
+    goals_by_id (dict): 按原有顺序排列的 id 到活动目标的映射，重放结束后再转换为目标列表。
+    record (dict): 日志记录。
+
+    说明：
+    记录中用目标 id 定位目标，按 id 修改和删除都是 O(1) 操作。
+    旧版日志用目标在列表中的位置定位目标，仍可以重放。
+    """
+    op = record["op"]
+    if "index" in record:
+        goal_id = list(goals_by_id)[record["index"]]
+        if op == "update_goal":
+            record["goal"]["id"] = goal_id
+        else:
+            record["id"] = goal_id
+    if op == "add_goal":
+        goal = record["goal"]
+        goal.setdefault("id", new_goal_id())
+        goals_by_id[goal["id"]] = GoalRecord.from_json(goal)
+    elif op == "update_goal":
+        goals_by_id[record["goal"]["id"]] = GoalRecord.from_json(record["goal"])
+    elif op == "delete_goal":
+        # 多个程序同时删除同一个目标时，日志中会有重复的删除记录
+        goals_by_id.pop(record["id"], None)
+    elif op == "complete_goal":
+        goal = GoalRecord.from_json(record["goal"])
+        data["completed_goals"].append(goal)
+        add_monthly_completion(data["monthly_completions"], goal)
+    elif op == "action":
+        if "action" in record:
+            data["actions"].append(ActionRecord.from_json(record["action"]))
+        else:
+            # 旧版日志中的文字操作记录
+            data["actions"].append(ActionRecord.parse(record["text"]))
+    else:
+        raise ValueError(f"未知的日志记录类型: {op}")
+
+
+def apply_goal_record(goals, record):
+    """
+    把日志记录中与活动目标有关的部分应用到 goal_map 上，其它记录忽略。
+    """
+    op = record["op"]
+    if op in ("add_goal", "update_goal"):
+        goals[record["goal"]["id"]] = goal_values(record["goal"])
+    elif op == "delete_goal":
+        goals.pop(record["id"], None)
+
+
+class JournalStorage(StorageBackend):
+    """
+    快照加追加日志的存储方式。
+
+    说明：
+    每次修改只向日志文件追加一行紧凑的 JSON 记录，写入开销与历史数据的多少无关。
+    当日志记录数或文件大小达到阈值时，在后台线程中把当前数据写成新的快照并丢弃旧日志。
+    加载时读取快照，再按顺序重放快照之后的日志记录。
+
+    快照中的 journal_seq 记录了它已包含的最后一条日志序号，
+    因此压缩过程中任何时刻崩溃，重新加载都不会丢失或重复应用记录。
+
+    快照中 journal_seq 和活动目标写在最前面，加载时只解析这两项并重放日志中与活动目标有关的记录；
+    快照的其余部分和日志中的完成、操作记录留到 load_history 中再处理。
+
+    多个程序实例可以共用同一份日志：追加和压缩都持有文件锁，追加之前先从上次读到的位置读取
+    其它实例追加的记录，使序号保持递增，这些记录留给 read_external 按 id 合并。
+    其它实例压缩了日志时，重新读取完整的快照和日志。
+    """
+
+    def __init__(self, snapshot_path="goals.json", max_records=500, max_bytes=1024 * 1024, history_limit=None,
+                 archive_after=None):
+        self.snapshot_path = snapshot_path
+        self.history_limit = history_limit
+        self.archive_after = archive_after
+        self.archive = archive.HistoryArchive(f"{snapshot_path}.archive")
+        self.journal_path = f"{snapshot_path}.journal"
+        self.old_journal_path = f"{self.journal_path}.old"
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+
+        super().__init__()
+        self._head = {}
+        self._rest = None
+        self._file = None
+        self._deferred = []
+        self._pending = []
+        self._seq = 0
+        self._records = 0
+        self._bytes = 0
+        self._journal = None
+        self._compaction = None
+
+        self._lock = FileLock(snapshot_path)
+        self._snapshot_signature = None
+        self._journal_inode = None  # 已读到的日志文件的 inode，没有日志文件时为 None
+        self._offset = 0  # 日志文件中已读到的字节数
+        self._mirror = {}  # 文件中当前活动目标的 goal_map，按日志顺序更新
+        self._base = {}  # 上次同步时的 goal_map，加上本实例之后追加的修改
+        self._foreign = []  # 其它实例追加、尚未合并的记录
+        self._replaced = None  # 其它实例压缩日志后重新读取的完整数据，尚未合并
+
+    def load(self):
+        """
+        读取快照中的活动目标并重放日志。
+
+        返回值：
+        dict: 数据，历史数据要等 load_history 之后才可用。
+        """
+        with self._lock:
+            data = self._load()
+        self._mirror = goal_map(data['goals'])
+        self._base = dict(self._mirror)
+        return data
+
+    def _load(self):
+        data = empty_data(self.history_limit)
+        self._head, self._rest, self._file = {}, None, None
+        self._snapshot_signature = None
+        try:
+            f = open(self.snapshot_path, "r")
+            try:
+                self._snapshot_signature = file_signature(f.fileno())
+                self._head, self._rest = read_json_head(f, ('journal_seq', 'goals'))
+            except BaseException:
+                f.close()
+                raise
+            self._file = f
+            data['goals'] = read_goals(self._head)
+            self._seq = self._head.get('journal_seq', 0)
+        except FileNotFoundError:
+            pass
+
+        snapshot_seq = self._seq
+        goals_by_id = {goal['id']: goal for goal in data['goals']}
+        self._deferred = []
+        for path in (self.old_journal_path, self.journal_path):
+            for record in self._read_journal(path):
+                if record["seq"] <= snapshot_seq:
+                    continue
+                if record["op"] in ("complete_goal", "action"):
+                    self._deferred.append(record)
+                else:
+                    apply_record(data, goals_by_id, record)
+                self._seq = record["seq"]
+                if path == self.journal_path:
+                    self._records += 1
+        data['goals'] = list(goals_by_id.values())
+        self.data = data
+        self._history_loaded = False
+
+        signature = file_signature(self.journal_path)
+        self._journal_inode, self._offset = (None, 0) if signature is None else signature[:2]
+        self._bytes = self._offset
+        if os.path.exists(self.old_journal_path):
+            # 上次压缩未完成，先把两份日志都合并进快照，避免下次轮换时覆盖旧日志
+            self._write_snapshot(self.load_history(), self._seq, self._snapshot_signature)
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_inode, self._offset = None, 0
+            self._records = 0
+            self._bytes = 0
+        return data
+
+    def _load_history(self):
+        self.data.update(read_history(read_json_rest(self._head, self._rest, self._file), self.history_limit))
+        for record in self._deferred:
+            apply_record(self.data, None, record)
+        self._head, self._rest, self._file, self._deferred = {}, None, None, []
+        self._drop_archived(self.data)
+
+    def _read_disk(self):
+        """
+        完整读取快照和日志，不修改任何状态。
+
+        返回值：
+        tuple: (数据, 最后一条日志记录的序号)。
+        """
+        try:
+            with open(self.snapshot_path, "r") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            raw = {}
+        data = read_data(raw, self.history_limit)
+        snapshot_seq = seq = raw.get('journal_seq', 0)
+        goals_by_id = {goal['id']: goal for goal in data['goals']}
+        for path in (self.old_journal_path, self.journal_path):
+            for record in self._read_journal(path):
+                if record["seq"] > snapshot_seq:
+                    apply_record(data, goals_by_id, record)
+                    seq = max(seq, record["seq"])
+        data['goals'] = list(goals_by_id.values())
+        drop_archived(data, self.archive.cutoff())
+        return data, seq
+
+    def _catch_up(self):
+        """
+        读取其它实例追加的日志记录，调用方持有文件锁。
+
+        说明：
+        快照或日志文件被替换说明其它实例压缩过日志，此时重新读取完整数据；
+        否则只从上次读到的位置读取新增的部分。
+        """
+        snapshot_signature = file_signature(self.snapshot_path)
+        journal_signature = file_signature(self.journal_path)
+        replaced = snapshot_signature != self._snapshot_signature or (
+            self._journal_inode is not None
+            and (journal_signature is None or journal_signature[0] != self._journal_inode))
+        if replaced:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._replaced, seq = self._read_disk()
+            self._foreign = []
+            self._seq = max(self._seq, seq)
+            self._mirror = goal_map(self._replaced['goals'])
+            self._snapshot_signature = snapshot_signature
+            self._journal_inode, self._offset = (None, 0) if journal_signature is None else journal_signature[:2]
+            self._records = 0
+            self._bytes = self._offset
+            return
+        if journal_signature is None or journal_signature[1] <= self._offset:
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        # 追加都在锁内完成，新增部分总是完整的行
+        for line in chunk.splitlines():
+            record = json.loads(line)
+            self._foreign.append(record)
+            apply_goal_record(self._mirror, record)
+            self._seq = max(self._seq, record["seq"])
+            self._records += 1
+        self._journal_inode = journal_signature[0]
+        self._offset += len(chunk)
+        self._bytes = self._offset
+
+    @staticmethod
+    def _read_journal(path):
+        """
+        逐条读取日志文件中的记录。
+
+        说明：
+        写入中途崩溃时最后一行可能不完整，遇到无法解析的行即停止读取。
+        """
+        try:
+            f = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                yield record
+
+    def add_goal(self, goal):
+        self._pending.append({"op": "add_goal", "goal": goal.to_json()})
+
+    def update_goal(self, goal):
+        self._pending.append({"op": "update_goal", "goal": goal.to_json()})
+
+    def delete_goal(self, goal):
+        self._pending.append({"op": "delete_goal", "id": goal['id']})
+
+    def complete_goal(self, goal):
+        self._pending.append({"op": "complete_goal", "goal": goal.to_json()})
+
+    def add_action(self, record):
+        super().add_action(record)
+        self._pending.append({"op": "action", "action": record.to_json()})
+
+    def commit(self):
+        """
+        追加本次操作产生的记录，达到阈值后在后台压缩为新快照。
+        """
+        if self._pending:
+            records, self._pending = self._pending, []
+            self.append(*records)
+        if self.needs_compaction():
+            self.compact(self.snapshot())
+
+    def append(self, *records):
+        """
+        向日志文件追加记录。
+
+        参数：
+        records (dict): 一条或多条日志记录。
+        """
+        with self._lock:
+            self._catch_up()
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            lines = []
+            for record in records:
+                self._seq += 1
+                record["seq"] = self._seq
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+                apply_goal_record(self._mirror, record)
+                apply_goal_record(self._base, record)
+            text = "".join(lines)
+            self._journal.write(text)
+            self._journal.flush()
+            signature = file_signature(self._journal.fileno())
+            self._journal_inode, self._offset = signature[:2]
+        size = len(text.encode("utf-8"))
+        self._records += len(records)
+        self._bytes += size
+        instrumentation.record_size("journal.append", size)
+
+    def watch_paths(self):
+        return [self.snapshot_path, self.journal_path, os.path.dirname(os.path.abspath(self.snapshot_path))]
+
+    def external_changed(self):
+        if self._foreign or self._replaced is not None:
+            return True
+        signature = file_signature(self.journal_path)
+        if file_signature(self.snapshot_path) != self._snapshot_signature:
+            return True
+        if signature is None:
+            return self._journal_inode is not None
+        return signature[0] != self._journal_inode or signature[1] != self._offset
+
+    def read_external(self):
+        memory = self.load_history()
+        with self._lock:
+            self._catch_up()
+            if not self._foreign and self._replaced is None:
+                return None
+            if self._replaced is not None:
+                # 压缩日志的可能是刚归档过的实例，先移除内存中已归档的部分
+                self._drop_archived(memory)
+                known = {goal['id'] for goal in memory['completed_goals']}
+                completed_goals = [goal for goal in self._replaced['completed_goals'] if goal['id'] not in known]
+                actions = diff_actions(memory['actions'], self._replaced['actions'])[0]
+            else:
+                extra = empty_data()
+                for record in self._foreign:
+                    if record["op"] in ("complete_goal", "action"):
+                        apply_record(extra, None, record)
+                completed_goals, actions = extra['completed_goals'], list(extra['actions'])
+            self._foreign, self._replaced = [], None
+            goals = [goal_from_values(goal_id, values) for goal_id, values in self._mirror.items()]
+            base, self._base = self._base, dict(self._mirror)
+
+        for goal in completed_goals:
+            memory['completed_goals'].append(goal)
+            add_monthly_completion(memory['monthly_completions'], goal)
+        for record in actions:
+            memory['actions'].append(record)
+        return {'goals': goals, 'base': base, 'completed_goals': completed_goals, 'actions': actions}
+
+    def needs_compaction(self):
+        """
+        判断日志是否已达到压缩阈值，正在进行的压缩未完成时返回 False。
+        """
+        if self._compaction is not None and self._compaction.is_alive():
+            return False
+        return self._records >= self.max_records or self._bytes >= self.max_bytes
+
+    def compact(self, data, background=True):
+        """
+        把当前数据写成新的快照，并丢弃已包含在快照中的日志。
+
+        参数：
+        data (dict): 当前数据的副本，写入期间调用方不能再修改它。
+        background (bool): 是否在后台线程中写入快照。
+        """
+        self.wait()
+        with self._lock:
+            self._catch_up()
+            if self._foreign or self._replaced is not None:
+                # 其它实例的修改尚未合并到 data 中，此时写快照会丢失它们
+                return
+            if os.path.exists(self.old_journal_path):
+                # 其它实例的压缩尚未完成，再次轮换会覆盖它还没写入快照的旧日志
+                return
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.old_journal_path)
+            self._journal_inode, self._offset = None, 0
+            signature = self._snapshot_signature
+        self._records = 0
+        self._bytes = 0
+
+        args = (data, self._seq, signature)
+        if background:
+            self._compaction = threading.Thread(target=self._write_snapshot, args=args, daemon=True)
+            self._compaction.start()
+        else:
+            self._write_snapshot(*args)
+
+    def _write_snapshot(self, data, seq, signature):
+        """
+        写入新快照并删除旧日志。
+
+        参数：
+        data (dict): 快照的数据。
+        seq (int): 快照包含的最后一条日志序号。
+        signature (tuple): 轮换日志时快照文件的 file_signature。
+
+        说明：
+        快照先写入本线程专用的临时文件，这段时间不持有文件锁，GUI 线程照常追加日志；
+        只有替换快照和删除旧日志时才持有锁。快照文件在此期间被替换过时（其它实例加载时合并了
+        尚未完成的压缩，它写入的快照已经包含旧日志），放弃本次写入的快照。
+        """
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        token = instrumentation.begin("journal.snapshot")
+        # journal_seq 写在最前面，加载时读完它和活动目标即可停止解析
+        size = write_json_file(tmp_path, dict(journal_seq=seq, **file_data(data)), separators=(',', ':'))
+        with self._lock:
+            if file_signature(self.snapshot_path) != signature:
+                os.remove(tmp_path)
+                instrumentation.end(token, discarded=True)
+                return
+            os.replace(tmp_path, self.snapshot_path)
+            self._snapshot_signature = file_signature(self.snapshot_path)
+            try:
+                os.remove(self.old_journal_path)
+            except FileNotFoundError:
+                pass
+        instrumentation.end(token, bytes=size)
+        instrumentation.record_size("journal.snapshot", size)
+
+    def wait(self):
+        """
+        等待正在进行的后台压缩完成。
+        """
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        """
+        关闭存储。
+
+        说明：
+        同步压缩为快照，下次启动时无需重放日志，已归档的历史数据不再写入快照。
+        """
+        if self._pending:
+            records, self._pending = self._pending, []
+            self.append(*records)
+        self._archive_expired()
+        self.compact(self.snapshot(), background=False)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def release(self):
+        self.wait()
+        if self._file is not None:
+            self._file.close()
+            self._head, self._rest, self._file = {}, None, None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+SQLITE_SCHEMA_VERSION = 2
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS goals (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    deadline TEXT NOT NULL DEFAULT '',
+    target_times INTEGER NOT NULL,
+    completed_times INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_goals_deadline ON goals(deadline);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_goals_uid ON goals(uid);
+
+CREATE TABLE IF NOT EXISTS completed_goals (
+    id INTEGER PRIMARY KEY,
+    uid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    deadline TEXT NOT NULL DEFAULT '',
+    target_times INTEGER NOT NULL,
+    completed_times INTEGER NOT NULL,
+    completion_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_completed_goals_completion_date ON completed_goals(completion_date);
+
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY,
+    time INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    goal_id TEXT,
+    name TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_time ON actions(time);
+"""
+
+
+def action_row(record):
+    """
+    把 ActionRecord 转换为 actions 表中的一行（不含主键）。
+    """
+    old = None if record.old is None else json.dumps(record.old, ensure_ascii=False)
+    new = None if record.new is None else json.dumps(record.new, ensure_ascii=False)
+    return record.time, int(record.kind), record.goal_id, record.name, old, new
+
+
+def action_from_row(row):
+    """
+    把 actions 表中的一行（不含主键）转换为 ActionRecord。
+    """
+    old = None if row[4] is None else json.loads(row[4])
+    new = None if row[5] is None else json.loads(row[5])
+    return ActionRecord(row[0], ActionKind(row[1]), row[2], row[3], old, new)
+
+
+class SqliteStorage(StorageBackend):
+    """
+    基于 SQLite 的存储方式。
+
+    说明：
+    活动目标、已完成目标和操作记录分别保存在三张带索引的表中，数据库使用 WAL 模式。
+    每次修改只执行对应的单行 INSERT / UPDATE / DELETE，计数变化时只更新一行；
+    操作记录不读入内存，查看时按需分页查询，筛选条件直接转换为 SQL 条件。
+    设置 history_limit 后，启动时删除最新的 history_limit 条以外的操作记录。
+    启动时只读取活动目标，已完成目标在 load_history 中通过另一个只读连接读取，可以在后台线程中进行。
+
+    目标的 id 保存在 uid 列中，修改和删除目标时按 uid 上的唯一索引定位到单行。
+
+    多个程序实例之间由 SQLite 自身的锁保证写入互斥。其它连接提交修改后 PRAGMA data_version
+    会变化，此时重新读取活动目标，已完成目标和操作记录只读取主键大于上次读到位置的新行。
+
+    归档时把早于分界的行写入归档后直接从表中删除，按月汇总的完成数加上归档中的部分。
+    """
+
+    def __init__(self, path="goals.db", import_from=None, history_limit=None, archive_after=None):
+        """
+        参数：
+        path (str): 数据库文件路径。
+        import_from (str): 若数据库是新建的且该 JSON 文件存在，则先从中导入数据。
+        history_limit (int): 保留的最大操作记录数，为 None 时不限制。
+        archive_after (int): 关闭时把超过该天数的历史数据移入归档，为 None 时不归档。
+        """
+        self.path = path
+        self.history_limit = history_limit
+        self.archive_after = archive_after
+        self.archive = archive.HistoryArchive(f"{path}.archive")
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self.conn.executescript(SQLITE_SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+        super().__init__()
+        self._data_version = None
+        self._base = {}  # 上次同步时的 goal_map，加上本实例之后提交的修改
+        self._pending_goals = []  # 尚未提交的活动目标修改，提交时计入 _base
+        self._completed_mark = 0  # 已读到的 completed_goals 最大主键
+        self._action_mark = 0  # 已读到的 actions 最大主键
+        self._own_rows = set()  # 上次同步之后本实例插入的 (表名, 主键)
+        if is_new and import_from and os.path.exists(import_from):
+            self.import_json(import_from)
+
+    def _migrate(self):
+        """
+        升级旧版本的数据库。
+
+        说明：
+        版本 1 之前的目标表没有 uid 列，升级时为已有的目标生成 id；
+        版本 0 的 actions 表只保存操作记录的文字，升级时逐条解析为结构化记录。
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SQLITE_SCHEMA_VERSION:
+            return
+        with self.conn:
+            for table in ("goals", "completed_goals"):
+                columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+                if columns and 'uid' not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+                    self.conn.execute(f"UPDATE {table} SET uid = lower(hex(randomblob(16)))")
+
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(actions)")]
+        if 'text' not in columns:
+            return
+        with self.conn:
+            texts = [row[0] for row in self.conn.execute("SELECT text FROM actions ORDER BY id")]
+            self.conn.execute("DROP TABLE actions")
+            self.conn.executescript(SQLITE_SCHEMA)
+            self.conn.executemany(
+                "INSERT INTO actions (time, kind, goal_id, name, old, new) VALUES (?, ?, ?, ?, ?, ?)",
+                (action_row(ActionRecord.parse(text)) for text in texts))
+
+    def import_json(self, json_path):
+        """
+        把 goals.json 中的数据一次性导入数据库。
+
+        参数：
+        json_path (str): JSON 数据文件路径。
+
+        返回值：
+        tuple: 导入的 (目标数, 已完成目标数, 操作记录数)，不包括已经存在而跳过的部分。
+
+        说明：
+        在一个事务中批量插入，失败时不会留下导入了一半的数据。
+        操作记录按从旧到新的顺序插入，使主键随时间递增；旧版文字记录在导入时解析迁移。
+        id 已经存在的目标和已完成目标跳过；操作记录没有 id，与已有记录完全相同的跳过，
+        同一份文件重复导入时不会产生重复的数据。
+        """
+        with open(json_path, "r") as f:
+            data = read_data(json.load(f))
+
+        existing_goals = {row[0] for row in self.conn.execute("SELECT uid FROM goals")}
+        goals = []
+        for g in data['goals']:
+            if g['id'] not in existing_goals:
+                existing_goals.add(g['id'])
+                goals.append(g)
+        existing_completed = {row[0] for row in self.conn.execute("SELECT uid FROM completed_goals")}
+        completed_goals = []
+        for g in data['completed_goals']:
+            if g['id'] not in existing_completed:
+                existing_completed.add(g['id'])
+                completed_goals.append(g)
+        # 同一秒内的多次点击会产生相同的记录，按条数而不是按内容去重
+        existing_actions = Counter(self.conn.execute("SELECT time, kind, goal_id, name, old, new FROM actions"))
+        actions = []
+        for row in map(action_row, data['actions']):
+            if existing_actions[row] > 0:
+                existing_actions[row] -= 1
+            else:
+                actions.append(row)
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO goals (uid, name, deadline, target_times, completed_times) VALUES (?, ?, ?, ?, ?)",
+                ((g['id'], g['name'], g['deadline'], g['target_times'], g['completed_times']) for g in goals))
+            self.conn.executemany(
+                "INSERT INTO completed_goals (uid, name, deadline, target_times, completed_times, completion_date) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                ((g['id'], g['name'], g['deadline'], g['target_times'], g['completed_times'],
+                  g.get('completion_date')) for g in completed_goals))
+            self.conn.executemany(
+                "INSERT INTO actions (time, kind, goal_id, name, old, new) VALUES (?, ?, ?, ?, ?, ?)", actions)
+        return len(goals), len(completed_goals), len(actions)
+
+    def load(self):
+        goals = []
+        for row in self.conn.execute(
+                "SELECT uid, name, deadline, target_times, completed_times FROM goals ORDER BY id"):
+            goals.append(GoalRecord(*row))
+
+        if self.history_limit is not None:
+            self._trim_actions()
+        self._delete_archived()
+
+        self.data = dict(empty_data(), goals=goals)
+        self._history_loaded = False
+        self._base = goal_map(goals)
+        self._completed_mark = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM completed_goals").fetchone()[0]
+        self._action_mark = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM actions").fetchone()[0]
+        self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return self.data
+
+    def _load_history(self):
+        # sqlite3 连接不能跨线程使用，后台加载时使用单独的连接；WAL 模式下读取不会阻塞写入
+        conn = sqlite3.connect(self.path)
+        try:
+            completed_goals = []
+            for row in conn.execute(
+                    "SELECT uid, name, deadline, target_times, completed_times, completion_date "
+                    "FROM completed_goals ORDER BY id"):
+                completed_goals.append(GoalRecord(*row))
+
+            # 按月汇总的完成数直接由索引上的 GROUP BY 得到，再加上已归档的部分
+            monthly_completions = self.archive.monthly_completions()
+            for month, count in conn.execute(
+                    "SELECT substr(completion_date, 1, 7), COUNT(*) FROM completed_goals "
+                    "WHERE completion_date IS NOT NULL AND completion_date != '' GROUP BY 1"):
+                monthly_completions[month] = monthly_completions.get(month, 0) + count
+        finally:
+            conn.close()
+        self.data.update(completed_goals=completed_goals, monthly_completions=monthly_completions)
+
+    def _trim_actions(self):
+        """
+        删除超出 history_limit 的旧操作记录。
+        """
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM actions WHERE id <= (SELECT id FROM actions ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.history_limit,))
+        if cursor.rowcount > 0:
+            self.history_generation += 1
+
+    def _delete_archived(self):
+        """
+        删除早于归档分界的行，它们已经在归档中。
+        """
+        actions_before, completed_before = self.archive.cutoff()
+        deleted = 0
+        with self.conn:
+            if actions_before is not None:
+                deleted += self.conn.execute("DELETE FROM actions WHERE time < ?", (actions_before,)).rowcount
+            if completed_before is not None:
+                deleted += self.conn.execute(
+                    "DELETE FROM completed_goals WHERE completion_date != '' AND completion_date < ?",
+                    (completed_before,)).rowcount
+        if deleted > 0:
+            self.history_generation += 1
+
+    def archive_history(self, days=None):
+        """
+        按时间和完成日期上的索引查出要归档的行，写入归档后删除，操作记录不经过内存。
+        """
+        days = self.archive_after if days is None else days
+        if days is None:
+            return 0, 0
+        actions_before, completed_before = archive_cutoff(days)
+        self.conn.commit()
+        actions = [action_from_row(row) for row in self.conn.execute(
+            "SELECT time, kind, goal_id, name, old, new FROM actions WHERE time < ? ORDER BY id",
+            (actions_before,))]
+        completed_goals = []
+        for row in self.conn.execute(
+                "SELECT uid, name, deadline, target_times, completed_times, completion_date FROM completed_goals "
+                "WHERE completion_date != '' AND completion_date < ? ORDER BY id", (completed_before,)):
+            completed_goals.append(GoalRecord(*row))
+        if not actions and not completed_goals:
+            return 0, 0
+        self.archive.add(actions, completed_goals, actions_before, completed_before)
+        self._delete_archived()
+        if self._history_loaded:
+            drop_archived(self.data, self.archive.cutoff())
+        self.history_generation += 1
+        return len(actions), len(completed_goals)
+
+    def add_goal(self, goal):
+        self.conn.execute(
+            "INSERT INTO goals (uid, name, deadline, target_times, completed_times) VALUES (?, ?, ?, ?, ?)",
+            (goal['id'], goal['name'], goal['deadline'], goal['target_times'], goal['completed_times']))
+        self._pending_goals.append((goal['id'], goal_values(goal)))
+
+    def update_goal(self, goal):
+        self.conn.execute(
+            "UPDATE goals SET name = ?, deadline = ?, target_times = ?, completed_times = ? WHERE uid = ?",
+            (goal['name'], goal['deadline'], goal['target_times'], goal['completed_times'], goal['id']))
+        self._pending_goals.append((goal['id'], goal_values(goal)))
+
+    def delete_goal(self, goal):
+        self.conn.execute("DELETE FROM goals WHERE uid = ?", (goal['id'],))
+        self._pending_goals.append((goal['id'], None))
+
+    def complete_goal(self, goal):
+        cursor = self.conn.execute(
+            "INSERT INTO completed_goals (uid, name, deadline, target_times, completed_times, completion_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (goal['id'], goal['name'], goal['deadline'], goal['target_times'], goal['completed_times'],
+             goal.get('completion_date')))
+        self._own_rows.add(("completed_goals", cursor.lastrowid))
+
+    def add_action(self, record):
+        cursor = self.conn.execute(
+            "INSERT INTO actions (time, kind, goal_id, name, old, new) VALUES (?, ?, ?, ?, ?, ?)",
+            action_row(record))
+        self._own_rows.add(("actions", cursor.lastrowid))
+
+    @instrumentation.timed("sqlite.commit")
+    def commit(self):
+        self.conn.commit()
+        for goal_id, values in self._pending_goals:
+            if values is None:
+                self._base.pop(goal_id, None)
+            else:
+                self._base[goal_id] = values
+        self._pending_goals = []
+
+    def watch_paths(self):
+        # WAL 模式下其它连接的提交先写入 -wal 文件
+        return [self.path, f"{self.path}-wal"]
+
+    def external_changed(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+
+    def read_external(self):
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return None
+        memory = self.load_history()
+        self._data_version = version
+        goals = [GoalRecord(*row)
+                 for row in self.conn.execute(
+                     "SELECT uid, name, deadline, target_times, completed_times FROM goals ORDER BY id")]
+
+        completed_goals = []
+        for row in self.conn.execute(
+                "SELECT id, uid, name, deadline, target_times, completed_times, completion_date "
+                "FROM completed_goals WHERE id > ? ORDER BY id", (self._completed_mark,)):
+            self._completed_mark = row[0]
+            if ("completed_goals", row[0]) in self._own_rows:
+                continue
+            goal = GoalRecord(*row[1:])
+            completed_goals.append(goal)
+            memory['completed_goals'].append(goal)
+            add_monthly_completion(memory['monthly_completions'], goal)
+
+        actions = []
+        for row in self.conn.execute("SELECT id, time, kind, goal_id, name, old, new FROM actions "
+                                     "WHERE id > ? ORDER BY id", (self._action_mark,)):
+            self._action_mark = row[0]
+            if ("actions", row[0]) not in self._own_rows:
+                actions.append(action_from_row(row[1:]))
+        self._own_rows = set()
+
+        base, self._base = self._base, goal_map(goals)
+        return {'goals': goals, 'base': base, 'completed_goals': completed_goals, 'actions': actions}
+
+    def close(self):
+        self.conn.commit()
+        if self.archive_after is not None:
+            self.archive_history()
+        self.conn.close()
+
+    def release(self):
+        self.conn.close()
+
+    def count_actions(self):
+        return self.conn.execute("SELECT COUNT(*) FROM actions").fetchone()[0]
+
+    def iter_actions(self):
+        """
+        逐行读取游标，不把全部记录读入内存。
+        """
+        for row in self.conn.execute("SELECT time, kind, goal_id, name, old, new FROM actions ORDER BY id"):
+            yield action_from_row(row)
+
+    def actions_since(self, mark=None):
+        """
+        位置为已读到的最大主键，记录通过单独的只读连接逐行读取，可以在其它线程中使用。
+        """
+        last = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM actions").fetchone()[0]
+        return self._read_actions(mark or 0, last), last
+
+    def _read_actions(self, after, last):
+        # sqlite3 连接不能跨线程使用，与 _load_history 一样使用单独的连接
+        conn = sqlite3.connect(self.path)
+        try:
+            for row in conn.execute("SELECT time, kind, goal_id, name, old, new FROM actions "
+                                    "WHERE id > ? AND id <= ? ORDER BY id", (after, last)):
+                yield action_from_row(row)
+        finally:
+            conn.close()
+
+    def query_actions(self, action_filter=None, cursor=None, limit=100):
+        """
+        以主键作为游标分页查询，每页只读取需要的行。
+        """
+        conditions = []
+        params = []
+        if cursor is not None:
+            conditions.append("id <= ?")
+            params.append(cursor)
+        if action_filter is not None:
+            if action_filter.start is not None:
+                conditions.append("time >= ?")
+                params.append(action_filter.start)
+            if action_filter.end is not None:
+                conditions.append("time < ?")
+                params.append(action_filter.end)
+            if action_filter.kinds is not None:
+                conditions.append("kind IN ({})".format(", ".join("?" * len(action_filter.kinds))))
+                params.extend(int(kind) for kind in action_filter.kinds)
+            if action_filter.name:
+                conditions.append("instr(name, ?) > 0")
+                params.append(action_filter.name)
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = self.conn.execute(
+            f"SELECT id, time, kind, goal_id, name, old, new FROM actions {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]).fetchall()
+        next_cursor = rows[limit][0] if len(rows) > limit else None
+        return [action_from_row(row[1:]) for row in rows[:limit]], next_cursor
+
+
+def _read_head(path, keys):
+    """
+    只读取 JSON 文件开头的 keys，文件不存在时返回空 dict。
+    """
+    try:
+        with open(path, "r") as f:
+            return read_json_head(f, keys)[0]
+    except FileNotFoundError:
+        return {}
+
+
+def read_active_goals(kind, path, import_from=None):
+    """
+    只读取数据文件中的活动目标，不创建存储后端。
+
+    参数：
+    kind (str): "json"、"journal" 或 "sqlite"。
+    path (str): 数据文件路径。
+    import_from (str): 与 create_storage 相同，SQLite 数据库不存在时改为读取该 JSON 文件中的活动目标。
+
+    返回值：
+    list: 活动目标 GoalRecord 列表。
+
+    说明：
+    不启动写入线程，不加文件锁，也不创建或修改任何文件。JSON 文件只解析开头的活动目标；
+    追加日志方式在快照的活动目标上重放两份日志中与活动目标有关的记录；SQLite 只执行查询，
+    数据库不存在时不创建，也不导入。
+    """
+    if kind == "json":
+        return read_goals(_read_head(path, ('goals',)))
+    if kind == "journal":
+        head = _read_head(path, ('journal_seq', 'goals'))
+        snapshot_seq = head.get('journal_seq', 0)
+        goals_by_id = {goal['id']: goal for goal in read_goals(head)}
+        journal_path = f"{path}.journal"
+        for journal in (f"{journal_path}.old", journal_path):
+            for record in JournalStorage._read_journal(journal):
+                if record["seq"] > snapshot_seq and record["op"] not in ("complete_goal", "action"):
+                    apply_record(None, goals_by_id, record)
+        return list(goals_by_id.values())
+    if kind == "sqlite":
+        if not os.path.exists(path):
+            if import_from and os.path.exists(import_from):
+                return read_active_goals("json", import_from)
+            return []
+        # mode=rw 不会新建数据库，关闭时照常清理 WAL 文件
+        conn = sqlite3.connect(f"{pathlib.Path(path).absolute().as_uri()}?mode=rw", uri=True)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(goals)")}
+            if not columns:
+                return []
+            # 尚未升级的旧版数据库没有 uid 列
+            uid = "uid" if "uid" in columns else "''"
+            return [GoalRecord(*row) for row in conn.execute(
+                f"SELECT {uid}, name, deadline, target_times, completed_times FROM goals ORDER BY id")]
+        finally:
+            conn.close()
+    raise ValueError(f"未知的存储方式: {kind}")
+
+
+def create_storage(kind="json", path=None, write_delay=0.5, history_limit=None, archive_after=None,
+                   import_from="goals.json"):
+    """
+    根据名称创建存储后端。
+
+    参数：
+    kind (str): "json"、"journal" 或 "sqlite"。
+    path (str): 数据文件路径，为 None 时使用默认文件名。
+    write_delay (float): JSON 文件合并写入的时间窗口，单位为秒，为 0 时每次修改都同步写入。
+    history_limit (int): 保留的最大操作记录数，为 None 时不限制。
+    archive_after (int): 关闭时把超过该天数的操作记录和已完成目标移入归档，为 None 时不归档。
+    import_from (str): 首次使用 SQLite 时从该 JSON 文件导入数据，为 None 时不导入。
+
+    说明：
+    首次使用 SQLite 时，若当前目录下存在 goals.json，会自动把其中的数据导入数据库。
+    """
+    if kind == "json":
+        return JsonStorage(path or "goals.json", write_delay, history_limit, archive_after)
+    if kind == "journal":
+        return JournalStorage(path or "goals.json", history_limit=history_limit, archive_after=archive_after)
+    if kind == "sqlite":
+        return SqliteStorage(path or "goals.db", import_from=import_from, history_limit=history_limit,
+                             archive_after=archive_after)
+    raise ValueError(f"未知的存储方式: {kind}")
@@ -0,0 +1,514 @@
+import asyncio
+import concurrent.futures
+import hmac
+import json
+import secrets
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import instrumentation
+import transfer
+from goal_store import GoalError, GoalStoreListener
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 保留的变化条数，更早的版本只能重新获取全部数据
+CHANGES_LIMIT = 10000
+PAGE_LIMIT = 500
+MAX_BODY = 64 * 1024
+MAX_WAIT = 60
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+class ChangeFeed(GoalStoreListener):
+    """
+    监听 GoalStore，为每次变化分配递增的版本号并保留最近的变化。
+
+    说明：
+    变化保存在列表中，版本号 base + i + 1 的变化位于第 i 项，按版本号取变化只需切片。
+    超过 limit 条时丢弃较早的一半，客户端的版本早于保留的范围时需要重新获取全部数据。
+    目标列表被整个替换（重新加载）时同样清空变化。
+
+    每项变化是一个 dict：type 为 "goal" 时 goal 是变化后的活动目标，"goal_removed" 时 id 是移除的目标，
+    "completed" 时 goal 是新的已完成目标，"action" 时 action 是新的操作记录。
+    """
+
+    def __init__(self, store, limit=CHANGES_LIMIT, on_change=None):
+        """
+        参数：
+        store (GoalStore): 目标数据，会注册为它的监听者。
+        limit (int): 至少保留的变化条数。
+        on_change (callable): 每次变化后调用，不带参数，在修改 GoalStore 的线程中调用。
+        """
+        self.store = store
+        self.limit = limit
+        self.on_change = on_change
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self._base = 0
+        self._changes = []
+        self._removing = None
+        store.add_listener(self)
+
+    def etag(self):
+        return f'"{self.epoch}-{self.version}"'
+
+    def since(self, version):
+        """
+        返回版本 version 之后的变化。
+
+        返回值：
+        list: 按版本号排列的变化，version 不在保留的范围内时返回 None。
+        """
+        if not self._base <= version <= self.version:
+            return None
+        return self._changes[version - self._base:]
+
+    def _append(self, change):
+        self.version += 1
+        change['version'] = self.version
+        self._changes.append(change)
+        if len(self._changes) > 2 * self.limit:
+            dropped = len(self._changes) - self.limit
+            del self._changes[:dropped]
+            self._base += dropped
+        if self.on_change is not None:
+            self.on_change()
+
+    def goal_inserted(self, row):
+        self._append({'type': "goal", 'goal': self.store.goals[row].to_json()})
+
+    def goal_removing(self, row):
+        self._removing = self.store.goals[row]['id']
+
+    def goal_removed(self, row):
+        self._append({'type': "goal_removed", 'id': self._removing})
+
+    def goal_changed(self, row):
+        self._append({'type': "goal", 'goal': self.store.goals[row].to_json()})
+
+    def goals_reset(self):
+        self.version += 1
+        self._base = self.version
+        self._changes = []
+        if self.on_change is not None:
+            self.on_change()
+
+    def action_recorded(self, record):
+        self._append({'type': "action", 'action': next(transfer.action_rows([record]))})
+
+    def goal_completed(self, goal):
+        self._append({'type': "completed", 'goal': goal.to_json()})
+
+
+class HttpError(Exception):
+    """
+    请求不合法，status 为响应的状态码，消息返回给客户端。
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """
+    解析后的 HTTP 请求。
+    """
+    __slots__ = ('method', 'path', 'query', 'headers', 'body')
+
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = [part for part in url.path.split("/") if part]
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        return self.headers.get("connection", "").lower() != "close"
+
+    def int_param(self, name, default, minimum=0, maximum=None):
+        value = self.query.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"参数 {name} 应为整数") from None
+        if value < minimum:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"参数 {name} 不能小于 {minimum}")
+        return value if maximum is None else min(value, maximum)
+
+    def json(self):
+        if not self.headers.get("content-type", "").startswith("application/json"):
+            # 浏览器中的网页不经预检就不能发送这种类型，防止网页冒充本机的客户端修改数据
+            raise HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "请求体应为 application/json")
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "无法解析的 JSON") from None
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "请求体应为 JSON 对象")
+        return data
+
+
+def call_now(function):
+    """
+    在当前线程中立即执行 function，返回已完成的 Future。服务与 GoalStore 在同一线程中运行时使用。
+    """
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(function())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class SyncServer:
+    """
+    本地 HTTP/JSON 同步服务，让手机和脚本与桌面程序使用同一份目标数据。
+
+    说明：
+    服务只用标准库的 asyncio 实现，默认只监听本机。所有修改都交给 GoalStore，与界面上的操作走同样的路径，
+    打开的窗口通过监听 GoalStore 只更新变化的行。每次变化都有一个递增的版本号，客户端用 ETag 做条件请求，
+    用 /changes?since=N 只取版本 N 之后的变化，不需要重新下载全部数据。
+
+    接口：
+    GET    /goals                      活动目标
+    GET    /goals/<id>                 一个活动目标
+    GET    /completed?cursor=&limit=   已完成目标，按完成的先后从新到旧分页
+    GET    /actions?cursor=&limit=     操作记录，从新到旧分页，不包括已归档的记录
+    GET    /changes?since=N&epoch=&wait=  版本 N 之后的变化，wait 秒内没有变化时等待
+    POST   /goals                      添加目标，{"name", "deadline", "target_times"}
+    PATCH  /goals/<id>                 修改目标，未给出的字段保持不变
+    DELETE /goals/<id>                 删除目标
+    POST   /goals/<id>/complete        增加完成次数，{"times": 1}
+    POST   /goals/<id>/undo            撤销一次完成
+
+    每个响应都带有 epoch 和 version。epoch 在每次启动服务时重新生成，版本号只在同一个 epoch 内有意义。
+
+    GoalStore 不是线程安全的，服务对它的每次读写都通过 dispatch 交给拥有它的线程执行：
+    界面程序中由 GUI 线程执行，服务本身在后台线程中运行事件循环；命令行的 serve 命令在同一线程中运行，
+    直接调用即可。
+    """
+
+    def __init__(self, store, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, dispatch=call_now):
+        """
+        参数：
+        store (GoalStore): 目标数据。
+        host (str): 监听的地址，默认只监听本机。
+        port (int): 监听的端口，为 0 时由系统分配。
+        token (str): 访问令牌，设置后每个请求都要带有 "Authorization: Bearer <token>"。
+        dispatch (callable): 接收一个无参函数，在拥有 store 的线程中执行它，返回 concurrent.futures.Future。
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.token = token
+        self.dispatch = dispatch
+        self.feed = ChangeFeed(store, on_change=self._notify)
+        self.requests = 0
+        self._loop = None
+        self._server = None
+        self._changed = None
+        self._stopped = None
+        self._thread = None
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # 唤醒全部等待变化的长轮询请求，之后的请求等待新的事件
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _call(self, function):
+        return await asyncio.wrap_future(self.dispatch(function))
+
+    async def serve(self, ready=None, poll_external=None):
+        """
+        运行服务直到 stop。
+
+        参数：
+        ready (callable): 开始监听后调用，不带参数。
+        poll_external (float): 每隔多少秒合并一次其它程序对数据文件的修改，为 None 时不检查，
+        界面程序由文件监视负责合并。
+        """
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_BODY)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready()
+        try:
+            if poll_external is None:
+                await self._stopped.wait()
+            else:
+                while not self._stopped.is_set():
+                    try:
+                        await asyncio.wait_for(self._stopped.wait(), poll_external)
+                    except asyncio.TimeoutError:
+                        await self._call(self._sync_external)
+        finally:
+            # 不等待已有的连接关闭，事件循环结束时会取消它们
+            self._server.close()
+
+    def _sync_external(self):
+        if self.store.storage.external_changed():
+            self.store.sync_external()
+
+    def start(self):
+        """
+        在后台线程中启动服务，开始监听后才返回，端口被占用等错误在这里抛出 OSError。
+        """
+        started = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.serve(started.set))
+            except OSError as e:
+                errors.append(e)
+                started.set()
+
+        self._thread = threading.Thread(target=run, name="SyncServer", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread.join()
+            raise errors[0]
+
+    def stop(self):
+        """
+        停止服务，由 start 启动时等待后台线程结束，并不再监听 GoalStore。应在拥有 GoalStore 的线程中调用。
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass  # 事件循环已经结束
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.store.remove_listener(self.feed)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    writer.write(self._encode(e.status, {'error': str(e)}, close=True))
+                    break
+                if request is None:
+                    break
+                status, body, headers = await self._respond(request)
+                writer.write(self._encode(status, body, headers, close=not request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        读取一个请求，连接已关闭时返回 None。
+        """
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            parts = line.decode("latin-1").split()
+            if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+                raise HttpError(HTTPStatus.BAD_REQUEST, "无法解析的请求")
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过长") from None
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length 不合法") from None
+        if not 0 <= length <= MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过长")
+        body = await reader.readexactly(length) if length else b""
+        if parts[2] == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+            headers["connection"] = "close"
+        return Request(parts[0].upper(), parts[1], headers, body)
+
+    @staticmethod
+    def _encode(status, body, headers=None, close=False):
+        status = HTTPStatus(status)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        content = b"" if body is None else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        if body is not None:
+            lines.append("Content-Type: application/json; charset=utf-8")
+        lines.append(f"Content-Length: {len(content)}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if close:
+            lines.append("Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + content
+
+    def _check_access(self, request):
+        if self.host in LOOPBACK_HOSTS:
+            # 只监听本机时拒绝其它主机名，防止网页通过 DNS 重绑定访问服务
+            host = request.headers.get("host", "")
+            host = host[1:].partition("]")[0] if host.startswith("[") else host.rpartition(":")[0] or host
+            if host not in LOOPBACK_HOSTS:
+                raise HttpError(HTTPStatus.FORBIDDEN, "只接受发往本机的请求")
+        if self.token is not None:
+            authorization = request.headers.get("authorization", "")
+            if not hmac.compare_digest(authorization.encode(), f"Bearer {self.token}".encode()):
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "访问令牌不正确")
+
+    async def _respond(self, request):
+        """
+        处理一个请求。
+
+        返回值：
+        tuple: (状态码, 响应的 JSON 数据, 额外的响应头)，JSON 数据为 None 时没有响应体。
+        """
+        self.requests += 1
+        token = instrumentation.begin("sync.request")
+        try:
+            self._check_access(request)
+            if request.path == ["changes"] and request.method == "GET":
+                status, body = await self._changes(request)
+            else:
+                status, body = await self._call(lambda: self._route(request))
+        except HttpError as e:
+            status, body = e.status, {'error': str(e)}
+        except GoalError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except Exception as e:
+            status, body = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(e).__name__}: {e}"}
+        instrumentation.end(token, method=request.method, status=int(status))
+        headers = {}
+        if body is not None and 'version' in body:
+            headers["ETag"] = f'"{body["epoch"]}-{body["version"]}"'
+        elif status == HTTPStatus.NOT_MODIFIED:
+            headers["ETag"] = request.headers["if-none-match"]
+        return status, body, headers
+
+    def _versioned(self, **data):
+        """
+        附上 epoch 和版本号。响应在服务的线程中编码，活动目标之后还会被修改，这里传入的应是副本。
+        """
+        data['epoch'] = self.feed.epoch
+        data['version'] = self.feed.version
+        return data
+
+    def _goal(self, goal_id):
+        goal = self.store.get(goal_id)
+        if goal is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"找不到目标：{goal_id}")
+        return goal
+
+    def _write_result(self, status, goal, **data):
+        return status, self._versioned(goal=goal.to_json(), **data)
+
+    def _route(self, request):
+        """
+        在拥有 GoalStore 的线程中处理除 /changes 以外的请求。
+        """
+        method, path = request.method, request.path
+        if method == "GET":
+            if request.headers.get("if-none-match") == self.feed.etag():
+                return HTTPStatus.NOT_MODIFIED, None
+            if path == ["goals"]:
+                return HTTPStatus.OK, self._versioned(goals=[goal.to_json() for goal in self.store.goals])
+            if len(path) == 2 and path[0] == "goals":
+                return HTTPStatus.OK, self._versioned(goal=self._goal(path[1]).to_json())
+            if path == ["completed"]:
+                return HTTPStatus.OK, self._completed(request)
+            if path == ["actions"]:
+                return HTTPStatus.OK, self._actions(request)
+            raise HttpError(HTTPStatus.NOT_FOUND, "没有这个接口")
+
+        if not path or path[0] != "goals" or len(path) > 3:
+            raise HttpError(HTTPStatus.NOT_FOUND, "没有这个接口")
+        if_match = request.headers.get("if-match")
+        if if_match is not None and if_match not in ("*", self.feed.etag()):
+            raise HttpError(HTTPStatus.PRECONDITION_FAILED, "数据已被修改，请先获取最新的版本")
+        if len(path) == 1 and method == "POST":
+            data = request.json()
+            goal = self.store.add_goal(str(data.get('name', "")), str(data.get('deadline') or ""),
+                                       data.get('target_times', ""))
+            return self._write_result(HTTPStatus.CREATED, goal)
+        if len(path) == 2 and method == "PATCH":
+            data = request.json()
+            goal = self._goal(path[1])
+            goal = self.store.edit_goal(goal['id'], str(data.get('name', goal['name'])),
+                                        str(data.get('deadline', goal['deadline']) or ""),
+                                        data.get('target_times', goal['target_times']))
+            return self._write_result(HTTPStatus.OK, goal)
+        if len(path) == 2 and method == "DELETE":
+            goal = self.store.delete_goal(self._goal(path[1])['id'])
+            return self._write_result(HTTPStatus.OK, goal)
+        if len(path) == 3 and method == "POST" and path[2] == "complete":
+            times = request.json().get('times', 1)
+            if not isinstance(times, int) or isinstance(times, bool) or times < 1:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "times 应为正整数")
+            goal = self.store.increment(self._goal(path[1])['id'], times)
+            return self._write_result(HTTPStatus.OK, goal, completed="completion_date" in goal)
+        if len(path) == 3 and method == "POST" and path[2] == "undo":
+            goal = self._goal(path[1])
+            reduced = self.store.decrement(goal['id'])
+            return self._write_result(HTTPStatus.OK, goal, reduced=reduced)
+        raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, "不支持的请求方法")
+
+    def _completed(self, request):
+        """
+        已完成目标按完成的先后排列，只在末尾追加，以列表中的位置作为游标，新完成的目标不影响翻页。
+        """
+        completed_goals = self.store.completed_goals
+        cursor = request.int_param("cursor", len(completed_goals))
+        cursor = min(cursor, len(completed_goals))
+        start = max(cursor - request.int_param("limit", 100, 1, PAGE_LIMIT), 0)
+        goals = [goal.to_json() for goal in reversed(completed_goals[start:cursor])]
+        return self._versioned(goals=goals, total=len(completed_goals), cursor=start or None)
+
+    def _actions(self, request):
+        cursor = request.int_param("cursor", None)
+        records, cursor = self.store.storage.query_actions(None, cursor,
+                                                           request.int_param("limit", 100, 1, PAGE_LIMIT))
+        return self._versioned(actions=list(transfer.action_rows(records)), cursor=cursor)
+
+    async def _changes(self, request):
+        """
+        返回 since 之后的变化。没有变化且给出了 wait 时等待新的变化，最多等待 wait 秒。
+        since 不在保留的范围内或 epoch 与本次启动的不同时返回 reset，客户端应重新获取全部数据。
+        """
+        since = request.int_param("since", 0)
+        wait = request.int_param("wait", 0, maximum=MAX_WAIT)
+        epoch = request.query.get("epoch")
+        deadline = self._loop.time() + wait
+        while True:
+            # 先取得事件再读取变化，两者之间发生的变化也能唤醒等待
+            changed = self._changed
+            changes, body = await self._call(lambda: (self.feed.since(since), self._versioned()))
+            if epoch not in (None, body['epoch']) or changes is None:
+                body['reset'] = True
+                return HTTPStatus.OK, body
+            remaining = deadline - self._loop.time()
+            if changes or remaining <= 0:
+                body['changes'] = changes
+                return HTTPStatus.OK, body
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,112 @@
+"""
+ActionLog 的测试：旧版文字记录的迁移、按序号分页、maxlen 截断和视图在之后的修改中保持不变。
+"""
+import pytest
+
+from action_log import ActionFilter, ActionKind, ActionLog, ActionRecord, load_action_log
+
+
+def records(count, offset=0):
+    kinds = list(ActionKind)[1:]
+    return [ActionRecord(1700000000 + i, kinds[i % len(kinds)], f"g{i % 7}", f"目标{i % 7}")
+            for i in range(offset, offset + count)]
+
+
+def times(items):
+    return [record.time for record in items]
+
+
+def all_pages(log, action_filter=None, limit=7):
+    pages, cursor = [], None
+    while True:
+        page, cursor = log.query(action_filter, cursor, limit)
+        assert len(page) <= limit
+        pages.extend(page)
+        if cursor is None:
+            return pages
+
+
+LEGACY = ["你在2024-01-02 03:04将目标【阅读】【2030-01-01】【5】修改为【精读】【】【6】",
+          "你在2024-01-02 03:03撤销完成了目标【阅读】",
+          "你在2024-01-02 03:02完成了目标【阅读】",
+          "你在2024-01-02 03:01删除了目标【跑步】",
+          "你在2024-01-02 03:00添加了目标【阅读】"]
+
+
+def test_legacy_text_is_parsed_and_rendered_back():
+    log = load_action_log({'user_actions': LEGACY + ["别的文字"]})
+    assert [record.kind for record in log] == [ActionKind.TEXT, ActionKind.ADD, ActionKind.DELETE,
+                                               ActionKind.COMPLETE, ActionKind.UNDO, ActionKind.EDIT]
+    assert [record.render() for record in all_pages(log)] == LEGACY + ["别的文字"]
+    edit = log.query(limit=1)[0][0]
+    assert (edit.name, edit.old, edit.new) == ("精读", ["阅读", "2030-01-01", 5], ["精读", "", 6])
+
+
+def test_json_round_trip():
+    log = load_action_log({'user_actions': LEGACY})
+    again = load_action_log({'actions': [record.to_json() for record in log]})
+    assert [record.to_json() for record in again] == [record.to_json() for record in log]
+    assert [record.render() for record in all_pages(again)] == LEGACY
+
+
+@pytest.mark.parametrize("maxlen", [None, 50])
+def test_pages_match_a_full_scan(maxlen):
+    log = ActionLog(maxlen=maxlen)
+    for record in records(137):
+        log.append(record)
+    action_filter = ActionFilter(kinds={ActionKind.COMPLETE, ActionKind.UNDO}, name="目标3")
+    assert all_pages(log) == list(reversed(list(log)))
+    assert all_pages(log, action_filter) == [record for record in reversed(list(log)) if action_filter.matches(record)]
+    assert len(log) == (137 if maxlen is None else maxlen)
+
+
+def test_appending_between_pages_does_not_shift_them():
+    log = ActionLog(records(30), maxlen=40)
+    first, cursor = log.query(limit=10)
+    for record in records(5, 30):
+        log.append(record)
+    second, _ = log.query(cursor=cursor, limit=10)
+    assert times(first + second) == list(range(1700000029, 1700000009, -1))
+
+
+def test_maxlen_keeps_the_newest_records():
+    log = ActionLog(records(30), maxlen=10)
+    assert log.maxlen == 10
+    assert times(log) == times(records(30)[-10:])
+
+
+def test_trimmed_log_releases_records_and_keeps_sequence_numbers():
+    log = ActionLog(maxlen=10)
+    view, mark = log.since()
+    for record in records(100):
+        log.append(record)
+    assert len(log._items) < 20
+    assert times(log) == times(records(100)[-10:])
+    assert times(reversed(log)) == times(reversed(records(100)[-10:]))
+    assert len(view) == 0
+
+    added, mark = log.since(mark)
+    assert times(added) == times(records(100)[-10:])
+    log.append(records(1, 100)[0])
+    added, _ = log.since(mark)
+    assert times(added) == [1700000100]
+
+
+def test_views_survive_later_changes():
+    log = ActionLog(records(20), maxlen=20)
+    view = log.view()
+    for record in records(30, 20):
+        log.append(record)
+    assert log.drop_before(1700000045) == 15
+    assert times(view) == times(records(20))
+    assert times(log) == times(records(50)[45:])
+
+
+def test_drop_before_keeps_the_cursor_usable():
+    log = ActionLog(records(60))
+    _, cursor = log.query(limit=5)
+    log.drop_before(1700000020)
+    remaining = all_pages(log, limit=9)
+    assert times(remaining) == times(reversed(records(60)[20:]))
+    page, _ = log.query(cursor=cursor, limit=100)
+    assert all(record.time >= 1700000020 for record in page)
@@ -0,0 +1,85 @@
+"""
+ProgressStats 的测试：NumPy 向量化建立的统计必须与逐条累加的结果完全相同。
+"""
+import random
+import time
+from datetime import date
+
+import pytest
+
+import analytics
+from action_log import ActionKind, ActionRecord
+from analytics import ProgressStats, day_of
+from goal_record import GoalRecord
+
+pytestmark = pytest.mark.skipif(analytics.np is None, reason="没有安装 NumPy")
+
+DAY = 86400
+
+
+def generate(seed, goals=20, actions=3000, completed=15):
+    """
+    生成按时间顺序排列的操作记录和已完成目标，包括撤销、修改、没有 id 的旧记录和无法识别的文字记录。
+    """
+    rng = random.Random(seed)
+    start = int(time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1)))
+    kinds = [ActionKind.ADD, ActionKind.EDIT, ActionKind.DELETE, ActionKind.TEXT] + [ActionKind.COMPLETE] * 6 \
+        + [ActionKind.UNDO] * 2
+    records = []
+    moment = start
+    for _ in range(actions):
+        # 多数操作间隔不到一天，偶尔间隔几天，使连续天数有断有续
+        moment += rng.choice([rng.randint(60, 8 * 3600)] * 9 + [rng.randint(2, 5) * DAY])
+        goal = rng.randrange(goals)
+        goal_id = None if goal % 7 == 0 else f"goal-{goal}"
+        records.append(ActionRecord(moment, rng.choice(kinds), goal_id, f"目标{goal}{rng.choice('甲乙')}"))
+    completed_goals = []
+    for i in range(completed):
+        finished = date.fromtimestamp(start + rng.randint(0, moment - start))
+        deadline = "" if i % 4 == 0 else date.fromordinal(finished.toordinal() + rng.randint(-5, 5)).isoformat()
+        completed_goals.append(GoalRecord(f"goal-{i}", f"目标{i}", deadline, 3, 3, finished.isoformat()))
+    return records, completed_goals, day_of(moment)
+
+
+def snapshot(stats, today):
+    goals = {key: (progress.name, progress.days, progress.last, progress.run, progress.longest, progress.added)
+             for key, progress in stats.goals.items()}
+    return (goals, stats.daily, stats.on_time, stats.late, stats.no_deadline, stats.duration_total,
+            stats.duration_count, stats.streaks(today), stats.heatmap(today=today))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_build_matches_incremental(seed):
+    records, completed_goals, today = generate(seed)
+    vectorized = ProgressStats.build(records, completed_goals, use_numpy=True)
+    incremental = ProgressStats.build(records, completed_goals, use_numpy=False)
+    assert snapshot(vectorized, today) == snapshot(incremental, today)
+
+
+def test_numpy_build_continues_incrementally():
+    records, completed_goals, today = generate(42)
+    head, tail = records[:2000], records[2000:]
+    stats = ProgressStats.build(head, completed_goals[:5], use_numpy=True)
+    for record in tail:
+        stats.add_action(record)
+    for goal in completed_goals[5:]:
+        stats.add_completed(goal)
+    assert snapshot(stats, today) == snapshot(ProgressStats.build(records, completed_goals, use_numpy=False), today)
+
+
+def test_empty_and_text_only_history():
+    text = [ActionRecord(int(time.time()), ActionKind.TEXT, None, "旧的文字记录")]
+    for records in ([], text):
+        today = date.today().toordinal()
+        assert snapshot(ProgressStats.build(records, [], use_numpy=True), today) == \
+            snapshot(ProgressStats.build(records, [], use_numpy=False), today)
+
+
+def test_undo_breaks_a_streak():
+    noon = int(time.mktime((2024, 3, 1, 12, 0, 0, 0, 0, -1)))
+    records = [ActionRecord(noon + i * DAY, ActionKind.COMPLETE, "a", "阅读") for i in range(5)]
+    records.append(ActionRecord(noon + 2 * DAY + 60, ActionKind.UNDO, "a", "阅读"))
+    for use_numpy in (True, False):
+        progress = ProgressStats.build(records, [], use_numpy=use_numpy).goals["a"]
+        assert (progress.run, progress.longest) == (2, 2)
+        assert progress.current_streak(day_of(noon) + 5) == 2
@@ -0,0 +1,157 @@
+"""
+HistoryArchive 的测试：追加、崩溃留下的多余记录、repack 和 prune。
+"""
+import json
+import os
+import time
+
+import pytest
+
+from action_log import ActionKind, ActionRecord
+from archive import HistoryArchive
+from goal_record import GoalRecord
+
+
+def month_start(year, month):
+    return int(time.mktime((year, month, 1, 12, 0, 0, 0, 0, -1)))
+
+
+def sample():
+    actions = [ActionRecord(month_start(2024, month) + i * 3600, ActionKind.COMPLETE, f"g{i}", f"目标{i}")
+               for month in (1, 2, 3) for i in range(4)]
+    completed = [GoalRecord(f"done-{month}-{i}", f"完成{i}", "", 1, 1, f"2024-0{month}-1{i}")
+                 for month in (1, 2) for i in range(3)]
+    return actions, completed
+
+
+@pytest.fixture
+def history_archive(tmp_path):
+    history_archive = HistoryArchive(str(tmp_path / "archive"))
+    actions, completed = sample()
+    history_archive.add(actions, completed, month_start(2024, 4), "2024-03-01")
+    return history_archive
+
+
+def all_items(history_archive, kind):
+    return [item.to_json() for segment in reversed(history_archive.segments(kind))
+            for item in history_archive.read(segment)]
+
+
+def test_add_groups_by_month(history_archive):
+    assert [segment['month'] for segment in history_archive.segments("actions")] == ["2024-03", "2024-02", "2024-01"]
+    assert history_archive.count("actions") == 12
+    assert history_archive.count("completed") == 6
+    assert history_archive.monthly_completions() == {"2024-01": 3, "2024-02": 3}
+    assert history_archive.cutoff() == (month_start(2024, 4), "2024-03-01")
+    actions, completed = sample()
+    assert all_items(history_archive, "actions") == [record.to_json() for record in actions]
+    assert all_items(history_archive, "completed") == [goal.to_json() for goal in completed]
+
+
+def test_cutoff_only_moves_forward(history_archive):
+    history_archive.add([], [], month_start(2024, 1), "2024-01-01")
+    assert history_archive.cutoff() == (month_start(2024, 4), "2024-03-01")
+
+
+def crashed_add(history_archive, actions, completed_goals, actions_before, completed_before):
+    """
+    模拟追加之后、更新索引之前崩溃：记录写进了分段，索引没有变化。
+    """
+    with open(history_archive.index_path) as f:
+        index = json.load(f)
+    history_archive.add(actions, completed_goals, actions_before, completed_before)
+    with open(history_archive.index_path, "w") as f:
+        json.dump(index, f)
+
+
+APRIL = [ActionRecord(month_start(2024, 4) + day * 86400, ActionKind.COMPLETE, "g", "阅读") for day in range(4)]
+LATE = GoalRecord("done-3-9", "完成9", "", 1, 1, "2024-03-09")
+
+
+def test_records_left_by_a_crashed_add_do_not_count(history_archive):
+    history_archive.add(APRIL[:2], [], month_start(2024, 4) + 2 * 86400, None)
+    expected_actions = all_items(history_archive, "actions")
+    expected_completed = all_items(history_archive, "completed")
+    crashed_add(history_archive, APRIL[2:], [LATE], month_start(2024, 4) + 4 * 86400, "2024-03-10")
+
+    assert all_items(history_archive, "actions") == expected_actions
+    assert all_items(history_archive, "completed") == expected_completed
+    # 四月分段中多出的两条和索引中没有的三月已完成目标分段都被清除
+    assert history_archive.repack() == (6, 3)
+    assert history_archive.count("actions") == 14
+    assert all_items(history_archive, "actions") == expected_actions
+    assert all_items(history_archive, "completed") == expected_completed
+
+
+def test_retry_after_a_crashed_add_keeps_each_record_once(history_archive):
+    history_archive.add(APRIL[:2], [], month_start(2024, 4) + 2 * 86400, None)
+    crashed_add(history_archive, APRIL[2:], [LATE], month_start(2024, 4) + 4 * 86400, "2024-03-10")
+    # 主数据中仍有这些记录，下次归档时再追加一次
+    history_archive.add(APRIL[2:], [LATE], month_start(2024, 4) + 4 * 86400, "2024-03-10")
+
+    assert all_items(history_archive, "actions")[-4:] == [record.to_json() for record in APRIL]
+    assert history_archive.count("actions") == 16
+    assert history_archive.count("completed") == 7
+    assert history_archive.repack() == (7, 0)
+    assert history_archive.count("actions") == 16
+
+
+def test_identical_records_are_all_kept(history_archive):
+    # 同一秒内多次点击完成，记录的内容完全相同
+    same = [ActionRecord(month_start(2024, 4), ActionKind.COMPLETE, "g", "阅读") for _ in range(3)]
+    history_archive.add(same, [], month_start(2024, 5), None)
+    assert history_archive.count("actions") == 15
+    assert all_items(history_archive, "actions")[-3:] == [record.to_json() for record in same]
+    assert history_archive.repack() == (6, 0)
+    assert all_items(history_archive, "actions")[-3:] == [record.to_json() for record in same]
+
+
+def test_repack_recovers_segments_missing_from_the_index(history_archive):
+    expected = all_items(history_archive, "actions")
+    with open(history_archive.index_path) as f:
+        index = json.load(f)
+    index['segments'] = [segment for segment in index['segments'] if segment['month'] != "2024-02"]
+    with open(history_archive.index_path, "w") as f:
+        json.dump(index, f)
+    assert history_archive.count("actions") == 8
+
+    history_archive.repack()
+    assert history_archive.count("actions") == 12
+    assert all_items(history_archive, "actions") == expected
+
+
+def test_repack_changes_the_compression(history_archive):
+    expected = all_items(history_archive, "actions"), all_items(history_archive, "completed")
+    assert history_archive.repack("lzma") == (5, 0)
+    files = sorted(name for name in os.listdir(history_archive.directory) if name != "index.json")
+    assert files and all(name.endswith(".ndjson.xz") for name in files)
+    assert (all_items(history_archive, "actions"), all_items(history_archive, "completed")) == expected
+
+    # 之后的追加沿用新的压缩方式
+    history_archive.add([ActionRecord(month_start(2024, 5), ActionKind.ADD, "g", "新目标")], [],
+                        month_start(2024, 6), None)
+    assert history_archive.segments("actions")[0]['file'] == "actions-2024-05.ndjson.xz"
+
+
+def test_prune_keeps_monthly_completions(history_archive):
+    months = history_archive.monthly_completions()
+    assert history_archive.prune("2024-02") == (2, 7)
+    assert [segment['month'] for segment in history_archive.segments("actions")] == ["2024-03", "2024-02"]
+    assert [segment['month'] for segment in history_archive.segments("completed")] == ["2024-02"]
+    assert history_archive.monthly_completions() == months
+    assert not os.path.exists(os.path.join(history_archive.directory, "actions-2024-01.ndjson.gz"))
+
+    assert history_archive.prune("2024-03", kinds=("actions",)) == (1, 4)
+    assert history_archive.count("completed") == 3
+    assert history_archive.prune("2024-01") == (0, 0)
+
+
+def test_query_actions_pages_across_segments(history_archive):
+    expected = list(reversed(all_items(history_archive, "actions")))
+    pages, cursor = [], None
+    while True:
+        records, cursor = history_archive.query_actions(cursor=cursor, limit=5)
+        pages.extend(record.to_json() for record in records)
+        if cursor is None:
+            break
+    assert pages == expected
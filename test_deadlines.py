@@ -0,0 +1,109 @@
+"""
+DeadlineScheduler 的测试：用可控的时钟检查即将到期、超期的判定和堆随目标修改的调整。
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from deadlines import DUE_SOON, NORMAL, OVERDUE, DeadlineScheduler, midnight
+from goal_store import GoalStore
+from storage import JsonStorage
+
+TODAY = date(2026, 3, 10)
+
+
+def day(offset):
+    return (TODAY + timedelta(days=offset)).isoformat()
+
+
+class Clock:
+    def __init__(self):
+        self.now = midnight(TODAY.toordinal()) + 9 * 3600
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, days):
+        self.now += days * 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    yield store
+    store.close()
+
+
+def names(goals):
+    return sorted(goal['name'] for goal in goals)
+
+
+def test_states_are_computed_from_the_deadline(store):
+    clock = Clock()
+    for name, offset in (("超期", -1), ("今天", 0), ("明天", 1), ("后天", 2)):
+        store.add_goal(name, day(offset), 3)
+    store.add_goal("无期限", "", 3)
+    scheduler = DeadlineScheduler(store, clock=clock)
+
+    soon, overdue = scheduler.pending()
+    assert names(soon) == ["今天", "明天"]
+    assert names(overdue) == ["超期"]
+    assert scheduler.state(store.find("后天")['id']) == NORMAL
+    assert scheduler.state(store.find("无期限")['id']) == NORMAL
+    # 后天的目标在明天零点变为即将到期，是最早的一次变化
+    assert scheduler.next_due() == midnight(TODAY.toordinal() + 1)
+
+
+def test_pop_due_moves_goals_through_their_states(store):
+    clock = Clock()
+    goal = store.add_goal("阅读", day(2), 3)
+    scheduler = DeadlineScheduler(store, clock=clock)
+    assert scheduler.pop_due() == []
+
+    clock.advance(1)
+    assert [(event['name'], state) for event, state in scheduler.pop_due()] == [("阅读", DUE_SOON)]
+    assert scheduler.next_due() == midnight(TODAY.toordinal() + 3)
+    clock.advance(1)
+    assert scheduler.pop_due() == []
+    clock.advance(1)
+    assert [(event['id'], state) for event, state in scheduler.pop_due()] == [(goal['id'], OVERDUE)]
+    # 超期的目标不再留在堆中
+    assert scheduler.next_due() is None
+
+
+def test_changes_reschedule_the_heap(store):
+    clock = Clock()
+    calls = []
+    goal = store.add_goal("阅读", day(5), 3)
+    scheduler = DeadlineScheduler(store, on_reschedule=lambda: calls.append(scheduler.next_due()), clock=clock)
+    assert calls == []
+
+    store.edit_goal(goal['id'], "阅读", day(1), 3)
+    assert calls == [midnight(TODAY.toordinal() + 2)]
+    assert scheduler.state(goal['id']) == DUE_SOON
+
+    # 只改变完成次数时不需要调整堆
+    store.increment(goal['id'])
+    assert len(calls) == 1
+
+    other = store.add_goal("跑步", day(3), 3)
+    assert calls[-1] == midnight(TODAY.toordinal() + 2)
+    store.delete_goal(goal['id'])
+    assert scheduler.next_due() == midnight(TODAY.toordinal() + 2)
+    clock.advance(2)
+    assert [(event['id'], state) for event, state in scheduler.pop_due()] == [(other['id'], DUE_SOON)]
+
+    store.edit_goal(other['id'], "跑步", "", 3)
+    assert scheduler.next_due() is None
+    assert scheduler.pending() == ([], [])
+
+
+def test_stale_entries_are_compacted(store):
+    clock = Clock()
+    goal = store.add_goal("阅读", day(10), 3)
+    scheduler = DeadlineScheduler(store, clock=clock)
+    for i in range(200):
+        store.edit_goal(goal['id'], "阅读", day(10 + i % 7 + 1), 3)
+    scheduler.next_due()
+    assert len(scheduler._heap) <= 2 * len(scheduler._entries) + 16
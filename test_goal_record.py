@@ -0,0 +1,80 @@
+"""
+GoalOrder 的测试：用 bisect 维护的顺序必须与每次重新排序的结果相同。
+"""
+import random
+
+import pytest
+
+from goal_record import GoalOrder, GoalRecord, deadline_key, name_key, progress_key
+from goal_store import GoalStore
+from storage import JsonStorage
+
+
+def random_goal(rng, goal_id):
+    deadline = "" if rng.random() < 0.2 else f"2026-{rng.randint(1, 3):02d}-{rng.randint(1, 3):02d}"
+    target_times = rng.randint(1, 5)
+    return GoalRecord(goal_id, rng.choice("甲乙丙丁"), deadline, target_times, rng.randint(0, target_times - 1))
+
+
+def expected(key, goals):
+    return [goal_id for _, goal_id in sorted((key(goal), goal_id) for goal_id, goal in goals.items())]
+
+
+@pytest.mark.parametrize("key", [deadline_key, name_key, progress_key])
+@pytest.mark.parametrize("seed", range(3))
+def test_order_matches_sorting_after_each_change(key, seed):
+    rng = random.Random(seed)
+    goals = {f"g{i}": random_goal(rng, f"g{i}") for i in range(30)}
+    order = GoalOrder(key, goals.values())
+    assert list(order) == expected(key, goals)
+
+    for step in range(300):
+        action = rng.random()
+        if action < 0.3 or not goals:
+            goal = random_goal(rng, f"n{step}")
+            goals[goal.id] = goal
+            position = order.add(goal)
+            assert order[position] == goal.id
+        elif action < 0.5:
+            goal_id = rng.choice(list(goals))
+            position = order.position(goal_id)
+            assert order.remove(goal_id) == position
+            del goals[goal_id]
+            assert order.position(goal_id) == -1
+        else:
+            goal = goals[rng.choice(list(goals))]
+            old = order.position(goal.id)
+            changed = random_goal(rng, goal.id)
+            goal.name, goal.deadline_day = changed.name, changed.deadline_day
+            goal.target_times, goal.completed_times = changed.target_times, changed.completed_times
+            predicted = order.updated_position(goal)
+            assert order.update(goal) == (old, predicted)
+            assert order[predicted] == goal.id
+        assert list(order) == expected(key, goals)
+        assert len(order) == len(goals)
+
+
+def test_copy_is_independent():
+    rng = random.Random(0)
+    goals = [random_goal(rng, f"g{i}") for i in range(10)]
+    order = GoalOrder(deadline_key, goals)
+    copy = order.copy()
+    order.remove("g0")
+    order.add(random_goal(rng, "new"))
+    assert list(copy) == expected(deadline_key, {goal.id: goal for goal in goals})
+
+
+def test_store_keeps_the_deadline_order(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    rng = random.Random(1)
+    for i in range(20):
+        store.add_goal(f"目标{i}", "" if i % 5 == 0 else f"2026-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}", 3)
+    for goal in list(store.goals[::3]):
+        store.edit_goal(goal['id'], goal['name'], f"2027-01-0{rng.randint(1, 9)}", 3)
+    for goal in list(store.goals[::4]):
+        store.delete_goal(goal['id'])
+    for goal in list(store.goals[::2]):
+        store.increment(goal['id'], 3)
+    assert list(store.deadline_order) == expected(deadline_key, store.goal_index)
+    store.close()
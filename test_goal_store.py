@@ -0,0 +1,298 @@
+"""
+GoalStore 的测试：输入验证、完成判定、批量修改和监听者收到的行号，
+以及合并其它程序所做修改（_sync_external 的三方合并），三种存储方式都要覆盖。
+"""
+import pytest
+
+from action_log import ActionKind
+from goal_store import GoalError, GoalStore, GoalStoreListener, validate_goal
+from storage import JsonStorage, SqliteStorage, create_storage
+
+KINDS = ("json", "journal", "sqlite")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "goals.json")
+
+
+@pytest.fixture
+def store(path):
+    store = GoalStore(JsonStorage(path, 0))
+    store.load()
+    yield store
+    store.close()
+
+
+def kinds(store):
+    records, _ = store.storage.query_actions(limit=1000)
+    return [record.kind for record in reversed(records)]
+
+
+class CountingStorage(JsonStorage):
+    commits = 0
+
+    def commit(self):
+        self.commits += 1
+        super().commit()
+
+
+class RecordingListener(GoalStoreListener):
+    def __init__(self, store):
+        self.store = store
+        self.events = []
+
+    def goal_inserted(self, row):
+        self.events.append(("inserted", row, self.store.goals[row]['name']))
+
+    def goal_removing(self, row):
+        self.events.append(("removing", row, self.store.goals[row]['name']))
+
+    def goal_changed(self, row):
+        self.events.append(("changed", row, self.store.goals[row]['name']))
+
+
+@pytest.mark.parametrize("values, message", [
+    (("  ", "", 1), "请输入目标名称！"),
+    (("这个名称超过了十个字的长度", "", 1), "目标名称不能超过10个字符！"),
+    (("阅读", "2030-13-01", 1), "截止日期的格式应为 yyyy-MM-dd！"),
+    (("阅读", "", " "), "请输入需要完成的次数！"),
+    (("阅读", "", "三"), "请输入有效的次数！"),
+    (("阅读", "", 0), "目标次数不能小于1次！"),
+])
+def test_validation_messages(values, message):
+    with pytest.raises(GoalError, match=message):
+        validate_goal(*values)
+
+
+def test_validation_normalizes_the_input():
+    assert validate_goal(" 阅读 ", " 2030-01-01 ", " 3 ") == ("阅读", "2030-01-01", 3)
+
+
+def test_goal_completes_when_it_reaches_the_target(store):
+    goal = store.add_goal("阅读", "", 3)
+    store.increment(goal['id'])
+    assert store.decrement(goal['id'])
+    assert store.get(goal['id'])['completed_times'] == 0
+    assert not store.decrement(goal['id'])
+
+    done = store.increment(goal['id'], 5)
+    assert done['completion_date'] and done['completed_times'] == 3
+    assert store.goals == [] and store.get(goal['id']) is None
+    assert [completed['id'] for completed in store.completed_goals] == [goal['id']]
+    assert store.increment(goal['id']) is None
+    # 完成只记录完成操作，不记录删除
+    assert kinds(store) == [ActionKind.ADD, ActionKind.COMPLETE, ActionKind.UNDO, ActionKind.UNDO] + \
+        [ActionKind.COMPLETE] * 3
+
+
+def test_edit_and_delete(store):
+    goal = store.add_goal("阅读", "", 3)
+    with pytest.raises(GoalError):
+        store.edit_goal(goal['id'], "", "", 3)
+    assert store.edit_goal(goal['id'], "精读", "2030-01-01", 4)['name'] == "精读"
+    assert store.edit_goal("missing", "精读", "", 4) is None
+    assert store.delete_goal(goal['id'])['name'] == "精读"
+    assert store.delete_goal(goal['id']) is None
+    assert kinds(store) == [ActionKind.ADD, ActionKind.EDIT, ActionKind.DELETE]
+
+
+def test_find_by_id_or_unique_name(store):
+    first = store.add_goal("阅读", "", 3)
+    store.add_goal("跑步", "", 3)
+    store.add_goal("跑步", "", 2)
+    assert store.find("阅读") is first
+    assert store.find(first['id']) is first
+    with pytest.raises(GoalError, match="有多个目标名为 跑步"):
+        store.find("跑步")
+    with pytest.raises(GoalError, match="找不到目标"):
+        store.find("写作")
+
+
+def test_batch_commits_once(path):
+    storage = CountingStorage(path, 0)
+    store = GoalStore(storage)
+    store.load()
+    with store.batch():
+        goals = store.add_goals([("阅读", "", 3), ("跑步", "", 2)])
+        store.increment_goals([goal['id'] for goal in goals], 2)
+    assert storage.commits == 1
+    assert [goal['name'] for goal in store.goals] == ["阅读"]
+
+    with pytest.raises(GoalError, match="第 2 个目标"):
+        store.add_goals([("写作", "", 1), ("", "", 1)])
+    with pytest.raises(GoalError, match="找不到目标：missing"):
+        store.complete_goals([goals[0]['id'], "missing"])
+    assert [goal['name'] for goal in store.goals] == ["阅读"]
+
+    store.complete_goals([goals[0]['id']])
+    assert store.goals == []
+    assert len(store.completed_goals) == 2
+    store.close()
+
+    reopened = GoalStore(JsonStorage(path, 0))
+    reopened.load()
+    assert [goal['name'] for goal in reopened.completed_goals] == ["跑步", "阅读"]
+    reopened.close()
+
+
+def test_complete_goals_records_one_completion(store):
+    goal = store.add_goal("阅读", "", 5)
+    listener = RecordingListener(store)
+    store.add_listener(listener)
+    assert store.complete_goals([goal['id'], goal['id']]) == [goal, goal]
+    assert goal['completed_times'] == 5 and goal['completion_date']
+    assert [completed['id'] for completed in store.completed_goals] == [goal['id']]
+    assert kinds(store) == [ActionKind.ADD, ActionKind.COMPLETE]
+    assert listener.events == [("removing", 0, "阅读")]
+
+
+def test_listeners_receive_current_rows(store):
+    goals = store.add_goals([(f"目标{i}", "", 2) for i in range(6)])
+    listener = RecordingListener(store)
+    store.add_listener(listener)
+    store.delete_goal(goals[1]['id'])
+    store.delete_goal(goals[3]['id'])
+    store.increment(goals[5]['id'])
+    store.increment(goals[0]['id'], 2)
+    store.increment(goals[4]['id'])
+    store.add_goal("新目标", "", 1)
+    assert listener.events == [("removing", 1, "目标1"), ("removing", 2, "目标3"), ("changed", 3, "目标5"),
+                               ("changed", 0, "目标0"), ("removing", 0, "目标0"), ("changed", 1, "目标4"),
+                               ("inserted", 3, "新目标")]
+    assert [store.row_of(goal['id']) for goal in store.goals] == list(range(len(store.goals)))
+    assert store.row_of(goals[0]['id']) == -1
+
+
+@pytest.fixture(params=KINDS)
+def open_store(request, tmp_path):
+    """
+    返回打开同一份数据文件的函数，每次调用得到一个新的 GoalStore，测试结束时全部关闭。
+    """
+    kind = request.param
+    path = str(tmp_path / ("goals.db" if kind == "sqlite" else "goals.json"))
+    stores = []
+
+    def open_store():
+        store = GoalStore(create_storage(kind, path, 0, import_from=None))
+        store.load()
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def names(store):
+    return sorted(goal['name'] for goal in store.goals)
+
+
+def test_changes_on_both_sides_are_merged(open_store):
+    ours = open_store()
+    first = ours.add_goal("阅读", "", 5)
+    second = ours.add_goal("跑步", "", 3)
+    theirs = open_store()
+
+    with ours.batch():
+        theirs.edit_goal(first['id'], "精读", "", 5)
+        theirs.add_goal("写作", "", 2)
+        ours.edit_goal(second['id'], "晨跑", "", 3)
+
+    assert names(ours) == ["写作", "晨跑", "精读"]
+    assert names(open_store()) == ["写作", "晨跑", "精读"]
+
+
+def test_report_lists_what_the_other_side_changed(open_store):
+    ours = open_store()
+    edited = ours.add_goal("阅读", "", 5)
+    deleted = ours.add_goal("跑步", "", 3)
+    completed = ours.add_goal("写作", "", 1)
+    theirs = open_store()
+
+    theirs.edit_goal(edited['id'], "精读", "", 5)
+    theirs.delete_goal(deleted['id'])
+    theirs.increment(completed['id'])
+    added = theirs.add_goal("绘画", "", 4)
+
+    report = ours.sync_external()
+    assert [goal['id'] for goal in report.updated] == [edited['id']]
+    assert [goal['id'] for goal in report.removed] == [deleted['id']]
+    assert [goal['id'] for goal in report.completed] == [completed['id']]
+    assert [goal['id'] for goal in report.added] == [added['id']]
+    assert report.conflicts == []
+    assert report.actions == 4
+    assert names(ours) == ["精读", "绘画"]
+    assert ours.sync_external() is None
+
+
+def test_both_sides_editing_keeps_the_local_version(open_store):
+    ours = open_store()
+    goal = ours.add_goal("阅读", "", 5)
+    theirs = open_store()
+
+    with ours.batch():
+        theirs.edit_goal(goal['id'], "泛读", "", 5)
+        ours.edit_goal(goal['id'], "精读", "", 5)
+
+    assert names(ours) == ["精读"]
+    assert names(open_store()) == ["精读"]
+
+
+def test_conflicts_are_reported(open_store):
+    ours = open_store()
+    edited = ours.add_goal("阅读", "", 5)
+    deleted_there = ours.add_goal("跑步", "", 3)
+    deleted_here = ours.add_goal("写作", "", 2)
+    theirs = open_store()
+
+    reports = []
+    listener = GoalStoreListener()
+    listener.external_merged = reports.append
+    ours.add_listener(listener)
+    with ours.batch():
+        theirs.edit_goal(edited['id'], "泛读", "", 5)
+        theirs.delete_goal(deleted_there['id'])
+        theirs.edit_goal(deleted_here['id'], "散文", "", 2)
+        ours.edit_goal(edited['id'], "精读", "", 5)
+        ours.edit_goal(deleted_there['id'], "晨跑", "", 3)
+        ours.delete_goal(deleted_here['id'])
+
+    # 冲突时保留本地的修改：被对方删除的目标重新写回，本地删除的目标仍然删除
+    assert names(ours) == ["晨跑", "精读"]
+    assert names(open_store()) == ["晨跑", "精读"]
+    assert len(reports) == 1
+    conflicts = reports[0].conflicts
+    assert any("已在其它窗口删除或完成" in text for text in conflicts)
+    if not isinstance(ours.storage, SqliteStorage):
+        # SQLite 的本地修改直接写入同一个数据库，覆盖对方的修改，只有对方删除的目标能看出冲突
+        assert len(conflicts) == 3
+        assert any("两边都被修改" in text for text in conflicts)
+        assert any("已在本地删除" in text for text in conflicts)
+
+
+def test_same_id_added_on_both_sides_keeps_the_local_version(open_store):
+    ours = open_store()
+    if isinstance(ours.storage, SqliteStorage):
+        pytest.skip("SQLite 的 uid 唯一索引在写入时就拒绝相同的 id")
+    theirs = open_store()
+    with ours.batch():
+        theirs.import_goal("跑步", "", 3, 0, "shared-id")
+        ours.import_goal("阅读", "", 5, 1, "shared-id")
+
+    assert [goal['name'] for goal in ours.goals] == ["阅读"]
+    assert [goal['name'] for goal in open_store().goals] == ["阅读"]
+
+
+def test_merged_history_reaches_the_statistics(open_store):
+    ours = open_store()
+    goal = ours.add_goal("阅读", "", 2)
+    stats = ours.progress_stats()
+    theirs = open_store()
+    theirs.increment(goal['id'], 2)
+
+    report = ours.sync_external()
+    assert [completed['id'] for completed in report.completed] == [goal['id']]
+    assert [completed['id'] for completed in ours.completed_goals] == [goal['id']]
+    assert stats.no_deadline == 1
+    assert sum(stats.daily.values()) == 2
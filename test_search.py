@@ -0,0 +1,92 @@
+"""
+搜索索引的测试：n-gram 倒排索引的结果必须与逐个比较名称的结果相同，并随 GoalStore 的修改增量更新。
+"""
+import random
+
+import pytest
+
+from goal_store import GoalStore
+from search import NgramIndex
+from storage import JsonStorage
+
+CHARACTERS = "读书跑步写作Ab"
+
+
+def random_name(rng):
+    return "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(1, 6)))
+
+
+def brute_force(texts, query):
+    return {key for key, text in texts.items() if query.casefold() in text.casefold()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_index_matches_a_full_scan(seed):
+    rng = random.Random(seed)
+    index = NgramIndex()
+    texts = {}
+    for step in range(500):
+        key = f"k{rng.randrange(80)}"
+        if rng.random() < 0.2:
+            index.remove(key)
+            texts.pop(key, None)
+        else:
+            texts[key] = random_name(rng)
+            index.add(key, texts[key])
+        query = random_name(rng)[:rng.randint(0, 3)]
+        assert index.search(query) == brute_force(texts, query)
+    assert len(index) == len(texts)
+
+
+def test_non_adjacent_pairs_do_not_match():
+    index = NgramIndex()
+    index.add("a", "读书写书读")
+    # 读书、书写都出现，但没有连在一起的“读书写”之外的“书读书”
+    assert index.search("读书写") == {"a"}
+    assert index.search("书读书") == set()
+    assert index.search("aB") == set()
+    index.add("b", "ABC")
+    assert index.search("ab") == {"b"}
+
+
+def test_store_keeps_the_index_up_to_date(store):
+    index = store.search_index()
+    first = store.add_goal("阅读", "", 3)
+    second = store.add_goal("精读论文", "", 1)
+    assert index.search_goals("读") == {first['id'], second['id']}
+
+    store.edit_goal(first['id'], "跑步", "", 3)
+    assert index.search_goals("读") == {second['id']}
+    # 已完成目标和操作记录的索引在第一次搜索时建立，之后增量更新
+    assert index.count("读") == (1, 0, 2)
+    store.increment(second['id'])
+    assert index.search_goals("读") == set()
+    assert [goal['id'] for goal in index.search_completed("论文")] == [second['id']]
+    store.add_goal("读书", "", 2)
+    records = list(index.search_actions("读"))
+    assert {record.name for record in records} == {"读书", "精读论文", "阅读"}
+    assert [record.time for record in records] == sorted((record.time for record in records), reverse=True)
+
+    store.delete_goal(first['id'])
+    assert index.search_goals("跑") == set()
+    assert index.count("") == (1, 1, store.storage.count_actions())
+
+
+def test_archived_history_leaves_the_index(store):
+    index = store.search_index()
+    goal = store.add_goal("阅读", "", 1)
+    store.increment(goal['id'])
+    assert index.count("读") == (0, 1, store.storage.count_actions())
+    # 保留 -1 天：全部历史数据都移入归档
+    assert store.storage.archive_history(-1)[1] == 1
+    assert index.count("读") == (0, 0, 0)
+    store.add_goal("读书", "", 2)
+    assert index.count("读") == (1, 0, 1)
@@ -0,0 +1,414 @@
+"""
+存储后端的测试：三种存储方式重新加载后得到同样的数据；JSON 文件的后台写入合并连续的修改；
+JournalStorage 在压缩前后、压缩中途崩溃留下 .journal.old 时，重新加载都能得到同样的数据。
+"""
+import json
+import os
+import threading
+
+import pytest
+
+import storage
+from action_log import ActionKind, ActionRecord
+from goal_record import GoalRecord
+from goal_store import GoalStore
+from storage import JournalStorage, JsonStorage, SqliteStorage, WriteBehindWriter, create_storage, new_goal_id, \
+    read_active_goals, read_json_head, read_json_rest
+
+KINDS = ("json", "journal", "sqlite")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "goals.json")
+
+
+def goal(name, completed=0):
+    return GoalRecord(new_goal_id(), name, "2030-01-01", 3, completed)
+
+
+def make_changes(backend, prefix, count=5):
+    """
+    像 GoalManager 那样先修改 backend.data，再通知后端并 commit，覆盖每种修改。
+    """
+    data = backend.load_history()
+    for i in range(count):
+        data['goals'].append(goal(f"{prefix}{i}"))
+        backend.add_goal(data['goals'][-1])
+    data['goals'][0].update({'name': f"{prefix}改", 'completed_times': 1})
+    backend.update_goal(data['goals'][0])
+    done = data['goals'].pop(1)
+    backend.delete_goal(done)
+    done['completion_date'] = "2024-01-02"
+    data['completed_goals'].append(done)
+    backend.complete_goal(data['completed_goals'][-1])
+    backend.add_action(ActionRecord(1704135840, ActionKind.COMPLETE, None, f"{prefix}完成"))
+    backend.commit()
+
+
+def all_actions(backend):
+    """
+    逐页取出全部操作记录，按从新到旧的顺序返回。
+    """
+    records, cursor = backend.query_actions(limit=3)
+    while cursor is not None:
+        page, cursor = backend.query_actions(cursor=cursor, limit=3)
+        records.extend(page)
+    return records
+
+
+def state(backend):
+    """
+    返回可以比较的全部数据，操作记录通过 query_actions 读取。
+    """
+    history = backend.load_history()
+    data = {'goals': [goal.to_json() for goal in history['goals']],
+            'completed_goals': [goal.to_json() for goal in history['completed_goals']]}
+    data['actions'] = [record.to_json() for record in all_actions(backend)]
+    return data
+
+
+def reload(backend):
+    backend.load()
+    return state(backend)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_reload_returns_the_same_data(tmp_path, kind):
+    path = str(tmp_path / "goals.data")
+    backend = create_storage(kind, path)
+    backend.load()
+    make_changes(backend, "甲")
+    make_changes(backend, "乙")
+    expected = state(backend)
+    backend.close()
+
+    reopened = create_storage(kind, path)
+    assert reload(reopened) == expected
+    assert reopened.count_actions() == 2
+    records, cursor = reopened.query_actions(limit=1)
+    assert [record.to_json() for record in records] == expected['actions'][:1] and cursor is not None
+    reopened.close()
+
+
+@pytest.mark.parametrize("kind", ("json", "journal"))
+def test_history_is_loaded_after_the_goals(tmp_path, kind):
+    path = str(tmp_path / "goals.json")
+    backend = create_storage(kind, path)
+    backend.load()
+    make_changes(backend, "甲")
+    expected = state(backend)
+    backend.close()
+
+    reopened = create_storage(kind, path)
+    data = reopened.load()
+    assert [goal.to_json() for goal in data['goals']] == expected['goals']
+    assert not reopened._history_loaded
+    reopened.preload_history()
+    assert reopened.load_history() is data
+    assert state(reopened) == expected
+    reopened.close()
+
+
+@pytest.mark.parametrize("text", ['{"goals": [{"name": "阅读"}], "completed_goals": [1], "actions": []}',
+                                  '{"actions": [], "goals": [{"name": "阅读"}], "completed_goals": [1]}',
+                                  ' { "goals" : [{"name": "阅读"}] } ',
+                                  '{"completed_goals": [1], "goals": [{"name": "阅读"}]}'])
+def test_json_head_matches_a_full_parse(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text)
+    f = open(path)
+    head, rest = read_json_head(f, ('goals',), chunk_size=4)
+    assert head['goals'] == [{"name": "阅读"}]
+    assert read_json_rest(head, rest, f) == json.loads(text)
+    assert f.closed
+
+
+def test_sqlite_imports_the_json_file(tmp_path):
+    source = create_storage("json", str(tmp_path / "goals.json"))
+    source.load()
+    make_changes(source, "甲")
+    make_changes(source, "乙")
+    source.close()
+
+    database = SqliteStorage(str(tmp_path / "goals.db"), import_from=str(tmp_path / "goals.json"))
+    assert reload(database) == state(source)
+    assert database.query_actions(limit=1)[0][0].name == "乙完成"
+    database.close()
+
+
+def test_importing_the_same_file_twice_adds_nothing(tmp_path):
+    source = create_storage("json", str(tmp_path / "goals.json"))
+    source.load()
+    make_changes(source, "甲")
+    source.close()
+
+    database = SqliteStorage(str(tmp_path / "goals.db"), import_from=str(tmp_path / "goals.json"))
+    assert database.import_json(str(tmp_path / "goals.json")) == (0, 0, 0)
+    assert reload(database) == state(source)
+    database.close()
+
+
+def test_legacy_text_actions_are_migrated(tmp_path):
+    path = str(tmp_path / "goals.json")
+    with open(path, "w") as f:
+        json.dump({'goals': [], 'completed_goals': [],
+                   'user_actions': ["你在2024-01-02 03:04完成了目标【阅读】", "无法识别的记录"]}, f)
+    for backend in (JsonStorage(path, 0), SqliteStorage(str(tmp_path / "goals.db"), import_from=path)):
+        backend.load()
+        records = all_actions(backend)[::-1]
+        assert [record.kind for record in records] == [ActionKind.TEXT, ActionKind.COMPLETE]
+        assert records[0].name == "无法识别的记录"
+        assert records[1].render() == "你在2024-01-02 03:04完成了目标【阅读】"
+        backend.close()
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_active_goals_are_read_without_a_backend(tmp_path, kind):
+    path = str(tmp_path / "goals.data")
+    assert read_active_goals(kind, path) == []
+    assert not os.path.exists(path)
+
+    backend = create_storage(kind, path, 0)
+    backend.load()
+    make_changes(backend, "甲")
+    backend.commit()
+    # 追加日志方式在快照之后的修改只在日志中
+    assert read_active_goals(kind, path) == backend.data['goals']
+    make_changes(backend, "乙")
+    expected = list(backend.data['goals'])
+    backend.close()
+    # 只读取，不创建或修改任何文件
+    signature = sorted(os.listdir(tmp_path)), os.path.getmtime(path)
+    assert read_active_goals(kind, path) == expected
+    assert (sorted(os.listdir(tmp_path)), os.path.getmtime(path)) == signature
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_history_limit_keeps_the_newest_actions(tmp_path, kind):
+    path = str(tmp_path / "goals.data")
+    backend = create_storage(kind, path)
+    backend.load()
+    for prefix in "甲乙丙":
+        make_changes(backend, prefix)
+    backend.close()
+
+    limited = create_storage(kind, path, history_limit=2)
+    limited.load()
+    assert [record.name for record in all_actions(limited)] == ["丙完成", "乙完成"]
+    limited.close()
+
+
+def test_write_behind_coalesces_commits(path):
+    backend = JsonStorage(path, write_delay=60)
+    backend.load()
+    for prefix in "甲乙丙":
+        make_changes(backend, prefix)
+    stats = backend.write_stats()
+    assert stats['pending'] and stats['requests'] == 3 and stats['writes'] == 0
+    assert not os.path.exists(path)
+
+    expected = state(backend)
+    backend.close()
+    assert reload(JsonStorage(path, write_delay=0)) == expected
+
+
+def test_writer_keeps_only_the_newest_data():
+    written = []
+    started, release = threading.Event(), threading.Event()
+
+    def write(data):
+        started.set()
+        release.wait(5)
+        written.append(data)
+
+    writer = WriteBehindWriter(write, delay=0)
+    writer.schedule(1)
+    started.wait(5)
+    # 第一份正在写入时提交的数据合并为一次写入
+    for data in (2, 3, 4):
+        writer.schedule(data)
+    release.set()
+    writer.close()
+    assert written == [1, 4]
+    assert writer.stats()['writes'] == 2 and writer.stats()['last_error'] is None
+
+
+def test_writer_reports_errors():
+    def write(data):
+        raise OSError("磁盘已满")
+
+    writer = WriteBehindWriter(write, delay=0)
+    writer.schedule(1)
+    writer.flush()
+    assert writer.stats()['last_error'] == "磁盘已满"
+    writer.close()
+
+
+def test_replay_without_compaction(path):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+    expected = state(journal)
+    # 不经过 close 直接重新加载，相当于程序崩溃
+    journal._journal.close()
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_replay_across_compaction(path):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+    journal.compact(journal.snapshot(), background=False)
+    assert not os.path.exists(journal.old_journal_path)
+    make_changes(journal, "乙")
+    expected = state(journal)
+    journal._journal.close()
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_background_compaction_keeps_later_appends(path):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+    journal.compact(journal.snapshot(), background=True)
+    make_changes(journal, "乙")
+    journal.wait()
+    expected = state(journal)
+    journal._journal.close()
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_close_writes_a_snapshot(path):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+    expected = state(journal)
+    journal.close()
+    assert not os.path.exists(journal.journal_path)
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_crash_during_compaction_replays_the_old_journal(path, monkeypatch):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+
+    def crash(*args, **kwargs):
+        raise OSError("模拟写入快照时崩溃")
+
+    monkeypatch.setattr(storage, "write_json_file", crash)
+    with pytest.raises(OSError):
+        journal.compact(journal.snapshot(), background=False)
+    monkeypatch.undo()
+    assert os.path.exists(journal.old_journal_path)
+
+    # 轮换之后的修改写入新的日志
+    make_changes(journal, "乙")
+    expected = state(journal)
+    assert read_active_goals("journal", path) == journal.data['goals']
+    journal._journal.close()
+
+    reopened = JournalStorage(path)
+    assert reload(reopened) == expected
+    # 加载时把旧日志合并进新的快照
+    assert not os.path.exists(reopened.old_journal_path)
+    reopened.close()
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_truncated_last_line_is_ignored(path):
+    journal = JournalStorage(path)
+    journal.load()
+    make_changes(journal, "甲")
+    expected = state(journal)
+    journal._journal.close()
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"add_goal","goal":{"na')
+
+    assert reload(JournalStorage(path)) == expected
+
+
+def test_legacy_journal_addresses_goals_by_position(path):
+    with open(path, "w") as f:
+        json.dump({'goals': [{'name': "阅读", 'deadline': "", 'target_times': 3, 'completed_times': 0}],
+                   'user_actions': [], 'journal_seq': 0}, f)
+    records = [{"op": "add_goal", "goal": {'name': "跑步", 'deadline': "", 'target_times': 2, 'completed_times': 0}},
+               {"op": "update_goal", "index": 0,
+                "goal": {'name': "精读", 'deadline': "", 'target_times': 3, 'completed_times': 1}},
+               {"op": "add_goal", "goal": {'name': "写作", 'deadline': "", 'target_times': 1, 'completed_times': 0}},
+               {"op": "delete_goal", "index": 1}]
+    with open(f"{path}.journal", "w", encoding="utf-8") as f:
+        for seq, record in enumerate(records, 1):
+            f.write(json.dumps(dict(record, seq=seq), ensure_ascii=False) + "\n")
+
+    goals = JournalStorage(path).load()['goals']
+    assert [(goal['name'], goal['completed_times']) for goal in goals] == [("精读", 1), ("写作", 0)]
+    # 旧数据中的目标按位置分配 id，每次加载都相同
+    assert goals[0]['id'] == "legacy-0"
+    assert len({goal['id'] for goal in goals}) == 2
+
+
+def test_needs_compaction_by_record_count(path):
+    journal = JournalStorage(path, max_records=15)
+    journal.load()
+    make_changes(journal, "甲")
+    assert not journal.needs_compaction()
+    journal.compact = lambda data, background=True: setattr(journal, "compacted", True)
+    make_changes(journal, "乙")
+    # 达到阈值后 commit 自动压缩
+    assert getattr(journal, "compacted", False)
+
+
+def open_store(path):
+    store = GoalStore(JournalStorage(path))
+    store.load()
+    return store
+
+
+def change_goals(store, prefix, count=5):
+    """
+    通过 GoalStore 添加、修改、完成和删除一些目标。
+    """
+    goals = [store.add_goal(f"{prefix}{i}", "2030-01-01", 2) for i in range(count)]
+    store.edit_goal(goals[0]['id'], f"{prefix}改", "", 3)
+    store.increment(goals[1]['id'], 2)
+    store.decrement(goals[2]['id'])
+    store.increment(goals[2]['id'])
+    store.delete_goal(goals[3]['id'])
+
+
+def test_compaction_waits_while_an_old_journal_exists(path):
+    store = open_store(path)
+    change_goals(store, "甲")
+    with open(store.storage.old_journal_path, "w"):
+        pass
+    journal_size = os.path.getsize(store.storage.journal_path)
+    store.storage.compact(store.storage.snapshot(), background=False)
+    # 其它实例的压缩尚未完成，不能再次轮换日志
+    assert os.path.getsize(store.storage.journal_path) == journal_size
+    os.remove(store.storage.old_journal_path)
+    store.close()
+
+
+def test_two_instances_share_one_journal(path):
+    first = open_store(path)
+    second = open_store(path)
+    change_goals(first, "甲")
+    second.sync_external()
+    change_goals(second, "乙")
+    first.sync_external()
+    first.storage.compact(first.storage.snapshot(), background=False)
+    change_goals(first, "丙")
+    second.sync_external()
+    assert state(first.storage) == state(second.storage)
+    expected = state(first.storage)
+    first.close()
+    second.close()
+
+    assert state(open_store(path).storage) == expected
@@ -0,0 +1,133 @@
+"""
+同步服务的测试：ETag 条件请求和 /changes 增量接口。
+"""
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+from goal_store import GoalStore
+from storage import JsonStorage
+from sync_server import ChangeFeed, SyncServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    server = SyncServer(store, port=0)
+    server.start()
+    yield server
+    server.stop()
+    store.close()
+
+
+def request(server, method, path, body=None, headers=None):
+    """
+    发送一个请求，返回 (状态码, JSON 数据, 响应头)。
+    """
+    connection = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    try:
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        connection.request(method, path, data, headers)
+        response = connection.getresponse()
+        content = response.read()
+        return response.status, json.loads(content) if content else None, dict(response.getheaders())
+    finally:
+        connection.close()
+
+
+def test_etag_makes_unchanged_reads_cheap(server):
+    status, body, headers = request(server, "GET", "/goals")
+    assert status == 200 and body['goals'] == []
+    etag = headers["ETag"]
+    assert etag == f'"{body["epoch"]}-{body["version"]}"'
+
+    status, body, headers = request(server, "GET", "/goals", headers={"If-None-Match": etag})
+    assert status == 304 and body is None and headers["ETag"] == etag
+
+    status, created, _ = request(server, "POST", "/goals", {"name": "阅读", "target_times": 3})
+    assert status == 201
+    status, body, headers = request(server, "GET", "/goals", headers={"If-None-Match": etag})
+    assert status == 200 and headers["ETag"] != etag
+    assert [goal['id'] for goal in body['goals']] == [created['goal']['id']]
+
+
+def test_if_match_rejects_stale_writes(server):
+    _, created, headers = request(server, "POST", "/goals", {"name": "阅读", "target_times": 3})
+    goal_id = created['goal']['id']
+    etag = headers["ETag"]
+    request(server, "POST", f"/goals/{goal_id}/complete", {"times": 1})
+
+    status, body, _ = request(server, "PATCH", f"/goals/{goal_id}", {"name": "精读"}, {"If-Match": etag})
+    assert status == 412
+    _, current, _ = request(server, "GET", f"/goals/{goal_id}")
+    assert current['goal']['name'] == "阅读"
+
+    status, body, _ = request(server, "PATCH", f"/goals/{goal_id}", {"name": "精读"},
+                              {"If-Match": f'"{current["epoch"]}-{current["version"]}"'})
+    assert status == 200 and body['goal']['name'] == "精读"
+
+
+def test_changes_returns_only_what_happened_since(server):
+    _, start, _ = request(server, "GET", "/goals")
+    _, created, _ = request(server, "POST", "/goals", {"name": "阅读", "target_times": 2})
+    goal_id = created['goal']['id']
+    _, middle, _ = request(server, "GET", "/goals")
+    request(server, "POST", f"/goals/{goal_id}/complete", {"times": 2})
+
+    _, body, _ = request(server, "GET", f"/changes?since={start['version']}&epoch={start['epoch']}")
+    assert [(change['type'], change.get('action', {}).get('kind')) for change in body['changes']] == \
+        [("goal", None), ("action", "add"), ("goal", None), ("action", "complete"), ("completed", None),
+         ("goal_removed", None), ("action", "complete")]
+    versions = [change['version'] for change in body['changes']]
+    assert versions == list(range(start['version'] + 1, body['version'] + 1))
+
+    _, body, _ = request(server, "GET", f"/changes?since={middle['version']}")
+    assert body['changes'][0]['type'] == "goal"
+    assert body['changes'][0]['goal']['completed_times'] == 1
+    assert [change['goal']['id'] for change in body['changes'] if change['type'] == "completed"] == [goal_id]
+    assert {change['version'] for change in body['changes']} == set(range(middle['version'] + 1, body['version'] + 1))
+
+    _, body, _ = request(server, "GET", f"/changes?since={body['version']}")
+    assert body['changes'] == []
+
+
+def test_changes_asks_for_a_reset_when_it_cannot_answer(server):
+    _, body, _ = request(server, "GET", "/goals")
+    _, reply, _ = request(server, "GET", "/changes?since=0&epoch=other")
+    assert reply.get('reset') is True
+    _, reply, _ = request(server, "GET", f"/changes?since={body['version'] + 5}")
+    assert reply.get('reset') is True
+
+
+def test_changes_waits_for_the_next_change(server):
+    _, body, _ = request(server, "GET", "/goals")
+    timer = threading.Timer(0.2, lambda: request(server, "POST", "/goals", {"name": "阅读", "target_times": 2}))
+    timer.start()
+    start = time.monotonic()
+    _, reply, _ = request(server, "GET", f"/changes?since={body['version']}&wait=5")
+    timer.join()
+    assert time.monotonic() - start < 4
+    assert reply['changes'][0]['goal']['name'] == "阅读"
+
+
+def test_feed_drops_old_changes(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    feed = ChangeFeed(store, limit=3)
+    for i in range(5):
+        store.add_goal(f"目标{i}", "", 2)
+    # 每个目标产生一条目标变化和一条操作记录，超过 2 * limit 时丢弃较早的变化
+    assert feed.version == 10
+    assert feed.since(0) is None
+    assert [change['version'] for change in feed.since(8)] == [9, 10]
+    assert feed.since(10) == []
+    assert feed.since(11) is None
+    store.close()
@@ -0,0 +1,133 @@
+"""
+导入导出的测试：不合法的行逐行报告而不中断导入，导出再导入得到同样的数据。
+"""
+import io
+import time
+
+import pytest
+
+import transfer
+from action_log import ActionKind
+from goal_store import GoalError, GoalStore
+from storage import JsonStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = GoalStore(JsonStorage(str(tmp_path / "goals.json"), 0))
+    store.load()
+    yield store
+    store.close()
+
+
+def import_text(store, kind, fmt, text):
+    errors = []
+    counts = transfer.import_data(store, kind, transfer.read_rows(io.StringIO(text), fmt),
+                                  lambda number, message: errors.append((number, message)))
+    return counts, errors
+
+
+def test_invalid_goal_rows_are_reported_by_line(store):
+    text = ("id,name,deadline,target_times,completed_times\n"
+            "a,阅读,2030-01-01,5,1\n"
+            "b,,2030-01-01,5,0\n"
+            "c,跑步,2030-13-01,5,0\n"
+            "d,写作,,0,0\n"
+            "e,绘画,,3,3\n"
+            "a,重复,,3,0\n"
+            "f,练字,,3,x\n"
+            "g,这个名称超过了十个字的长度,,3,0\n"
+            "h,散步,,2,\n")
+    (imported, failed), errors = import_text(store, "goals", "csv", text)
+    assert (imported, failed) == (2, 7)
+    assert [number for number, _ in errors] == [3, 4, 5, 6, 7, 8, 9]
+    assert "已完成目标" in errors[3][1]
+    assert "a" in errors[4][1]
+    assert [goal['name'] for goal in store.goals] == ["阅读", "散步"]
+    assert store.get("a")['completed_times'] == 1
+
+
+def test_unparsable_ndjson_lines_do_not_stop_the_import(store):
+    text = ('{"name": "阅读", "target_times": 3}\n'
+            "not json\n"
+            "\n"
+            '["a", "list"]\n'
+            '{"name": "跑步", "target_times": "2"}\n')
+    (imported, failed), errors = import_text(store, "goals", "ndjson", text)
+    assert (imported, failed) == (2, 2)
+    assert errors == [(2, "无法解析的行"), (4, "无法解析的行")]
+
+
+def test_action_rows_are_validated(store):
+    text = ('{"time": "2024-01-02 03:04:05", "kind": "complete", "goal_id": "g", "name": "阅读"}\n'
+            '{"time": 1700000000, "kind": 2, "name": "阅读", "old": ["阅读", "", 1], "new": ["精读", "", 2]}\n'
+            '{"time": "昨天", "kind": "add", "name": "阅读"}\n'
+            '{"time": 1700000000, "kind": "jump", "name": "阅读"}\n'
+            '{"time": 1700000000, "kind": "edit", "name": "阅读", "old": ["阅读", "", 1]}\n'
+            '{"time": 1700000000, "kind": "edit", "name": "阅读", "old": "[1]", "new": "[2]"}\n'
+            '{"time": 1700000000, "kind": "add", "name": ""}\n')
+    (imported, failed), errors = import_text(store, "actions", "ndjson", text)
+    assert (imported, failed) == (2, 5)
+    assert [number for number, _ in errors] == [3, 4, 5, 6, 7]
+    records = list(store.storage.iter_actions())
+    assert records[0].time == int(time.mktime(time.strptime("2024-01-02 03:04:05", "%Y-%m-%d %H:%M:%S")))
+    assert records[0].kind == ActionKind.COMPLETE
+    assert records[1].kind == ActionKind.EDIT and records[1].new == ["精读", "", 2]
+
+
+def test_parsers_raise_goal_error():
+    assert transfer.parse_action_time(" 1700000000 ") == 1700000000
+    assert transfer.parse_action_kind("Undo") == ActionKind.UNDO
+    assert transfer.parse_action_kind("4") == ActionKind.COMPLETE
+    for parse, value in ((transfer.parse_action_time, True), (transfer.parse_action_kind, "99"),
+                         (transfer.parse_goal_values, "{}"), (transfer.parse_goal_values, [1, 2])):
+        with pytest.raises(GoalError):
+            parse(value)
+
+
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_export_then_import_round_trips(store, tmp_path, fmt):
+    first = store.add_goal("阅读", "2030-01-01", 5)
+    store.increment(first['id'], 2)
+    done = store.add_goal("跑步", "", 1)
+    store.increment(done['id'])
+    store.edit_goal(first['id'], "精读", "", 6)
+
+    exported = {}
+    for kind in transfer.KINDS:
+        f = io.StringIO()
+        exported[kind] = transfer.export_data(store, kind, f, fmt)
+        exported[kind, "text"] = f.getvalue()
+    assert (exported["goals"], exported["completed"], exported["actions"]) == (1, 1, 6)
+
+    target = GoalStore(JsonStorage(str(tmp_path / "copy.json"), 0))
+    target.load()
+    for kind in transfer.KINDS:
+        counts, errors = import_text(target, kind, fmt, exported[kind, "text"])
+        assert counts == (exported[kind], 0) and errors == []
+    assert [goal.to_json() for goal in target.goals] == [goal.to_json() for goal in store.goals]
+    assert [goal.to_json() for goal in target.completed_goals] == [goal.to_json() for goal in store.completed_goals]
+    # 导入活动目标时会记录一条添加操作，导入的操作记录追加在它之后
+    actions = [record.to_json() for record in target.storage.iter_actions()]
+    assert actions[1:] == [record.to_json() for record in store.storage.iter_actions()]
+    assert actions[0][1:] == [int(ActionKind.ADD), first['id'], "精读"]
+    target.close()
+
+
+def test_export_includes_the_archive(tmp_path):
+    path = str(tmp_path / "goals.json")
+    store = GoalStore(JsonStorage(path, 0, archive_after=0))
+    store.load()
+    goal = store.add_goal("阅读", "", 1)
+    # 归档按时间分界，导入一条很早的记录
+    store.import_action(transfer.action_from_import({"time": 1500000000, "kind": "add", "name": "旧目标"}))
+    store.increment(goal['id'])
+    store.storage.archive_history(1)
+    assert store.storage.archive.count("actions") == 1
+
+    archived, current = io.StringIO(), io.StringIO()
+    assert transfer.export_data(store, "actions", archived, "ndjson") == 3
+    assert transfer.export_data(store, "actions", current, "ndjson", include_archive=False) == 2
+    assert archived.getvalue().endswith(current.getvalue())
+    assert '"旧目标"' in archived.getvalue().splitlines()[0]
+    store.close()
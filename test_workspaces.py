@@ -0,0 +1,108 @@
+"""
+Workspaces 的测试：名称验证、LRU 缓存的淘汰和索引中摘要的失效。
+"""
+import gc
+import weakref
+
+import pytest
+
+from goal_store import GoalStore
+from storage import create_storage
+from workspaces import DEFAULT_WORKSPACE, WorkspaceError, create_workspaces, validate_name
+
+
+@pytest.fixture(params=("json", "journal", "sqlite"))
+def kind(request):
+    return request.param
+
+
+@pytest.fixture
+def workspaces(kind, tmp_path):
+    default_path = str(tmp_path / ("goals.db" if kind == "sqlite" else "goals.json"))
+    workspaces = create_workspaces(kind, default_path, str(tmp_path / "workspaces"), write_delay=0, capacity=2)
+    yield workspaces
+    workspaces.close()
+
+
+@pytest.mark.parametrize("name", ["", "  ", ".隐藏", "a/b", "一二三四五六七八九十一二三四五六七八九十一"])
+def test_invalid_names(name):
+    with pytest.raises(WorkspaceError):
+        validate_name(name)
+
+
+def test_create_and_list(workspaces):
+    assert workspaces.names() == [DEFAULT_WORKSPACE]
+    assert workspaces.create(" 团队 ") == "团队"
+    workspaces.create("个人")
+    assert workspaces.names() == [DEFAULT_WORKSPACE, "个人", "团队"]
+    with pytest.raises(WorkspaceError, match="已存在"):
+        workspaces.create("团队")
+    with pytest.raises(WorkspaceError, match="不存在"):
+        workspaces.open("别的")
+    assert workspaces.summary("团队") == {'goals': 0, 'next_deadline': None}
+
+
+def test_least_recently_used_store_is_closed(workspaces):
+    for name in ("甲", "乙"):
+        workspaces.create(name)
+    default = workspaces.open(DEFAULT_WORKSPACE)
+    default.add_goal("阅读", "2030-05-01", 3)
+    default.add_goal("跑步", "2030-02-01", 3)
+    first = workspaces.open("甲")
+    first.add_goal("写作", "", 1)
+    # 再次使用默认工作区，最久未使用的是甲
+    assert workspaces.open(DEFAULT_WORKSPACE) is default
+    workspaces.open("乙")
+    assert not workspaces.is_open("甲") and workspaces.is_open(DEFAULT_WORKSPACE)
+    assert workspaces.summary("甲") == {'goals': 1, 'next_deadline': None}
+    assert workspaces.summary(DEFAULT_WORKSPACE) == {'goals': 2, 'next_deadline': "2030-02-01"}
+
+    reopened = workspaces.open("甲")
+    assert [goal['name'] for goal in reopened.goals] == ["写作"]
+    assert not workspaces.is_open(DEFAULT_WORKSPACE)
+
+
+def test_summary_is_recomputed_after_an_external_change(workspaces, kind):
+    for name in ("团队", "乙"):
+        workspaces.create(name)
+    workspaces.open("团队").add_goal("阅读", "", 3)
+    workspaces.open(DEFAULT_WORKSPACE)
+    workspaces.open("乙")
+    assert not workspaces.is_open("团队")
+    assert workspaces.summary("团队")['goals'] == 1
+
+    # 其它程序修改了团队工作区的数据文件
+    other = GoalStore(create_storage(kind, workspaces.path("团队"), 0))
+    other.load()
+    other.add_goal("跑步", "2030-03-01", 2)
+    other.close()
+    assert workspaces.summary("团队") == {'goals': 2, 'next_deadline': "2030-03-01"}
+
+
+def test_open_store_merges_external_changes(workspaces, kind):
+    workspaces.create("团队")
+    store = workspaces.open("团队")
+    store.add_goal("阅读", "", 3)
+
+    other = GoalStore(create_storage(kind, workspaces.path("团队"), 0, import_from=None))
+    other.load()
+    other.add_goal("跑步", "", 2)
+    other.close()
+    assert workspaces.open("团队") is store
+    assert sorted(goal['name'] for goal in store.goals) == ["跑步", "阅读"]
+
+
+def test_evicted_stores_are_freed(tmp_path, kind):
+    workspaces = create_workspaces(kind, str(tmp_path / "goals.data"), str(tmp_path / "workspaces"), capacity=1)
+    for name in ("甲", "乙"):
+        workspaces.create(name)
+    storages = []
+    for name in (DEFAULT_WORKSPACE, "甲", "乙", DEFAULT_WORKSPACE, "甲"):
+        store = workspaces.open(name)
+        store.add_goal(name, "", 2)
+        storages.append(weakref.ref(store.storage))
+    del store
+    gc.collect()
+    assert sum(ref() is not None for ref in storages) == 1
+    workspaces.close()
+    assert workspaces.summary("甲")['goals'] == 2
@@ -0,0 +1,277 @@
+import csv
+import json
+import os
+import time
+from itertools import chain
+
+from action_log import ActionKind, ActionRecord
+from goal_store import GoalError
+
+FORMATS = ("csv", "ndjson")
+KINDS = ("goals", "completed", "actions")
+
+GOAL_FIELDS = ["id", "name", "deadline", "target_times", "completed_times"]
+COMPLETED_FIELDS = GOAL_FIELDS + ["completion_date"]
+ACTION_FIELDS = ["time", "kind", "goal_id", "name", "old", "new"]
+
+# 导入操作记录时可以识别的时间格式，也可以直接使用 Unix 时间戳
+ACTION_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+
+def detect_format(path):
+    """
+    根据文件扩展名判断格式，.ndjson、.jsonl 和 .json 为 NDJSON，其余为 CSV。
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return "ndjson" if extension in (".ndjson", ".jsonl", ".json") else "csv"
+
+
+def open_file(path, fmt, mode):
+    """
+    打开导入或导出的文件。
+
+    说明：
+    CSV 使用带 BOM 的 UTF-8，Excel 可以直接打开；读取时没有 BOM 的文件同样可以识别。
+    """
+    if fmt == "csv":
+        return open(path, mode, encoding="utf-8-sig", newline="")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_rows(f, fmt):
+    """
+    逐行读取 CSV 或 NDJSON 文件。
+
+    参数：
+    f (file): 以文本方式打开的文件。
+    fmt (str): "csv" 或 "ndjson"。
+
+    返回值：
+    generator: 依次产生 (行号, 字段 dict)，无法解析的行产生 (行号, None)。
+
+    说明：
+    每次只读取一行，内存占用与文件大小无关。CSV 的第一行是字段名。
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, (row if isinstance(row, dict) else None)
+
+
+def write_rows(f, fmt, fields, rows):
+    """
+    逐行写入 CSV 或 NDJSON 文件。
+
+    参数：
+    f (file): 以文本方式打开的文件。
+    fmt (str): "csv" 或 "ndjson"。
+    fields (list): 字段名，CSV 按此顺序写出各列。
+    rows (iterable): 字段 dict 的序列，可以是生成器。
+
+    返回值：
+    int: 写入的行数。
+
+    说明：
+    CSV 中列表类型的字段写成 JSON 文字，None 写成空单元格。
+    """
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fields, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: _csv_value(value) for key, value in row.items()})
+            count += 1
+        return count
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + "\n")
+        count += 1
+    return count
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value)
+
+
+def goal_rows(goals, fields):
+    for goal in goals:
+        yield {key: goal.get(key) for key in fields}
+
+
+def action_rows(records):
+    for record in records:
+        yield {"time": record.time, "kind": record.kind.name.lower(), "goal_id": record.goal_id,
+               "name": record.name, "old": record.old, "new": record.new}
+
+
+def archived_items(history_archive, kind):
+    """
+    按月份从旧到新逐条返回归档中的已完成目标或操作记录，每次只读取一个分段。
+
+    参数：
+    history_archive (HistoryArchive): 归档，为 None 时什么也不返回。
+    kind (str): "completed" 或 "actions"。
+    """
+    if history_archive is None:
+        return
+    for segment in reversed(history_archive.segments(kind)):
+        yield from history_archive.read(segment)
+
+
+def export_data(store, kind, f, fmt, include_archive=True):
+    """
+    导出活动目标、已完成目标或操作记录。
+
+    参数：
+    store (GoalStore): 目标数据。
+    kind (str): "goals"、"completed" 或 "actions"。
+    f (file): 以文本方式打开的目标文件。
+    fmt (str): "csv" 或 "ndjson"。
+    include_archive (bool): 已完成目标和操作记录是否包括已移入归档的部分。
+
+    返回值：
+    int: 导出的记录数。
+
+    说明：
+    记录逐条转换后立即写出；SQLite 存储的操作记录直接从数据库游标中逐行读取。
+    已归档的记录在主数据之前导出，按分段逐个解压，整体仍是从旧到新的顺序。
+    """
+    history_archive = store.storage.archive if include_archive else None
+    if kind == "goals":
+        return write_rows(f, fmt, GOAL_FIELDS, goal_rows(store.goals, GOAL_FIELDS))
+    if kind == "completed":
+        goals = chain(archived_items(history_archive, "completed"), store.completed_goals)
+        return write_rows(f, fmt, COMPLETED_FIELDS, goal_rows(goals, COMPLETED_FIELDS))
+    if kind == "actions":
+        records = chain(archived_items(history_archive, "actions"), store.storage.iter_actions())
+        return write_rows(f, fmt, ACTION_FIELDS, action_rows(records))
+    raise ValueError(f"未知的数据类型: {kind}")
+
+
+def parse_action_time(value):
+    """
+    解析操作时间，可以是 Unix 时间戳或 ACTION_TIME_FORMATS 中的格式。
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    value = "" if value is None else str(value).strip()
+    if value.isdigit():
+        return int(value)
+    for time_format in ACTION_TIME_FORMATS:
+        try:
+            return int(time.mktime(time.strptime(value, time_format)))
+        except ValueError:
+            continue
+    raise GoalError(f"无法识别的操作时间：{value}")
+
+
+def parse_action_kind(value):
+    """
+    解析操作类型，可以是 ActionKind 的名称（不区分大小写）或数值。
+    """
+    try:
+        if isinstance(value, int) or str(value).strip().isdigit():
+            return ActionKind(int(value))
+        return ActionKind[str(value).strip().upper()]
+    except (KeyError, ValueError):
+        raise GoalError(f"无法识别的操作类型：{value}") from None
+
+
+def parse_goal_values(value):
+    """
+    解析修改操作的 [名称, 截止日期, 次数]，CSV 中为 JSON 文字，空值返回 None。
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise GoalError(f"无法解析的修改内容：{value}") from None
+    if not isinstance(value, list) or len(value) != 3:
+        raise GoalError("修改内容应为 [名称, 截止日期, 次数]")
+    return value
+
+
+def action_from_import(row):
+    """
+    把导入的一行转换为 ActionRecord，不合法时抛出 GoalError。
+    """
+    kind = parse_action_kind(row.get("kind"))
+    name = _text(row, "name")
+    if not name:
+        raise GoalError("请输入目标名称！")
+    old = parse_goal_values(row.get("old"))
+    new = parse_goal_values(row.get("new"))
+    if kind == ActionKind.EDIT and (old is None or new is None):
+        raise GoalError("修改操作需要修改前后的内容")
+    return ActionRecord(parse_action_time(row.get("time")), kind, _text(row, "goal_id") or None, name, old, new)
+
+
+def _import_goal(store, row):
+    store.import_goal(_text(row, "name"), _text(row, "deadline"), row.get("target_times"),
+                      row.get("completed_times"), _text(row, "id"))
+
+
+def _import_completed_goal(store, row):
+    store.import_completed_goal(_text(row, "name"), _text(row, "deadline"), row.get("target_times"),
+                                _text(row, "completion_date"), row.get("completed_times"), _text(row, "id"))
+
+
+def _import_action(store, row):
+    store.import_action(action_from_import(row))
+
+
+IMPORTERS = {"goals": _import_goal, "completed": _import_completed_goal, "actions": _import_action}
+
+
+def import_data(store, kind, rows, on_error=None):
+    """
+    导入活动目标、已完成目标或操作记录。
+
+    参数：
+    store (GoalStore): 目标数据。
+    kind (str): "goals"、"completed" 或 "actions"。
+    rows (iterable): read_rows 产生的 (行号, 字段 dict) 序列。
+    on_error (callable): 每遇到一行不合法的数据，以 (行号, 原因) 调用一次。
+
+    返回值：
+    tuple: (导入的行数, 失败的行数)。
+
+    说明：
+    目标的验证规则与界面上添加目标时相同。不合法的行只报告而不中断导入，
+    全部行在同一个 batch 中导入，最后只持久化一次。
+    """
+    importer = IMPORTERS.get(kind)
+    if importer is None:
+        raise ValueError(f"未知的数据类型: {kind}")
+    imported = failed = 0
+    with store.batch():
+        for number, row in rows:
+            try:
+                if row is None:
+                    raise GoalError("无法解析的行")
+                importer(store, row)
+                imported += 1
+            except GoalError as e:
+                failed += 1
+                if on_error is not None:
+                    on_error(number, str(e))
+    return imported, failed
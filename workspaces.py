@@ -0,0 +1,268 @@
+import json
+import os
+from collections import OrderedDict
+
+import instrumentation
+from fileutil import file_signature
+from goal_record import format_date
+from goal_store import GoalStore
+from storage import create_storage, read_active_goals
+
+DEFAULT_WORKSPACE = "默认"
+INDEX_FILE = ".workspaces.json"
+NAME_MAX_LENGTH = 20
+INVALID_CHARACTERS = set('/\\:*?"<>|')
+
+# 同时保持打开的工作区数，包括当前工作区
+DEFAULT_CAPACITY = 3
+
+# 存储方式到数据文件扩展名的映射
+EXTENSIONS = {"json": ".json", "journal": ".json", "sqlite": ".db"}
+
+
+class WorkspaceError(ValueError):
+    """
+    工作区操作失败，消息可以直接显示给用户。
+    """
+
+
+def validate_name(name):
+    """
+    验证工作区名称，返回去掉首尾空白后的名称。名称用作文件名，不能含有路径分隔符等字符。
+    """
+    name = name.strip()
+    if not name:
+        raise WorkspaceError("工作区名称不能为空")
+    if len(name) > NAME_MAX_LENGTH:
+        raise WorkspaceError(f"工作区名称不能超过 {NAME_MAX_LENGTH} 个字")
+    if name.startswith(".") or INVALID_CHARACTERS & set(name):
+        raise WorkspaceError("工作区名称不能以 . 开头，也不能含有 {}".format(" ".join(sorted(INVALID_CHARACTERS))))
+    return name
+
+
+def data_signature(path):
+    """
+    返回工作区数据文件及其追加日志、WAL 文件的签名，任何一个变化都说明数据可能变化。
+    """
+    return [None if signature is None else list(signature)
+            for signature in map(file_signature, (path, f"{path}.journal", f"{path}-wal"))]
+
+
+def summarize(goals):
+    """
+    返回活动目标的摘要。
+
+    返回值：
+    dict: goals 为目标数，next_deadline 为最近的截止日期 yyyy-MM-dd，没有截止日期时为 None。
+    """
+    days = [goal.deadline_day for goal in goals if goal.deadline_day is not None]
+    return {'goals': len(goals), 'next_deadline': format_date(min(days)) if days else None}
+
+
+def summarize_store(store):
+    """
+    返回已加载的 GoalStore 的摘要，最近的截止日期直接取 deadline_order 的第一项。
+    """
+    next_deadline = None
+    if len(store.deadline_order):
+        goal = store.goal_index[store.deadline_order[0]]
+        if goal.deadline_day is not None:
+            next_deadline = goal['deadline']
+    return {'goals': len(store.goals), 'next_deadline': next_deadline}
+
+
+class Workspaces:
+    """
+    命名工作区的列表，以及最近使用的工作区的 GoalStore。每个工作区有自己的数据文件，不同团队或个人的目标分开保存。
+
+    说明：
+    默认工作区使用原来的数据文件（goals.json 或 --data 指定的文件），其它工作区的数据文件保存在工作区目录中，
+    文件名为工作区名称加上存储方式的扩展名。工作区目录中的 .workspaces.json 记录各工作区的摘要（目标数和最近的截止日期）
+    以及记录摘要时数据文件的签名，切换列表只读取这些摘要；数据文件在此之后被其它程序修改过时，才读取该工作区的活动目标重新计算。
+
+    只有 open 的工作区才完整加载。最近使用的工作区保存在容量为 capacity 的 LRU 缓存中，切换回去时不必重新加载；
+    超出容量时关闭最久未使用的工作区，写入尚未保存的数据并释放它的数据，同时把它的摘要记入索引文件。
+    其它工作区只读取索引文件中的摘要，需要重新计算时也只读取活动目标，不创建存储后端。
+    """
+
+    def __init__(self, open_storage, read_goals, directory="workspaces", default_path="goals.json", extension=".json",
+                 capacity=DEFAULT_CAPACITY):
+        """
+        参数：
+        open_storage (callable): 由数据文件路径创建存储后端。
+        read_goals (callable): 由数据文件路径只读取活动目标，不创建存储后端，也不修改任何文件。
+        directory (str): 工作区目录，第一次创建工作区时才建立。
+        default_path (str): 默认工作区的数据文件路径。
+        extension (str): 数据文件的扩展名，与存储方式对应。
+        capacity (int): 同时保持打开的工作区数，至少为 1。
+        """
+        self.open_storage = open_storage
+        self.read_goals = read_goals
+        self.directory = directory
+        self.default_path = default_path
+        self.extension = extension
+        self.capacity = max(1, capacity)
+        self._stores = OrderedDict()  # 工作区名称到 GoalStore 的映射，最近使用的在最后
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self):
+        # 只使用默认工作区时不建立工作区目录
+        if not os.path.isdir(self.directory):
+            return
+        temp_path = f"{self._index_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self._index_path)
+
+    def path(self, name):
+        """
+        返回工作区的数据文件路径。
+        """
+        if name == DEFAULT_WORKSPACE:
+            return self.default_path
+        return os.path.join(self.directory, name + self.extension)
+
+    def names(self):
+        """
+        返回全部工作区的名称，默认工作区在最前，其余按名称排列。
+
+        说明：
+        除了索引中记录的工作区，工作区目录中由其它程序创建的数据文件也算作工作区。
+        """
+        names = set(self._index) | set(self._stores)
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            files = []
+        for file_name in files:
+            name, extension = os.path.splitext(file_name)
+            if extension == self.extension and not name.startswith("."):
+                names.add(name)
+        names.discard(DEFAULT_WORKSPACE)
+        return [DEFAULT_WORKSPACE] + sorted(names)
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def create(self, name):
+        """
+        新建一个空的工作区，返回验证后的名称。
+
+        说明：
+        数据文件在第一次保存时才写入，新建时先在索引中记录它的摘要。
+        """
+        name = validate_name(name)
+        if name in self:
+            raise WorkspaceError(f"工作区“{name}”已存在")
+        os.makedirs(self.directory, exist_ok=True)
+        self._index[name] = dict(summarize([]), signature=data_signature(self.path(name)))
+        self._write_index()
+        return name
+
+    def is_open(self, name):
+        return name in self._stores
+
+    def open(self, name):
+        """
+        返回工作区的 GoalStore，未打开时加载它的活动目标。
+
+        说明：
+        打开的工作区成为最近使用的一个，缓存超出容量时关闭最久未使用的工作区。
+        已打开的工作区的数据文件被其它程序修改过时，先用 sync_external 合并再返回。
+        """
+        store = self._stores.get(name)
+        if store is not None:
+            self._stores.move_to_end(name)
+            if store.storage.external_changed():
+                store.sync_external()
+            return store
+        if name not in self:
+            raise WorkspaceError(f"工作区“{name}”不存在")
+        token = instrumentation.begin("workspace.open")
+        if name != DEFAULT_WORKSPACE:
+            os.makedirs(self.directory, exist_ok=True)
+        store = GoalStore(self.open_storage(self.path(name)))
+        store.load()
+        self._stores[name] = store
+        while len(self._stores) > self.capacity:
+            self._evict(next(iter(self._stores)))
+        instrumentation.end(token, open=len(self._stores))
+        return store
+
+    def _evict(self, name):
+        """
+        关闭一个打开的工作区：写入尚未保存的数据，记录它的摘要，之后它的数据可以被回收。
+        """
+        store = self._stores.pop(name)
+        summary = summarize_store(store)
+        store.close()
+        self._index[name] = dict(summary, signature=data_signature(self.path(name)))
+        self._write_index()
+
+    def summary(self, name):
+        """
+        返回工作区的摘要，见 summarize。
+
+        说明：
+        打开的工作区直接由内存中的数据得到。其它工作区使用索引中的摘要，数据文件在记录摘要后
+        被修改过（或者索引中没有它）时，用 read_goals 只读取它的活动目标重新计算并更新索引。
+        """
+        store = self._stores.get(name)
+        if store is not None:
+            return summarize_store(store)
+        path = self.path(name)
+        signature = data_signature(path)
+        entry = self._index.get(name)
+        if entry is not None and entry.get('signature') == signature:
+            return {'goals': entry['goals'], 'next_deadline': entry['next_deadline']}
+        token = instrumentation.begin("workspace.summary")
+        summary = summarize(self.read_goals(path))
+        self._index[name] = dict(summary, signature=signature)
+        self._write_index()
+        instrumentation.end(token)
+        return summary
+
+    def close(self):
+        """
+        关闭全部打开的工作区。
+        """
+        while self._stores:
+            self._evict(next(iter(self._stores)))
+
+
+def create_workspaces(kind="json", default_path=None, directory="workspaces", write_delay=0.5, history_limit=None,
+                      archive_after=None, capacity=DEFAULT_CAPACITY):
+    """
+    按存储方式创建 Workspaces，参数与 create_storage 相同的部分对每个工作区都适用。
+
+    参数：
+    kind (str): "json"、"journal" 或 "sqlite"。
+    default_path (str): 默认工作区的数据文件路径，为 None 时使用 create_storage 的默认文件名。
+    directory (str): 工作区目录。
+    capacity (int): 同时保持打开的工作区数。
+
+    说明：
+    只有默认工作区在首次使用 SQLite 时导入当前目录下的 goals.json，新建的工作区总是空的。
+    """
+    if kind not in EXTENSIONS:
+        raise ValueError(f"未知的存储方式: {kind}")
+    default_path = default_path or ("goals.db" if kind == "sqlite" else "goals.json")
+
+    def import_from(path):
+        return "goals.json" if path == default_path else None
+
+    def open_storage(path):
+        return create_storage(kind, path, write_delay, history_limit, archive_after, import_from(path))
+
+    def read_goals(path):
+        return read_active_goals(kind, path, import_from(path))
+
+    return Workspaces(open_storage, read_goals, directory, default_path, EXTENSIONS[kind], capacity)